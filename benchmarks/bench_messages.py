@@ -0,0 +1,125 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Бенчмарк сборки сообщений: шаблоны messages.py (эмодзи подставлены при загрузке модуля)
+против прежнего способа - emoji.emojize над каждым собранным текстом.
+Запуск из корня репозитория: python benchmarks/bench_messages.py
+"""
+
+import argparse
+import logging
+import os
+import sys
+
+import emoji
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup  # noqa: E402
+from aiogram.utils.markdown import hbold  # noqa: E402
+
+import keyboards  # noqa: E402
+import messages  # noqa: E402
+import wash_functions  # noqa: E402
+from bench_suite import measure_time  # noqa: E402
+from fixtures import all_fixtures  # noqa: E402
+from forecast_series import ForecastSeries  # noqa: E402
+from scripts.handlers.rate_handlers import get_feedback_keyboard  # noqa: E402
+
+STATS = {'total_forecasts': 42, 'locations': 3, 'likes': 17, 'dislikes': 4, 'accuracy': 80.95}
+RECOMMENDATION_PARAMS = {
+    'WASH_OK': {'wind': messages.WIND_MARK, 'description': 'переменная облачность',
+                'temperature': 17.4, 'advice': ''},
+    'RAIN_SOON': {'rain_probability': 42.5, 'intervals': '18 окт 12:00 - 18:00\n19 окт 03:00 - 09:00',
+                  'low_temperature': messages.LOW_TEMPERATURE.format(temperature=3.2)},
+    'DONT_WASH': {'rain_probability': 0.8, 'intervals': '19 окт 15:00 - 21:00', 'temperature_avg': 0.4,
+                  'temperature': 1.2, 'humidity': 86.0,
+                  'reasons': '\n' + messages.REASONS + '\n' + messages.HUMIDITY_REASON.format(humidity=86.0),
+                  'reagent_note': messages.REAGENT_NOTE},
+    'WINTER_PRECIPITATION': {'intervals': '18 окт 21:00 - 19 окт 06:00', 'temperature_avg': -4.1,
+                             'warnings': '\n' + messages.SNOW_WARNING.format(snow=6.3), 'snow': 6.3},
+}
+
+
+def legacy(template: str, **params):
+    """ Прежний способ: текст с :названиями: эмодзи собирается и целиком проходит через emojize """
+    source = emoji.demojize(template)
+    return lambda: emoji.emojize(source.format(**params))
+
+
+def legacy_feedback_keyboard(forecast_id: int) -> InlineKeyboardMarkup:
+    """ Клавиатура оценки, как она собиралась до шаблонов """
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(text=emoji.emojize(":thumbs_up: Правильно"),
+                             callback_data=f"feedback:{forecast_id}:like"),
+        InlineKeyboardButton(text=emoji.emojize(":thumbs_down: Ошибся"),
+                             callback_data=f"feedback:{forecast_id}:dislike"),
+    ]])
+
+
+def legacy_accepted_keyboard(is_positive: bool) -> InlineKeyboardMarkup:
+    """ Клавиатура после оценки, как она собиралась до шаблонов """
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+        text=emoji.emojize(":check_mark_button: Оценка принята") if is_positive
+        else emoji.emojize(":cross_mark: Оценка принята"),
+        callback_data="no_action")]])
+
+
+def build_cases() -> dict:
+    """ Бенчмарки: название -> (прежний способ, шаблон) """
+    name = hbold('Иван Петров')
+    cases = {
+        'help': (lambda: emoji.emojize(messages.HELP_MESSAGE), lambda: messages.HELP_MESSAGE),
+        'start': (legacy(messages.START_MESSAGE, name=name),
+                  lambda: messages.START_MESSAGE.format(name=name)),
+        'stats': (legacy(messages.STATS_MESSAGE, **STATS), lambda: messages.STATS_MESSAGE.format(**STATS)),
+        'feedback_keyboard': (lambda: legacy_feedback_keyboard(123456),
+                              lambda: get_feedback_keyboard(123456)),
+        'accepted_keyboard': (lambda: legacy_accepted_keyboard(True),
+                              lambda: keyboards.like_accepted_keyboard),
+    }
+    for template_name, params in RECOMMENDATION_PARAMS.items():
+        template = getattr(messages, template_name)
+        cases[f"recommendation[{template_name}]"] = (
+            legacy(template, **params), lambda template=template, params=params: template.format(**params))
+    # Ответ с рекомендацией на сценариях fixtures.py: рекомендация + локация
+    for fixture in all_fixtures():
+        series = ForecastSeries.from_payload(fixture.payload)
+        text = wash_functions.recommend_car_wash(series, fixture.lat, fixture.lon)
+        params = {'recommendation': text, 'location': series.city_name}
+        cases[f"forecast[{fixture.name}]"] = (
+            legacy(messages.FORECAST_MESSAGE, **params),
+            lambda params=params: messages.FORECAST_MESSAGE.format(**params))
+    return cases
+
+
+def main() -> None:
+    """ Запускает бенчмарк и печатает время сборки одного сообщения """
+    parser = argparse.ArgumentParser(description='Бенчмарк сборки сообщений')
+    parser.add_argument('--rounds', type=int, default=5, help='число раундов (берется лучший)')
+    parser.add_argument('--min-round-time', type=float, default=0.05, help='минимальная длительность раунда, секунды')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    legacy_total = template_total = 0.0
+    print(f"{'message':40s} {'emojize, us':>12s} {'template, us':>13s} {'speedup':>8s}")
+    for name, (legacy_render, template_render) in build_cases().items():
+        legacy_render(), template_render()  # прогрев: кэш регулярного выражения и словарей emoji
+        before = measure_time(legacy_render, args.rounds, args.min_round_time)['best_us']
+        after = measure_time(template_render, args.rounds, args.min_round_time)['best_us']
+        legacy_total += before
+        template_total += after
+        print(f"{name:40s} {before:12.2f} {after:13.2f} {before / max(after, 1e-3):7.1f}x")
+    print(f"{'total':40s} {legacy_total:12.2f} {template_total:13.2f} "
+          f"{legacy_total / max(template_total, 1e-3):7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
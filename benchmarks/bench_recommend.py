@@ -0,0 +1,69 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Бенчмарк recommend_car_wash на синтетических прогнозах OpenWeather.
+Запуск из корня репозитория: python benchmarks/bench_recommend.py
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(current_dir), 'scripts'))
+
+import wash_functions  # noqa: E402
+from forecast_series import ForecastSeries  # noqa: E402
+from weather_providers import synthetic_payload  # noqa: E402
+
+# Начала прогнозов по сезонам: зима, весна, лето, осень (Unix, UTC)
+SEASON_STARTS = [int(datetime(2026, month, 15, tzinfo=timezone.utc).timestamp()) for month in (1, 4, 7, 10)]
+
+
+def main() -> None:
+    """ Запускает бенчмарк и печатает время одного вызова """
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[-2])
+    parser.add_argument('--payloads', type=int, default=50, help='число синтетических прогнозов')
+    parser.add_argument('--repeat', type=int, default=20, help='повторов на каждый прогноз в раунде')
+    parser.add_argument('--rounds', type=int, default=5, help='число раундов (берется лучший)')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    lat, lon = 55.75, 37.62
+    payloads = [synthetic_payload(lat, lon, seed, SEASON_STARTS[seed % len(SEASON_STARTS)])
+                for seed in range(args.payloads)]
+
+    series = {id(payload): ForecastSeries.from_payload(payload) for payload in payloads}
+    stages = {
+        'ForecastSeries.from_payload': ForecastSeries.from_payload,
+        'recommend_car_wash': lambda payload: wash_functions.recommend_car_wash(
+            series[id(payload)], lat, lon),
+    }
+
+    # Прогрев: загрузка данных часовых поясов и кэшей
+    for payload in payloads:
+        wash_functions.recommend_car_wash(series[id(payload)], lat, lon)
+
+    calls = args.repeat * len(payloads)
+    for name, stage in stages.items():
+        timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                for payload in payloads:
+                    stage(payload)
+            timings.append((time.perf_counter() - started) / calls)
+        timings.sort()
+        print(f"{name}: {args.rounds} x {calls} calls, best {timings[0] * 1e6:.1f} us/call, "
+              f"median {timings[len(timings) // 2] * 1e6:.1f} us/call")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Отчет по хранению снимков погоды: размер таблиц и время записи прогнозов
+с JSON в каждой строке forecasts и со снимками в weather_snapshots.
+Нужна БД из config.yml. Запуск из корня репозитория:
+python benchmarks/bench_snapshots.py          - сравнение на временных таблицах
+python benchmarks/bench_snapshots.py --live   - размер таблиц рабочей БД
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import asyncpg
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(current_dir), 'scripts'))
+
+from forecast_series import ForecastSeries  # noqa: E402
+from functions import read_yaml  # noqa: E402
+from weather_providers import synthetic_payload  # noqa: E402
+
+INLINE_TABLES_SQL = """
+    CREATE TEMP TABLE bench_forecasts_inline (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        weather_data JSONB
+    )
+"""
+SNAPSHOT_TABLES_SQL = """
+    CREATE TEMP TABLE bench_snapshots (
+        content_hash BYTEA PRIMARY KEY,
+        payload JSONB NOT NULL
+    );
+    CREATE TEMP TABLE bench_forecasts (
+        id SERIAL PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        snapshot_hash BYTEA REFERENCES bench_snapshots (content_hash)
+    )
+"""
+INLINE_INSERT_SQL = "INSERT INTO bench_forecasts_inline (user_id, weather_data) VALUES ($1, $2)"
+SNAPSHOT_INSERT_SQL = """
+    WITH snapshot AS (
+        INSERT INTO bench_snapshots (content_hash, payload) VALUES ($2, $3)
+        ON CONFLICT (content_hash) DO NOTHING
+    )
+    INSERT INTO bench_forecasts (user_id, snapshot_hash) VALUES ($1, $2)
+"""
+LIVE_REPORT_SQL = """
+    SELECT
+        pg_total_relation_size('forecasts') AS forecasts_size,
+        pg_total_relation_size('weather_snapshots') AS snapshots_size,
+        (SELECT COUNT(*) FROM forecasts) AS forecasts_count,
+        (SELECT COUNT(*) FROM weather_snapshots) AS snapshots_count,
+        (SELECT COALESCE(SUM(pg_column_size(s.payload)), 0)
+         FROM forecasts f JOIN weather_snapshots s ON s.content_hash = f.snapshot_hash) AS inline_bytes,
+        (SELECT COALESCE(SUM(pg_column_size(payload)), 0) FROM weather_snapshots) AS stored_bytes
+"""
+
+
+def megabytes(size) -> str:
+    """ Размер в мегабайтах для отчета """
+    return f"{size / 2 ** 20:.2f} MB"
+
+
+async def connect(db_conf):
+    """ Подключение к БД из секции db в config.yml """
+    return await asyncpg.connect(database=db_conf['database_name'], user=db_conf['user_name'],
+                                 password=db_conf['user_password'], host=db_conf['host'])
+
+
+async def compare(conn, forecasts, cells, batch_size) -> None:
+    """ Записывает одинаковый поток прогнозов обоими способами и печатает время и размер """
+    snapshots = [ForecastSeries.from_payload(synthetic_payload(55.75, 37.62, seed)).snapshot()
+                 for seed in range(cells)]
+    rows = [(user_id, snapshots[user_id % cells]) for user_id in range(forecasts)]
+    await conn.execute(INLINE_TABLES_SQL)
+    await conn.execute(SNAPSHOT_TABLES_SQL)
+
+    variants = {
+        'inline JSONB': ('bench_forecasts_inline', INLINE_INSERT_SQL,
+                         [(user_id, payload_json) for user_id, (_, payload_json) in rows]),
+        'weather_snapshots': ('bench_forecasts', SNAPSHOT_INSERT_SQL,
+                              [(user_id, content_hash, payload_json)
+                               for user_id, (content_hash, payload_json) in rows]),
+    }
+    print(f"{forecasts} forecasts, {cells} distinct snapshots, batches of {batch_size}")
+    for name, (table, statement, args) in variants.items():
+        started = time.perf_counter()
+        for start in range(0, len(args), batch_size):
+            async with conn.transaction():
+                await conn.executemany(statement, args[start:start + batch_size])
+        elapsed = time.perf_counter() - started
+        size = await conn.fetchval(f"SELECT pg_total_relation_size('{table}')")
+        if table == 'bench_forecasts':
+            size += await conn.fetchval("SELECT pg_total_relation_size('bench_snapshots')")
+        print(f"{name}: {elapsed * 1e3:.1f} ms ({elapsed / forecasts * 1e6:.1f} us/forecast), "
+              f"size {megabytes(size)}")
+
+
+async def live_report(conn) -> None:
+    """ Печатает размер таблиц рабочей БД и объем, сэкономленный на дубликатах """
+    report = await conn.fetchrow(LIVE_REPORT_SQL)
+    print(f"forecasts: {report['forecasts_count']} rows, {megabytes(report['forecasts_size'])}")
+    print(f"weather_snapshots: {report['snapshots_count']} rows, {megabytes(report['snapshots_size'])}")
+    saved = report['inline_bytes'] - report['stored_bytes']
+    print(f"payload stored: {megabytes(report['stored_bytes'])}, "
+          f"would be {megabytes(report['inline_bytes'])} inline, saved {megabytes(saved)}")
+
+
+async def run(args) -> None:
+    """ Подключается к БД и выполняет выбранный отчет """
+    conn = await connect(read_yaml('config.yml')['db'])
+    try:
+        if args.live:
+            await live_report(conn)
+        else:
+            await compare(conn, args.forecasts, args.cells, args.batch_size)
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    """ Разбирает аргументы и запускает отчет """
+    parser = argparse.ArgumentParser(description='Отчет по хранению снимков погоды')
+    parser.add_argument('--live', action='store_true', help='размер таблиц рабочей БД')
+    parser.add_argument('--forecasts', type=int, default=5000, help='число прогнозов')
+    parser.add_argument('--cells', type=int, default=50, help='число разных снимков погоды')
+    parser.add_argument('--batch-size', type=int, default=100, help='прогнозов в одной транзакции')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Набор бенчмарков движка рекомендаций на сценариях из fixtures.py:
+время одного вызова (медиана и лучший из раундов) и память, выделяемая за вызов.
+Запуск из корня репозитория:
+python benchmarks/bench_suite.py                  - замер и таблица результатов
+python benchmarks/bench_suite.py --save           - замер и запись базовых значений
+python benchmarks/bench_suite.py --check          - замер и сравнение с базовыми значениями,
+                                                    код выхода 1 при регрессии
+Базовые значения зависят от машины, их нужно снимать на той же машине, где идет проверка.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(current_dir), 'scripts'))
+
+import wash_functions  # noqa: E402
+from fixtures import all_fixtures  # noqa: E402
+from forecast_series import ForecastSeries, FLAG_BAD_WEATHER  # noqa: E402
+from timezone_resolver import resolve_timezone  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(current_dir, 'baseline.json')
+# Регрессия: лучшее время раунда выросло больше, чем на threshold, и больше, чем на MIN_DELTA_US.
+# Сравнивается лучший раунд, а не медиана: он меньше зависит от фоновой нагрузки на машину
+MIN_DELTA_US = 2.0
+# Регрессия по памяти: выросла больше, чем на alloc_threshold, и больше, чем на MIN_DELTA_KIB
+MIN_DELTA_KIB = 1.0
+
+
+def build_cases() -> dict:
+    """ Бенчмарки: название -> функция без аргументов """
+    cases = {}
+    for fixture in all_fixtures():
+        payload, lat, lon = fixture.payload, fixture.lat, fixture.lon
+        series = ForecastSeries.from_payload(payload)
+        timestamps = series.rows[:, 5]
+        clock = wash_functions.LocalClock(resolve_timezone(lat, lon), timestamps[0], timestamps[-1])
+        bad_timestamps = timestamps[series.flags & FLAG_BAD_WEATHER != 0]
+
+        cases[f"from_payload[{fixture.name}]"] = (
+            lambda payload=payload: ForecastSeries.from_payload(payload))
+        cases[f"recommend_car_wash[{fixture.name}]"] = (
+            lambda series=series, lat=lat, lon=lon: wash_functions.recommend_car_wash(series, lat, lon))
+        cases[f"analyze_winter_conditions[{fixture.name}]"] = (
+            lambda series=series, clock=clock: wash_functions._analyze_winter_conditions(
+                series, clock, float(series.rows[0, 0])))
+        cases[f"convert_time[{fixture.name}]"] = (
+            lambda clock=clock, timestamp=timestamps[0]: wash_functions.convert_time(timestamp, clock))
+        cases[f"collapse_time_intervals[{fixture.name}]"] = (
+            lambda clock=clock, bad_timestamps=bad_timestamps:
+            wash_functions.collapse_time_intervals(bad_timestamps, clock))
+    return cases
+
+
+def measure_time(function, rounds: int, min_round_time: float) -> dict:
+    """
+    Время одного вызова в микросекундах.
+    Число вызовов в раунде подбирается так, чтобы раунд шел не меньше min_round_time
+    """
+    calls = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_round_time:
+            break
+        calls = max(calls + 1, min(calls * 10, int(calls * min_round_time / max(elapsed, 1e-9))))
+
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(calls):
+            function()
+        timings.append((time.perf_counter() - started) / calls * 1e6)
+    return {'median_us': statistics.median(timings), 'best_us': min(timings), 'calls': calls}
+
+
+def measure_allocations(function) -> dict:
+    """ Память, выделенная за один вызов: пик сверх уже занятой (КиБ) и число новых блоков """
+    tracemalloc.start()
+    try:
+        function()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        snapshot_before = tracemalloc.take_snapshot()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        snapshot_after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(max(stat.count_diff, 0) for stat in snapshot_after.compare_to(snapshot_before, 'lineno'))
+    return {'alloc_kib': (peak - before) / 1024, 'retained_blocks': blocks}
+
+
+def run(cases: dict, rounds: int, min_round_time: float) -> dict:
+    """ Замеряет все бенчмарки """
+    results = {}
+    for name, function in cases.items():
+        function()  # прогрев: кэши часовых поясов, описаний погоды и т.д.
+        results[name] = dict(measure_time(function, rounds, min_round_time), **measure_allocations(function))
+        result = results[name]
+        print(f"{name:48s} median {result['median_us']:9.1f} us  best {result['best_us']:9.1f} us  "
+              f"alloc {result['alloc_kib']:8.1f} KiB")
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, alloc_threshold: float) -> list:
+    """ Список регрессий относительно базовых значений """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        limit = base['best_us'] * (1 + threshold)
+        if result['best_us'] > limit and result['best_us'] - base['best_us'] > MIN_DELTA_US:
+            regressions.append(f"{name}: best {result['best_us']:.1f} us, "
+                               f"baseline {base['best_us']:.1f} us (+{threshold:.0%} allowed)")
+        alloc_limit = base['alloc_kib'] * (1 + alloc_threshold)
+        if result['alloc_kib'] > alloc_limit and result['alloc_kib'] - base['alloc_kib'] > MIN_DELTA_KIB:
+            regressions.append(f"{name}: alloc {result['alloc_kib']:.1f} KiB, "
+                               f"baseline {base['alloc_kib']:.1f} KiB (+{alloc_threshold:.0%} allowed)")
+    return regressions
+
+
+def environment() -> dict:
+    """ Описание окружения, в котором сняты значения """
+    return {'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'processor': platform.processor() or platform.machine()}
+
+
+def main() -> None:
+    """ Разбирает аргументы, запускает замеры, сохраняет или проверяет базовые значения """
+    parser = argparse.ArgumentParser(description='Бенчмарки движка рекомендаций')
+    parser.add_argument('--save', action='store_true', help='записать результаты как базовые значения')
+    parser.add_argument('--check', action='store_true', help='сравнить с базовыми значениями')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='файл базовых значений')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='допустимый рост лучшего времени (0.25 = 25%%)')
+    parser.add_argument('--alloc-threshold', type=float, default=0.10,
+                        help='допустимый рост выделенной памяти (0.10 = 10%%)')
+    parser.add_argument('--rounds', type=int, default=7, help='число раундов замера')
+    parser.add_argument('--min-round-time', type=float, default=0.05,
+                        help='минимальная длительность раунда, секунды')
+    parser.add_argument('--filter', default='', help='только бенчмарки, в названии которых есть строка')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    cases = {name: function for name, function in build_cases().items() if args.filter in name}
+    results = run(cases, args.rounds, args.min_round_time)
+
+    if args.check:
+        try:
+            with open(args.baseline, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            print(f"Baseline {args.baseline} not found, run with --save first")
+            sys.exit(2)
+        if baseline.get('environment') != environment():
+            print(f"Warning: baseline was recorded on {baseline.get('environment')}, "
+                  f"now running on {environment()}")
+        regressions = compare(results, baseline['results'], args.threshold, args.alloc_threshold)
+        if regressions:
+            print('Regressions:')
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print('No regressions')
+
+    if args.save:
+        baseline = {'environment': environment(), 'results': results}
+        if args.filter and os.path.exists(args.baseline):
+            # Частичный замер обновляет только свои бенчмарки
+            with open(args.baseline, encoding='utf-8') as file:
+                saved = json.load(file)
+            baseline['results'] = dict(saved.get('results', {}), **results)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Синтетические ответы OpenWeather (/data/2.5/forecast) для бенчмарков.
+Каждый сценарий - правдоподобная погода на 5 дней с шагом 3 часа для конкретной
+точки; генерация детерминирована (seed), поэтому результаты сравнимы между запусками.
+Ответ собирается теми же forecast_item и forecast_payload, что и synthetic_payload
+в weather_providers; сценарий задает только погоду в каждом интервале.
+Запись сценариев как ответов для weather.provider: replay (из корня репозитория):
+python benchmarks/fixtures.py weather_replay
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+from collections import namedtuple
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+from weather_providers import (SLOT_SECONDS, SYNTHETIC_SLOTS, forecast_item,  # noqa: E402
+                               forecast_payload, save_payload)
+
+Fixture = namedtuple('Fixture', ['name', 'payload', 'lat', 'lon'])
+
+
+def _payload(city, start, slots, weather):
+    """
+    Собирает ответ OpenWeather.
+    weather(index, rnd) -> (температура °C, влажность, описание, ветер м/с, дождь мм, снег мм)
+    """
+    rnd = random.Random(city)
+    start = int(start.timestamp())
+    items = [forecast_item(start + index * SLOT_SECONDS, *weather(index, rnd)) for index in range(slots)]
+    return forecast_payload(items, city)
+
+
+def _daily(index, low, high):
+    """ Суточный ход температуры: минимум ночью, максимум днем """
+    return low + (high - low) * (1 - math.cos(2 * math.pi * (index % 8) / 8)) / 2
+
+
+def summer_dry(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Жаркое сухое лето: ясно, слабый ветер """
+    def weather(index, rnd):
+        return (_daily(index, 17, 29), rnd.randint(30, 50),
+                rnd.choice(['ясно', 'небольшая облачность']), rnd.uniform(1, 4), 0, 0)
+    start = datetime(2026, 7, 10, tzinfo=timezone.utc)
+    return Fixture('summer_dry', _payload('Москва', start, slots, weather), 55.75, 37.62)
+
+
+def persistent_rain(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Затяжные осенние дожди """
+    def weather(index, rnd):
+        wet = rnd.random() < 0.8
+        return (_daily(index, 6, 11), rnd.randint(80, 100),
+                rnd.choice(['небольшой дождь', 'дождь', 'ливень']) if wet else 'пасмурно',
+                rnd.uniform(2, 6), rnd.uniform(0.3, 4) if wet else 0, 0)
+    start = datetime(2026, 10, 5, tzinfo=timezone.utc)
+    return Fixture('persistent_rain', _payload('Санкт-Петербург', start, slots, weather), 59.93, 30.31)
+
+
+def winter_snow(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Морозная зима со снегопадами и окнами без осадков """
+    def weather(index, rnd):
+        snowing = (index // 6) % 2 == 0 and rnd.random() < 0.7
+        return (_daily(index, -14, -6), rnd.randint(70, 90),
+                rnd.choice(['небольшой снег', 'снег']) if snowing else 'переменная облачность',
+                rnd.uniform(1, 5), 0, rnd.uniform(0.2, 2) if snowing else 0)
+    start = datetime(2026, 1, 15, tzinfo=timezone.utc)
+    return Fixture('winter_snow', _payload('Новосибирск', start, slots, weather), 55.03, 82.92)
+
+
+def freezing_rain(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Оттепель около нуля: ледяной дождь, мокрый снег, риск гололеда """
+    def weather(index, rnd):
+        wet = rnd.random() < 0.6
+        return (_daily(index, -2, 2), rnd.randint(85, 100),
+                rnd.choice(['ледяной дождь', 'мокрый снег', 'изморось']) if wet else 'пасмурно',
+                rnd.uniform(2, 7), rnd.uniform(0.1, 2) if wet else 0, rnd.uniform(0, 0.5) if wet else 0)
+    start = datetime(2026, 12, 2, tzinfo=timezone.utc)
+    return Fixture('freezing_rain', _payload('Казань', start, slots, weather), 55.79, 49.12)
+
+
+def windy(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Сухо, но сильный ветер поднимает грязь """
+    def weather(index, rnd):
+        return (_daily(index, 3, 9), rnd.randint(40, 70),
+                rnd.choice(['переменная облачность', 'облачно с прояснениями']),
+                rnd.uniform(8, 16), 0, 0)
+    start = datetime(2026, 3, 20, tzinfo=timezone.utc)
+    return Fixture('windy', _payload('Владивосток', start, slots, weather), 43.12, 131.89)
+
+
+def polar(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Полярный день на Шпицбергене: температура почти без суточного хода """
+    def weather(index, rnd):
+        return (rnd.uniform(1, 5), rnd.randint(70, 90),
+                rnd.choice(['пасмурно', 'небольшой снег', 'туман']), rnd.uniform(3, 9), 0,
+                rnd.uniform(0, 0.3))
+    start = datetime(2026, 6, 21, tzinfo=timezone.utc)
+    return Fixture('polar', _payload('Лонгйир', start, slots, weather), 78.22, 15.65)
+
+
+def antimeridian(slots=SYNTHETIC_SLOTS) -> Fixture:
+    """ Точка у линии перемены дат (Фиджи, долгота около 180°, UTC+12) """
+    def weather(index, rnd):
+        wet = rnd.random() < 0.3
+        return (_daily(index, 23, 30), rnd.randint(60, 90),
+                'ливень' if wet else 'небольшая облачность', rnd.uniform(2, 7),
+                rnd.uniform(1, 8) if wet else 0, 0)
+    start = datetime(2026, 2, 10, tzinfo=timezone.utc)
+    return Fixture('antimeridian', _payload('Тавеуни', start, slots, weather), -16.85, -179.97)
+
+
+SCENARIOS = (summer_dry, persistent_rain, winter_snow, freezing_rain, windy, polar, antimeridian)
+
+
+def all_fixtures(slots=SYNTHETIC_SLOTS) -> list:
+    """ Все сценарии """
+    return [scenario(slots) for scenario in SCENARIOS]
+
+
+def write_replay(directory: str) -> list:
+    """ Записывает сценарии в папку для ReplayProvider, возвращает пути к файлам """
+    return [save_payload(directory, fixture.lat, fixture.lon, fixture.payload) for fixture in all_fixtures()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Запись сценариев для weather.provider: replay')
+    parser.add_argument('directory', help='папка для записанных ответов')
+    for path in write_replay(parser.parse_args().directory):
+        print(path)
@@ -0,0 +1,456 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Нагрузочный тест всего бота: синтетические обновления (геопозиция, "Использовать последнюю
+геопозицию", оценка прогноза, /stats) подаются в dp.feed_update с заданной скоростью.
+Запросы к Telegram обрабатывает подменная сессия бота (без сети, с заданной задержкой),
+прогнозы - источник погоды без сети (по умолчанию сценарии из fixtures.py, см. --weather),
+записи идут в БД из config.yml. Отчет: пропускная способность, p50/p95/p99 времени обработки,
+ошибки, задержка event loop (признак блокирующего кода в обработчиках).
+Запуск из корня репозитория:
+python benchmarks/load_test.py --rate 200 --duration 30
+python benchmarks/load_test.py --rate 500 --mix location=1,stats=1 --weather-latency 0.3 --no-db
+python benchmarks/load_test.py --weather replay --replay-dir weather_replay
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import time
+import zlib
+from collections import Counter, defaultdict
+from contextlib import suppress
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+sys.path.insert(0, os.path.join(parent_dir, 'scripts'))
+
+from aiohttp import web  # noqa: E402
+from aiogram import Bot  # noqa: E402
+from aiogram.client.bot import DefaultBotProperties  # noqa: E402
+from aiogram.client.session.base import BaseSession  # noqa: E402
+from aiogram.enums import ParseMode  # noqa: E402
+from aiogram.methods import GetMe, SendMessage  # noqa: E402
+from aiogram.types import InlineKeyboardMarkup, Update  # noqa: E402
+
+from fixtures import all_fixtures  # noqa: E402
+from scripts.handlers.main_handlers import dp  # noqa: E402
+import database_module  # noqa: E402
+import logger  # noqa: E402
+import metrics  # noqa: E402
+import weather_providers  # noqa: E402
+from outbound import outbound_queue  # noqa: E402
+from settings import conf  # noqa: E402
+from write_behind import write_queue  # noqa: E402
+
+BOT_TOKEN = '123456789:load-test'
+BOT_USER = {'id': 123456789, 'is_bot': True, 'first_name': 'Wash your car', 'username': 'load_test_bot'}
+LAST_GEO_TEXT = 'Использовать последнюю геопозицию'
+# Типы обновлений и их доля по умолчанию
+DEFAULT_MIX = {'location': 4, 'last_geo': 3, 'feedback': 2, 'stats': 1}
+# Центры, вокруг которых разбрасываются геопозиции пользователей
+CITIES = ((55.75, 37.62), (59.93, 30.31), (55.03, 82.92), (55.79, 49.12), (43.12, 131.89),
+          (56.84, 60.61), (54.99, 73.37), (45.04, 38.98))
+# Интервал проверки задержки event loop, секунды
+LOOP_PROBE_INTERVAL = 0.01
+# Источники прогноза: сценарии fixtures.py, synthetic_payload, записанные ответы,
+# локальный HTTP-сервер вместо OpenWeather (через настоящий клиент weather_client)
+WEATHER_SOURCES = ('fixtures', 'synthetic', 'replay', 'http')
+
+
+def run_weather_server(port: int, latency: float, error_rate: float, ready) -> None:
+    """
+    Замена OpenWeather (запускается в отдельном процессе, чтобы не занимать event loop бота).
+    Отвечает прогнозом из fixtures.py через latency секунд, доля error_rate ответов - 500
+    """
+    bodies = [json.dumps(fixture.payload, ensure_ascii=False).encode() for fixture in all_fixtures()]
+    rnd = random.Random(port)
+
+    async def handle_forecast(request) -> web.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        if rnd.random() < error_rate:
+            return web.json_response({'cod': 500, 'message': 'load test error'}, status=500)
+        cell = f"{request.query.get('lat')},{request.query.get('lon')}".encode()
+        return web.Response(body=bodies[zlib.crc32(cell) % len(bodies)], content_type='application/json')
+
+    async def serve() -> None:
+        app = web.Application()
+        app.router.add_get('/data/2.5/forecast', handle_forecast)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host='127.0.0.1', port=port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+def start_weather_server(latency: float, error_rate: float) -> tuple:
+    """ Запускает замену OpenWeather, возвращает (процесс, адрес API) """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=run_weather_server, args=(port, latency, error_rate, ready),
+                                      name='weather-stand-in', daemon=True)
+    process.start()
+    if not ready.wait(10):
+        process.terminate()
+        raise RuntimeError('Weather stand-in server did not start')
+    return process, f"http://127.0.0.1:{port}/data/2.5/forecast"
+
+
+def fixture_payloads():
+    """ payload_factory для SyntheticProvider: сценарий из fixtures.py, выбранный по координатам """
+    payloads = [fixture.payload for fixture in all_fixtures()]
+
+    def payload(lat, lon) -> dict:
+        return payloads[zlib.crc32(f"{lat},{lon}".encode()) % len(payloads)]
+
+    return payload
+
+
+def create_weather_provider(args) -> tuple:
+    """ Источник прогноза для теста, возвращает (источник, процесс сервера погоды или None) """
+    simulation = {'latency': args.weather_latency, 'error_rate': args.weather_error_rate, 'seed': args.seed}
+    if args.weather == 'http':
+        process, weather_url = start_weather_server(args.weather_latency, args.weather_error_rate)
+        # Клиент погоды ходит в локальную замену вместо OpenWeather
+        conf['weather'] = dict(conf.get('weather') or {}, url=weather_url)
+        return weather_providers.OpenWeatherProvider(), process
+    if args.weather == 'replay':
+        return weather_providers.ReplayProvider(args.replay_dir, **simulation), None
+    if args.weather == 'synthetic':
+        return weather_providers.SyntheticProvider(**simulation), None
+    return weather_providers.SyntheticProvider(fixture_payloads(), **simulation), None
+
+
+class FakeSession(BaseSession):
+    """
+    Сессия бота без сети: запрос сериализуется как для Telegram, ответ собирается локально
+    через latency секунд и проходит обычную проверку и разбор (check_response).
+    Запоминает последние кнопки оценки в каждом чате, чтобы нажимать их в тесте
+    """
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self.feedback = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot, method, timeout=None):
+        # Параметры готовятся так же, как для отправки в Telegram (по стоимости CPU)
+        for value in method.model_dump(warnings=False).values():
+            self.prepare_value(value, bot=bot, files={})
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if isinstance(method, GetMe):
+            result = BOT_USER
+        elif isinstance(method, SendMessage):
+            message_id = next(self._message_ids)
+            result = {'message_id': message_id, 'date': int(time.time()), 'text': method.text,
+                      'chat': {'id': method.chat_id, 'type': 'private'}, 'from': BOT_USER}
+            self._remember_feedback(method, message_id)
+        else:
+            result = True
+        response = self.check_response(bot=bot, method=method, status_code=200,
+                                       content=json.dumps({'ok': True, 'result': result}))
+        return response.result
+
+    def _remember_feedback(self, method, message_id: int) -> None:
+        if not isinstance(method.reply_markup, InlineKeyboardMarkup):
+            return
+        callback_data = method.reply_markup.inline_keyboard[0][0].callback_data or ''
+        if callback_data.startswith('feedback:'):
+            self.feedback[method.chat_id] = (int(callback_data.split(':')[1]), message_id)
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536,
+                             raise_for_status=True):
+        raise NotImplementedError('Load test session does not download files')
+        yield b''
+
+    async def close(self) -> None:
+        pass
+
+
+class UpdateFactory:
+    """ Синтетические обновления Telegram от пула пользователей """
+
+    def __init__(self, bot, session: FakeSession, users: int, spread: float, mix: dict, seed: int):
+        self.bot = bot
+        self.session = session
+        self.rnd = random.Random(seed)
+        self.users = [100000 + index for index in range(users)]
+        self.homes = {user_id: self.rnd.choice(CITIES) for user_id in self.users}
+        self.spread = spread
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}",
+                'username': f"user{user_id}"}
+
+    def _message(self, user_id: int, **content) -> dict:
+        return {'message_id': next(self._message_ids), 'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'}, 'from': self._user(user_id), **content}
+
+    def next(self) -> tuple:
+        """ Следующее обновление: (тип, Update) """
+        kind = self.rnd.choices(self.kinds, self.weights)[0]
+        user_id = self.rnd.choice(self.users)
+        if kind == 'feedback' and user_id not in self.session.feedback:
+            # Оценивать пока нечего: пользователь сначала получает прогноз
+            kind = 'location'
+
+        if kind == 'location':
+            home_lat, home_lon = self.homes[user_id]
+            payload = {'message': self._message(user_id, location={
+                'latitude': round(home_lat + self.rnd.uniform(-self.spread, self.spread), 6),
+                'longitude': round(home_lon + self.rnd.uniform(-self.spread, self.spread), 6)})}
+        elif kind == 'last_geo':
+            payload = {'message': self._message(user_id, text=LAST_GEO_TEXT)}
+        elif kind == 'stats':
+            payload = {'message': self._message(user_id, text='/stats')}
+        elif kind == 'feedback':
+            forecast_id, message_id = self.session.feedback[user_id]
+            message = self._message(user_id, text='forecast')
+            message.update({'message_id': message_id, 'from': BOT_USER})
+            payload = {'callback_query': {
+                'id': str(next(self._update_ids)), 'from': self._user(user_id),
+                'chat_instance': str(user_id), 'message': message,
+                'data': f"feedback:{forecast_id}:{self.rnd.choice(['like', 'dislike'])}"}}
+        else:
+            raise ValueError(f"Unknown update type: {kind}")
+        update = Update.model_validate(dict(payload, update_id=next(self._update_ids)),
+                                       context={'bot': self.bot})
+        return kind, update
+
+
+def percentile(values: list, percent: float) -> float:
+    """ Процентиль (nearest rank) отсортированного списка """
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, int(round(percent / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summary(values: list) -> dict:
+    """ Время в миллисекундах: p50/p95/p99/max """
+    values = sorted(values)
+    return {'count': len(values),
+            'p50_ms': percentile(values, 50) * 1000, 'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000, 'max_ms': (values[-1] if values else 0.0) * 1000}
+
+
+def counter_values(metric) -> dict:
+    """ Значения счетчика из метрик бота по меткам """
+    return {','.join(str(value) for value in labels.values()) or 'total': value
+            for _, labels, value in metric.samples()}
+
+
+def counter_deltas(after: dict, before: dict) -> dict:
+    """ Прирост счетчиков за время замера """
+    return {name: {key: value - before.get(name, {}).get(key, 0) for key, value in values.items()}
+            for name, values in after.items()}
+
+
+def bot_counters() -> dict:
+    """ Счетчики бота, которые попадают в отчет """
+    return {'forecast_cache': counter_values(metrics.FORECAST_CACHE_TOTAL),
+            'db_errors': counter_values(metrics.DB_ERRORS_TOTAL),
+            'weather_api_errors': counter_values(metrics.WEATHER_API_ERRORS_TOTAL),
+            'telegram_errors': counter_values(metrics.TELEGRAM_ERRORS_TOTAL)}
+
+
+async def warm_up(bot, factory: UpdateFactory, count: int) -> None:
+    """
+    Обрабатывает count обновлений по одному до замера: первые вызовы загружают
+    данные часовых поясов, открывают соединения и т.д., в отчет это не попадает
+    """
+    for _ in range(count):
+        _, update = factory.next()
+        with suppress(Exception):
+            await dp.feed_update(bot, update)
+
+
+async def probe_loop_lag(lags: list) -> None:
+    """ Насколько event loop опаздывает разбудить задачу (блокирующий код в обработчиках) """
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(LOOP_PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - started - LOOP_PROBE_INTERVAL))
+
+
+async def run_load(bot, factory: UpdateFactory, rate: float, duration: float, drain_timeout: float) -> dict:
+    """ Подает обновления со скоростью rate в секунду в течение duration секунд """
+    loop = asyncio.get_running_loop()
+    latencies = defaultdict(list)
+    errors = Counter()
+    schedule_lags = []
+    loop_lags = []
+    tasks = set()
+
+    async def handle(kind: str, update) -> None:
+        started = loop.time()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as error:
+            errors[f"{kind}:{type(error).__name__}"] += 1
+        latencies[kind].append(loop.time() - started)
+
+    probe = asyncio.create_task(probe_loop_lag(loop_lags))
+    total = int(rate * duration)
+    started = loop.time()
+    for index in range(total):
+        scheduled = started + index / rate
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        schedule_lags.append(max(0.0, loop.time() - scheduled))
+        task = asyncio.create_task(handle(*factory.next()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    sent_time = loop.time() - started
+
+    # Дожидаемся обработки поданных обновлений
+    unfinished = 0
+    if tasks:
+        _, pending = await asyncio.wait(set(tasks), timeout=drain_timeout)
+        unfinished = len(pending)
+        for task in pending:
+            task.cancel()
+    elapsed = loop.time() - started
+    probe.cancel()
+    with suppress(asyncio.CancelledError):
+        await probe
+
+    completed = sum(len(values) for values in latencies.values())
+    return {
+        'sent': total,
+        'completed': completed,
+        'unfinished': unfinished,
+        'offered_rate': total / sent_time if sent_time else 0.0,
+        'throughput': completed / elapsed if elapsed else 0.0,
+        'elapsed': elapsed,
+        'latency': {'all': summary([value for values in latencies.values() for value in values]),
+                    **{kind: summary(values) for kind, values in sorted(latencies.items())}},
+        'errors': dict(errors),
+        'error_rate': sum(errors.values()) / completed if completed else 0.0,
+        'schedule_lag': summary(schedule_lags),
+        'loop_lag': summary(loop_lags),
+    }
+
+
+def parse_mix(value: str) -> dict:
+    """ 'location=4,stats=1' -> {'location': 4, 'stats': 1} """
+    mix = {}
+    for item in value.split(','):
+        kind, _, weight = item.partition('=')
+        if kind.strip() not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown update type {kind!r}, expected one of {list(DEFAULT_MIX)}")
+        mix[kind.strip()] = float(weight or 1)
+    return mix
+
+
+def print_report(report: dict) -> None:
+    """ Отчет в консоль """
+    print(f"Sent {report['sent']} updates at {report['offered_rate']:.1f}/s, "
+          f"completed {report['completed']} in {report['elapsed']:.1f} s "
+          f"({report['throughput']:.1f} updates/s), unfinished {report['unfinished']}")
+    print(f"{'latency, ms':12s} {'count':>7s} {'p50':>8s} {'p95':>8s} {'p99':>8s} {'max':>8s}")
+    for kind, stats in report['latency'].items():
+        print(f"{kind:12s} {stats['count']:7d} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+              f"{stats['p99_ms']:8.1f} {stats['max_ms']:8.1f}")
+    for name in ('schedule_lag', 'loop_lag'):
+        stats = report[name]
+        print(f"{name:12s} {stats['count']:7d} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+              f"{stats['p99_ms']:8.1f} {stats['max_ms']:8.1f}")
+    print(f"Errors: {report['errors'] or 'none'} (rate {report['error_rate']:.2%})")
+    print(f"Telegram calls: {report['telegram_calls']}")
+    for name, values in report['bot_metrics'].items():
+        print(f"{name}: {values}")
+
+
+async def main() -> None:
+    """ Разбирает аргументы, запускает окружение и нагрузку, печатает отчет """
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота')
+    parser.add_argument('--rate', type=float, default=100, help='обновлений в секунду')
+    parser.add_argument('--duration', type=float, default=10, help='длительность подачи, секунды')
+    parser.add_argument('--users', type=int, default=1000, help='число пользователей')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='доли типов обновлений: location=4,last_geo=3,feedback=2,stats=1')
+    parser.add_argument('--spread', type=float, default=0.05,
+                        help='разброс геопозиций вокруг города, градусы (больше - меньше попаданий в кэш)')
+    parser.add_argument('--weather', choices=WEATHER_SOURCES, default='fixtures',
+                        help='источник прогноза (http - локальный сервер вместо OpenWeather)')
+    parser.add_argument('--replay-dir', default='weather_replay',
+                        help='папка с записанными ответами для --weather replay')
+    parser.add_argument('--weather-latency', type=float, default=0.1, help='задержка ответа погоды, секунды')
+    parser.add_argument('--weather-error-rate', type=float, default=0.0, help='доля ошибок погоды (0-1)')
+    parser.add_argument('--telegram-latency', type=float, default=0.05,
+                        help='задержка ответа Telegram, секунды')
+    parser.add_argument('--outbound', action='store_true',
+                        help='ограничивать запросы к Telegram очередью outbound (как в работе)')
+    parser.add_argument('--no-db', action='store_true', help='без БД (обработчики идут по веткам ошибок)')
+    parser.add_argument('--drain-timeout', type=float, default=30,
+                        help='ожидание обработки поданных обновлений, секунды')
+    parser.add_argument('--warmup', type=int, default=20, help='обновлений для прогрева до замера')
+    parser.add_argument('--seed', type=int, default=1, help='seed генератора обновлений')
+    parser.add_argument('--json', help='записать отчет в файл JSON')
+    args = parser.parse_args()
+    logger.setup_logging()
+
+    provider, weather_process = create_weather_provider(args)
+    weather_providers.install(provider)
+
+    session = FakeSession(args.telegram_latency)
+    bot = Bot(BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    if args.outbound:
+        outbound_queue.install(bot)
+    if not args.no_db and await database_module.create_pool(conf['db']) is None:
+        print('Warning: database is not available, handlers will take their error paths')
+    write_queue.start()
+
+    factory = UpdateFactory(bot, session, args.users, args.spread, args.mix, args.seed)
+    try:
+        await warm_up(bot, factory, args.warmup)
+        session.calls.clear()
+        counters_before = bot_counters()
+        report = await run_load(bot, factory, args.rate, args.duration, args.drain_timeout)
+    finally:
+        await weather_providers.close()
+        await write_queue.drain()
+        await database_module.close_pool()
+        if weather_process is not None:
+            weather_process.terminate()
+
+    report['telegram_calls'] = dict(session.calls)
+    report['bot_metrics'] = counter_deltas(bot_counters(), counters_before)
+    report['bot_metrics']['write_queue'] = write_queue.stats()
+    if args.outbound:
+        report['bot_metrics']['outbound'] = outbound_queue.stats()
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(dict(report, args=vars(args)), file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
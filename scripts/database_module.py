@@ -5,31 +5,146 @@ OpenWeather) и дает совет, целесообразно ли сегод
 Бот можно найти по адресу:
 https://t.me/worth_wash_car_bot
 
-Функциональность для взаимодействия с БД
+Функциональность для взаимодействия с БД.
+Используется асинхронный пул подключений asyncpg: подключение берется из пула
+на время запроса и возвращается обратно, без установки нового TCP-соединения.
 """
 
-import psycopg2
+import asyncio
 import logging
-import logger
+import time
+from contextlib import asynccontextmanager
 
-logger.setup_logging()
+import asyncpg
+import metrics
+from settings import section_settings
 
+# Ошибки получения подключения (БД недоступна, пул не создан или исчерпан)
+CONNECTION_ERRORS = (asyncpg.InterfaceError, OSError, asyncio.TimeoutError)
+# Ошибки, при которых запрос к БД считается неуспешным
+DB_ERRORS = (asyncpg.PostgresError,) + CONNECTION_ERRORS
+# Временные ошибки, после которых запрос имеет смысл повторить
+TRANSIENT_ERRORS = (asyncpg.PostgresConnectionError, asyncpg.SerializationError,
+                    asyncpg.DeadlockDetectedError, asyncpg.TooManyConnectionsError,
+                    asyncpg.CannotConnectNowError, asyncpg.AdminShutdownError) + CONNECTION_ERRORS
 
-def connect_to_db(dbname, user, password, host) -> tuple:
-    """ Функция для подключения к БД """
+# Значения по умолчанию для настроек пула (секция db.pool в config.yml)
+POOL_DEFAULTS = {
+    'min_size': 2,
+    'max_size': 10,
+    'max_queries': 50000,
+    'max_inactive_connection_lifetime': 300,
+    'acquire_timeout': 5,
+    'health_check_interval': 30,
+}
+
+_pool = None
+_pool_lock = asyncio.Lock()
+_db_conf = None
+_pool_settings = dict(POOL_DEFAULTS)
+# Время последней проверки подключения, ключ - pid серверного процесса
+_last_health_check = {}
+
+
+async def _check_connection(conn) -> None:
+    """
+    Проверка "здоровья" подключения при выдаче из пула.
+    Запрос SELECT 1 выполняется не чаще, чем раз в health_check_interval секунд
+    """
+    interval = _pool_settings['health_check_interval']
+    if not interval:
+        return
+    pid = conn.get_server_pid()
+    now = time.monotonic()
+    if now - _last_health_check.get(pid, 0) >= interval:
+        await conn.fetchval('SELECT 1')
+        _last_health_check[pid] = now
+
+
+async def create_pool(db_conf: dict):
+    """
+    Функция создает пул подключений к БД.
+    Принимает секцию db из config.yml.
+    Если БД недоступна, пул будет создан повторно при следующем запросе
+    """
+    global _pool, _db_conf
+    _db_conf = db_conf
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await _create_pool(db_conf)
+    return _pool
+
+
+async def _create_pool(db_conf: dict):
+    """ Создание пула с настройками из секции db.pool """
+    _pool_settings.update(section_settings(db_conf.get('pool'), POOL_DEFAULTS, 'db.pool'))
+    try:
+        pool = await asyncpg.create_pool(
+            database=db_conf['database_name'],
+            user=db_conf['user_name'],
+            password=db_conf['user_password'],
+            host=db_conf['host'],
+            min_size=_pool_settings['min_size'],
+            max_size=_pool_settings['max_size'],
+            max_queries=_pool_settings['max_queries'],
+            max_inactive_connection_lifetime=_pool_settings['max_inactive_connection_lifetime'],
+            timeout=_pool_settings['acquire_timeout'],
+            setup=_check_connection,
+        )
+        logging.info(f"Database pool created: min_size={_pool_settings['min_size']}, "
+                     f"max_size={_pool_settings['max_size']}")
+        return pool
+    except DB_ERRORS as error:
+        logging.error(f"Error creating database pool: {error}")
+        return None
+
+
+async def connect(db_conf: dict):
+    """ Отдельное подключение к БД вне пула (для миграций и служебных скриптов) """
+    return await asyncpg.connect(
+        database=db_conf['database_name'],
+        user=db_conf['user_name'],
+        password=db_conf['user_password'],
+        host=db_conf['host'],
+    )
+
+
+def is_available() -> bool:
+    """ Создан ли пул подключений (False - БД была недоступна при создании пула) """
+    return _pool is not None
+
+
+async def close_pool() -> None:
+    """ Функция закрывает пул подключений к БД """
+    global _pool, _db_conf
+    _db_conf = None
+    if _pool is None:
+        return
     try:
-        conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host)
-        cur = conn.cursor()
-        return conn, cur
-    except psycopg2.Error as error:
-        logging.error(f"Error connecting to the database: {error}")
-        return None, None
+        await _pool.close()
+    except DB_ERRORS as error:
+        logging.error(f"Error closing database pool: {error}")
+    finally:
+        _pool = None
+        _last_health_check.clear()
 
 
-def close_connection_db(conn, cur) -> None:
-    """ Функция закрывает подключение к БД """
+@asynccontextmanager
+async def connection():
+    """
+    Контекстный менеджер для получения подключения из пула.
+    Если пул не создан или подключение не получено за acquire_timeout секунд,
+    выбрасывается исключение из DB_ERRORS
+    """
+    if _pool is None and _db_conf is not None:
+        await create_pool(_db_conf)
+    started = time.perf_counter()
     try:
-        cur.close()
-        conn.close()
-    except Exception as error:
-        logging.error(f"Error closing connection: {error}")
+        if _pool is None:
+            raise asyncpg.InterfaceError('Database pool is not initialized')
+        async with _pool.acquire(timeout=_pool_settings['acquire_timeout']) as conn:
+            metrics.PHASE_SECONDS.labels('db_acquire').observe(time.perf_counter() - started)
+            yield conn
+    except DB_ERRORS as error:
+        metrics.DB_ERRORS_TOTAL.labels(type(error).__name__).inc()
+        raise
@@ -0,0 +1,106 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Кэш прогнозов погоды в памяти процесса.
+Координаты округляются до ячейки сетки (точность задается в config.yml),
+запись живет до начала следующего 3-часового слота прогноза OpenWeather.
+"""
+
+import time
+from collections import OrderedDict
+
+from settings import conf, section_settings
+
+# Длительность слота прогноза OpenWeather (00:00, 03:00, ... UTC), секунды
+SLOT_SECONDS = 3 * 3600
+
+# Значения по умолчанию для секции forecast_cache в config.yml
+CACHE_DEFAULTS = {
+    'precision': 2,    # знаков после запятой в координатах ячейки (~1 км)
+    'max_size': 4096,  # максимум ячеек в кэше
+}
+
+
+def next_slot_boundary(now: float) -> float:
+    """ Время (epoch) начала следующего слота прогноза """
+    return (int(now) // SLOT_SECONDS + 1) * SLOT_SECONDS
+
+
+class ForecastCache:
+    """
+    LRU-кэш прогнозов по ячейкам сетки координат.
+    Запись удаляется при наступлении следующего слота прогноза
+    или при переполнении (вытесняется самая давно использованная)
+    """
+
+    def __init__(self, precision: int = CACHE_DEFAULTS['precision'],
+                 max_size: int = CACHE_DEFAULTS['max_size']):
+        self.precision = precision
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cell(self, lat, lon) -> tuple:
+        """ Ячейка сетки для координат (долгота приводится к диапазону [-180, 180)) """
+        lon = (float(lon) + 180) % 360 - 180
+        return round(float(lat), self.precision), round(lon, self.precision)
+
+    def get(self, cell, now: float = None):
+        """ Возвращает прогноз для ячейки или None, если его нет или он устарел """
+        if now is None:
+            now = time.time()
+        entry = self._entries.get(cell)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if now >= expires_at:
+            del self._entries[cell]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(cell)
+        self.hits += 1
+        return value
+
+    def put(self, cell, value, now: float = None) -> None:
+        """ Сохраняет прогноз для ячейки до начала следующего слота """
+        if now is None:
+            now = time.time()
+        self._entries[cell] = (next_slot_boundary(now), value)
+        self._entries.move_to_end(cell)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """ Очищает кэш (счетчики сохраняются) """
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """ Счетчики попаданий/промахов кэша """
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+def _create_cache() -> ForecastCache:
+    """ Создает кэш с настройками из config.yml """
+    settings = section_settings(conf.get('forecast_cache'), CACHE_DEFAULTS, 'forecast_cache')
+    return ForecastCache(precision=settings['precision'], max_size=settings['max_size'])
+
+
+forecast_cache = _create_cache()
@@ -0,0 +1,175 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Компактное представление прогноза OpenWeather.
+Из ответа /data/2.5/forecast один раз извлекаются только поля, нужные для
+рекомендации и сохранения в БД: числовые поля - матрицей NumPy, описания погоды -
+флагами и кортежем строк. Вложенный JSON после разбора не хранится.
+"""
+
+import hashlib
+import json
+import sys
+from functools import lru_cache
+
+# Название локации, если OpenWeather его не прислал
+UNKNOWN_LOCATION = 'Неизвестно'
+
+# Столбцы числовой матрицы прогноза
+FORECAST_COLUMNS = ('temp', 'humidity', 'rain_3h', 'snow_3h', 'wind', 'dt')
+KELVIN_OFFSET = 273.15
+
+# Флаги интервала прогноза по описанию погоды
+FLAG_BAD_WEATHER = 1  # дождь, снег, ливень, мокрый снег, изморось
+FLAG_PRECIPITATION = 2  # дождь, снег, ливень, мокрый снег
+FLAG_RAIN = 4  # дождь
+FLAG_RAIN_OR_SNOW = 8  # дождь или снег
+FLAG_FREEZING_PRECIPITATION = 16  # дождь, снег, мокрый - риск гололёда при низкой температуре
+
+BAD_WEATHER_KEYWORDS = ('дождь', 'снег', 'ливень', 'мокрый снег', 'изморось')
+PRECIPITATION_KEYWORDS = ('дождь', 'снег', 'ливень', 'мокрый снег')
+FREEZING_KEYWORDS = ('дождь', 'снег', 'мокрый')
+
+
+@lru_cache(maxsize=512)
+def description_flags(description):
+    """ Флаги интервала по описанию погоды (описаний немного, поэтому кэшируются) """
+    description = description.lower()
+    flags = 0
+    if any(keyword in description for keyword in BAD_WEATHER_KEYWORDS):
+        flags |= FLAG_BAD_WEATHER
+    if any(keyword in description for keyword in PRECIPITATION_KEYWORDS):
+        flags |= FLAG_PRECIPITATION
+    if 'дождь' in description:
+        flags |= FLAG_RAIN
+    if 'дождь' in description or 'снег' in description:
+        flags |= FLAG_RAIN_OR_SNOW
+    if any(keyword in description for keyword in FREEZING_KEYWORDS):
+        flags |= FLAG_FREEZING_PRECIPITATION
+    return flags
+
+
+class ForecastSeries:
+    """
+    Прогноз с шагом 3 часа.
+    rows - матрица (интервал x FORECAST_COLUMNS), температура в °C;
+    flags - флаги описаний погоды; descriptions - описания погоды как есть
+    """
+
+    __slots__ = ('city_name', 'rows', 'flags', 'descriptions', '_snapshot')
+
+    def __init__(self, city_name, rows, flags, descriptions):
+        self.city_name = city_name
+        self.rows = rows
+        self.flags = flags
+        self.descriptions = descriptions
+        self._snapshot = None
+
+    @classmethod
+    def from_payload(cls, payload):
+        """ Разбирает ответ OpenWeather за один проход по списку интервалов """
+        # NumPy загружается при первом прогнозе (или фоновым прогревом), а не при запуске бота
+        import numpy as np
+
+        items = payload['list']
+        empty = {}
+        values = []
+        append_row = values.extend
+        descriptions = []
+        for item in items:
+            main = item['main']
+            append_row((main['temp'],
+                        main['humidity'],
+                        item.get('rain', empty).get('3h', 0) or 0,
+                        item.get('snow', empty).get('3h', 0) or 0,
+                        item.get('wind', empty).get('speed', 0),
+                        item.get('dt', 0)))
+            descriptions.append(sys.intern(item['weather'][0]['description']))
+
+        rows = np.array(values, dtype=np.float64).reshape(-1, len(FORECAST_COLUMNS))
+        rows[:, 0] -= KELVIN_OFFSET
+        flags = np.array([description_flags(description) for description in descriptions],
+                         dtype=np.uint8)
+        city_name = payload.get('city', empty).get('name', UNKNOWN_LOCATION)
+        return cls(city_name, rows, flags, tuple(descriptions))
+
+    def to_payload(self) -> dict:
+        """
+        Сокращенный прогноз в формате OpenWeather (для сохранения в БД):
+        только поля, которые использует бот
+        """
+        items = []
+        for (temp, humidity, rain, snow, wind, timestamp), description in zip(
+                self.rows.tolist(), self.descriptions):
+            item = {
+                'dt': int(timestamp),
+                'main': {'temp': round(temp + KELVIN_OFFSET, 2), 'humidity': plain_number(humidity)},
+                'weather': [{'description': description}],
+                'wind': {'speed': plain_number(wind)},
+            }
+            if rain:
+                item['rain'] = {'3h': plain_number(rain)}
+            if snow:
+                item['snow'] = {'3h': plain_number(snow)}
+            items.append(item)
+        return {'cnt': len(items), 'list': items, 'city': {'name': self.city_name}}
+
+    def snapshot(self) -> tuple:
+        """
+        Снимок прогноза для таблицы weather_snapshots: (sha256, JSON).
+        JSON нормализован (сортировка ключей, без пробелов), поэтому одинаковые
+        прогнозы дают одинаковый хэш. Считается один раз на прогноз
+        """
+        if self._snapshot is None:
+            payload_json = json.dumps(self.to_payload(), ensure_ascii=False,
+                                      sort_keys=True, separators=(',', ':'))
+            self._snapshot = (hashlib.sha256(payload_json.encode()).digest(), payload_json)
+        return self._snapshot
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def temp(self):
+        """ Температура, °C """
+        return self.rows[:, 0]
+
+    @property
+    def humidity(self):
+        """ Влажность, % """
+        return self.rows[:, 1]
+
+    @property
+    def rain_3h(self):
+        """ Дождь за 3 часа, мм """
+        return self.rows[:, 2]
+
+    @property
+    def snow_3h(self):
+        """ Снег за 3 часа, мм """
+        return self.rows[:, 3]
+
+    @property
+    def wind(self):
+        """ Скорость ветра, м/с """
+        return self.rows[:, 4]
+
+    @property
+    def dt(self):
+        """ Время начала интервала (UTC, epoch секунды) """
+        return self.rows[:, 5].astype('int64')
+
+    @property
+    def nbytes(self) -> int:
+        """ Объем данных в массивах NumPy, байт """
+        return self.rows.nbytes + self.flags.nbytes
+
+
+def plain_number(value):
+    """ Число в обычное число Python (целые без дробной части, как в JSON) """
+    value = float(value)
+    return int(value) if value.is_integer() else value
@@ -9,37 +9,91 @@ https://t.me/worth_wash_car_bot
 """
 
 import logging
-import json
-import requests
-import emoji
 from aiogram import types, Router, F
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message
 from aiogram.utils.markdown import hbold
 
 # Импорты из текущей директории
-import logger
 import keyboards
-from functions import read_yaml
+import messages
 from wash_functions import recommend_car_wash
 import last_geo
 import database_module
+import weather_providers
+import metrics
+from forecast_cache import forecast_cache
+from single_flight import SingleFlight
+from forecast_series import ForecastSeries
 
 # Импорты из того же пакета (handlers)
-from .rate_handlers import get_feedback_keyboard, save_forecast_to_db, get_last_car_wash_id
-
-HELP_MESSAGE = emoji.emojize(f"\n{hbold('Мыть машину?')} - телеграм бот, который по запросу "
-                             "анализирует погоду (используется OpenWeather) и дает совет, "
-                             "целесообразно ли сегодня помыть машину.\n\n"
-                             "/start - старт бота;\n"
-                             "/restart - рестарт бота;\n"
-                             "/help - открыть помощь;\n"
-                             "/stats - статистика оценок.")
+from .rate_handlers import get_feedback_keyboard, reserve_forecast_id, save_forecast_to_db
+
+FORECAST_ERROR_MESSAGE = "Не удалось получить прогноз погоды, попробуйте позже."
 basic_router = Router()
-logger.setup_logging()
-conf = read_yaml('config.yml')
 lat = -999
 lon = -999
+# Одновременные запросы прогноза для одной ячейки объединяются в один
+forecast_flights = SingleFlight()
+
+
+async def _fetch_cell_forecast(cell) -> ForecastSeries:
+    """
+    Запрашивает прогноз ячейки у источника погоды и кладет его в кэш.
+    Ответ разбирается в ForecastSeries один раз, JSON дальше не хранится
+    """
+    forecast = await weather_providers.get_forecast(*cell)
+    forecast_cache.put(cell, forecast)
+    return forecast
+
+
+async def get_forecast(latitude, longitude) -> ForecastSeries:
+    """
+    Возвращает прогноз для геопозиции.
+    Сначала ищет прогноз ячейки сетки в кэше, при промахе запрашивает источник погоды
+    (если запрос для этой ячейки уже выполняется - ждет его результат)
+    """
+    cell = forecast_cache.cell(latitude, longitude)
+    forecast = forecast_cache.get(cell)
+    if forecast is None:
+        metrics.FORECAST_CACHE_TOTAL.labels('miss').inc()
+        forecast = await forecast_flights.do(cell, lambda: _fetch_cell_forecast(cell))
+    else:
+        metrics.FORECAST_CACHE_TOTAL.labels('hit').inc()
+        logging.debug(f"Forecast cache hit for cell {cell}")
+    return forecast
+
+
+async def send_forecast(message: Message, forecast: ForecastSeries, latitude, longitude) -> None:
+    """
+    Отправляет рекомендацию одним сообщением вместе с кнопками оценки и сохраняет прогноз.
+    ID прогноза резервируется до отправки, поэтому кнопки не нужно добавлять отдельным запросом
+    """
+    with metrics.phase('recommend'):
+        recommendation_text = recommend_car_wash(forecast, latitude, longitude)
+    location_name = forecast.city_name
+
+    # Если БД недоступна, ID нет: рекомендация уходит без кнопок оценки и не сохраняется
+    forecast_id = await reserve_forecast_id()
+    sent_message = await message.answer(
+        text=messages.FORECAST_MESSAGE.format(recommendation=recommendation_text, location=location_name),
+        parse_mode='HTML',
+        reply_markup=get_feedback_keyboard(forecast_id) if forecast_id else None
+    )
+    if forecast_id is None:
+        return
+
+    await save_forecast_to_db(
+        forecast_id=forecast_id,
+        user_id=message.from_user.id,
+        user_name=message.from_user.username,
+        lat=latitude,
+        lon=longitude,
+        weather_snapshot=forecast.snapshot(),
+        recommendation_text=recommendation_text,
+        message_id=sent_message.message_id,
+        location_name=location_name
+    )
 
 
 @basic_router.message(CommandStart())
@@ -49,12 +103,7 @@ async def command_start_handler(message: Message) -> None:
     """
     logging.debug('Executing: command_start_handler')
     await message.answer(
-        text=emoji.emojize(f"Привет, {hbold(message.from_user.full_name)}!\n"
-                           f"\n{hbold('Мыть машину?')} - телеграм бот, который по запросу "
-                           "анализирует погоду (используется OpenWeather) и дает совет, "
-                           "целесообразно ли сегодня помыть машину.\n\n"
-                           "Чтобы начать, примите соглашение :newspaper: и отправьте свою "
-                           "геопозицию :round_pushpin:"),
+        text=messages.START_MESSAGE.format(name=hbold(message.from_user.full_name)),
         parse_mode='HTML',
         reply_markup=keyboards.start_keyboard)
 
@@ -66,12 +115,7 @@ async def agreement(message: Message) -> None:
     """
     logging.debug('Executing: agreement')
     await message.answer(
-        text=emoji.emojize(f"{hbold('Мыть машину?')} анализирует данные об использовании бота, "
-                           "в том числе об устройстве, на котором он функционирует, источник "
-                           "установки, составляет конверсию и статистику вашей активности в "
-                           "целях продуктовой аналитики, анализа и оптимизации рекламных "
-                           "кампаний, а также для устранения ошибок. Собранная таким образом "
-                           "информация не может идентифицировать вас."),
+        text=messages.AGREEMENT_MESSAGE,
         parse_mode='HTML',
         reply_markup=keyboards.accept_agreement_keyboard)
 
@@ -83,9 +127,10 @@ async def work(message: Message) -> None:
     """
     logging.debug('Executing: work')
     await message.answer(
-        text=emoji.emojize("Чтобы получить прогноз, отправьте свою геопозицию :round_pushpin:"),
+        text=messages.SEND_LOCATION_MESSAGE,
         parse_mode='HTML',
-        reply_markup=keyboards.send_position_keyboard)
+        # Сразу полная клавиатура: после прогноза ее не нужно менять отдельным сообщением
+        reply_markup=keyboards.second_keyboard)
 
 
 @basic_router.message(Command(commands=['restart']))
@@ -102,7 +147,7 @@ async def show_help(message: Message) -> None:
     """
     Вывести справку по кнопке помощь
     """
-    await message.answer(text=HELP_MESSAGE)
+    await message.answer(text=messages.HELP_MESSAGE)
 
 
 @basic_router.message(Command(commands=['help']))
@@ -110,7 +155,7 @@ async def show_help(message: Message) -> None:
     """
     Вывести справку по команде /help
     """
-    await message.answer(text=HELP_MESSAGE)
+    await message.answer(text=messages.HELP_MESSAGE)
 
 
 @basic_router.message(F.location)
@@ -130,69 +175,22 @@ async def handle_location(message: types.Message) -> None:
                  lat,
                  lon)
 
-    # Сохраняем геопозицию в основную таблицу
-    conn, cur = database_module.connect_to_db(conf['db']['database_name'],
-                                              conf['db']['user_name'],
-                                              conf['db']['user_password'],
-                                              conf['db']['host'])
-    if conn and cur:
-        last_geo_status = last_geo.check_last_geo(cur, user_id)
-        if last_geo_status:
-            last_geo.update_last_geo(conn, cur, user_id, lat, lon)
-        elif last_geo_status is False:
-            last_geo.insert_last_geo(conn,
-                                    cur,
-                                    'NULL',
-                                    user_id,
-                                    user_username,
-                                    lat,
-                                    lon,
-                                    'NULL')
-        database_module.close_connection_db(conn, cur)
-    else:
-        logging.info('Can not connect to database!')
-
     # Получаем прогноз погоды
-    response = requests.get("https://api.openweathermap.org/data/2.5/"
-                            f"forecast?lang=ru&lat={lat}&lon={lon}&"
-                            f"appid={conf['open_weather_token']}",
-                            timeout=10)
-    weather_dict = json.loads(response.text)
-
-    # Получаем рекомендацию
-    recommendation_text = recommend_car_wash(weather_dict, lat, lon)
-    location_name = weather_dict.get('city', {}).get('name', 'Неизвестно')
-
-    # Отправляем сообщение с рекомендацией
-    sent_message = await message.answer(
-        text=emoji.emojize(f"{recommendation_text}\n\n:round_pushpin: Локация: {location_name}"),
-        parse_mode='HTML'
-    )
-
-    # Получаем ID последней записи в car_washes
-    car_wash_id = await get_last_car_wash_id(user_id)
-
-    # Сохраняем прогноз в базу
-    forecast_id = await save_forecast_to_db(
-        user_id=user_id,
-        car_wash_id=car_wash_id,
-        weather_data=weather_dict,
-        recommendation_text=recommendation_text,
-        message_id=sent_message.message_id,
-        location_name=location_name
-    )
-
-    # Добавляем кнопки оценки к сообщению
-    if forecast_id:
-        await sent_message.edit_reply_markup(
-            reply_markup=get_feedback_keyboard(forecast_id)
-        )
-
-    # Отправляем клавиатуру для дальнейших действий
-    await message.reply(
-        "",
-        reply_markup=keyboards.second_keyboard
-    )
+    try:
+        forecast = await get_forecast(lat, lon)
+    except weather_providers.WeatherApiError as error:
+        logging.error(f"Can not get forecast: {error}")
+        # Геопозицию все равно сохраняем, чтобы ее можно было использовать позже
+        try:
+            async with database_module.connection() as conn:
+                await last_geo.upsert_last_geo(conn, user_id, user_username, lat, lon)
+        except database_module.DB_ERRORS as db_error:
+            logging.info(f'Can not connect to database! {db_error}')
+        await message.answer(FORECAST_ERROR_MESSAGE, reply_markup=keyboards.second_keyboard)
+        return
+
+    # Рекомендация, кнопки оценки и сохранение прогноза
+    await send_forecast(message, forecast, lat, lon)
 
 
 @basic_router.message(F.text == 'Использовать последнюю геопозицию')
@@ -204,58 +202,25 @@ async def use_old_location(message: types.Message) -> None:
         logging.debug('Executing: use_old_location')
 
         user_id = message.from_user.id
-        conn, cur = database_module.connect_to_db(conf['db']['database_name'],
-                                                  conf['db']['user_name'],
-                                                  conf['db']['user_password'],
-                                                  conf['db']['host'])
-        if conn and cur:
-            old_lat, old_lon = last_geo.get_last_geo(cur, user_id)
-            database_module.close_connection_db(conn, cur)
-        else:
-            logging.error('Can not connect to database!')
+        old_lat, old_lon = None, None
+        try:
+            async with database_module.connection() as conn:
+                old_lat, old_lon = await last_geo.get_last_geo(conn, user_id)
+        except database_module.DB_ERRORS as error:
+            logging.error(f'Can not connect to database! {error}')
 
         logging.info(f"latitude:  {old_lat}\nlongitude: {old_lon}")
         if old_lat and old_lon:
-            response = requests.get("https://api.openweathermap.org/data/2.5/"
-                                    f"forecast?lang=ru&lat={old_lat}&lon={old_lon}&"
-                                    f"appid={conf['open_weather_token']}",
-                                    timeout=10)
-            weather_dict = json.loads(response.text)
-
-            recommendation_text = recommend_car_wash(weather_dict, old_lat, old_lon)
-            location_name = weather_dict.get('city', {}).get('name', 'Неизвестно')
-            full_text = emoji.emojize(f"{recommendation_text}\n\n:round_pushpin: Локация: {location_name}")
-
-            # Отправляем сообщение с рекомендацией
-            sent_message = await message.answer(
-                full_text,
-                parse_mode='HTML'
-            )
-
-            # Получаем ID последней записи в car_washes
-            car_wash_id = await get_last_car_wash_id(user_id)
-
-            # Сохраняем прогноз в базу
-            forecast_id = await save_forecast_to_db(
-                user_id=user_id,
-                car_wash_id=car_wash_id,
-                weather_data=weather_dict,
-                recommendation_text=recommendation_text,
-                message_id=sent_message.message_id,
-                location_name=location_name
-            )
-
-            # Добавляем кнопки оценки к сообщению
-            if forecast_id:
-                await sent_message.edit_reply_markup(
-                    reply_markup=get_feedback_keyboard(forecast_id)
-                )
-
-            # Отправляем клавиатуру для дальнейших действий
-            await message.answer(
-                "",
-                reply_markup=keyboards.second_keyboard
-            )
+            try:
+                forecast = await get_forecast(old_lat, old_lon)
+            except weather_providers.WeatherApiError as error:
+                logging.error(f"Can not get forecast: {error}")
+                await message.answer(FORECAST_ERROR_MESSAGE, reply_markup=keyboards.second_keyboard)
+                return
+
+            # Геопозиция прежняя, но запись прогноза (SAVE_LOCATION_FORECAST_SQL) заново
+            # upsert-ит строку car_washes с теми же координатами, из нее берется car_wash_id
+            await send_forecast(message, forecast, old_lat, old_lon)
         else:
             await message.answer("Нет данных о последней использованной геопозиции, "
                                  "для использования этой функции отправьте геопозицию!",
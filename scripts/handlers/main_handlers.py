@@ -9,14 +9,19 @@ https://t.me/worth_wash_car_bot
 """
 
 from aiogram import Dispatcher
+from metrics import MetricsMiddleware
 from .basic_handlers import basic_router
 from .statistics_handlers import statistics_router
 from .rate_handlers import rate_router
+from .subscription_handlers import subscription_router
 
 # Создаем главный диспетчер
 dp = Dispatcher()
+# Метрики обновлений: число, время обработки, обновления в обработке
+dp.update.outer_middleware(MetricsMiddleware())
 
 # Включаем все роутеры
 dp.include_router(basic_router)
 dp.include_router(statistics_router)
 dp.include_router(rate_router)
+dp.include_router(subscription_router)
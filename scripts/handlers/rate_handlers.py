@@ -8,32 +8,44 @@ https://t.me/worth_wash_car_bot
 Функциональность хэндлеров оценки пронозов
 """
 
-import json
 import logging
+from collections import deque
+from functools import partial
 from aiogram import Router, F
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-import emoji
 
 # Локальные импорты
 import database_module
-import logger
-from functions import read_yaml
+import keyboards
+import last_geo
+import messages
+import metrics
+from write_behind import write_queue
+from user_stats import user_stats_cache
 
-logger.setup_logging()
-conf = read_yaml('config.yml')
 rate_router = Router()
 
+SAVE_FEEDBACK_SQL = """
+    INSERT INTO feedback (forecast_id, user_id, is_positive)
+    VALUES ($1, $2, $3)
+    ON CONFLICT (forecast_id, user_id)
+    DO UPDATE SET is_positive = EXCLUDED.is_positive
+"""
+# Сколько ID прогнозов резервировать за один запрос к БД
+FORECAST_ID_BLOCK = 50
+_forecast_ids = deque()
+
 
 def get_feedback_keyboard(forecast_id: int) -> InlineKeyboardMarkup:
     """Создает inline-клавиатуру для оценки прогноза"""
     keyboard = [
         [
             InlineKeyboardButton(
-                text=emoji.emojize(":thumbs_up: Правильно"),
+                text=messages.LIKE_BUTTON,
                 callback_data=f"feedback:{forecast_id}:like"
             ),
             InlineKeyboardButton(
-                text=emoji.emojize(":thumbs_down: Ошибся"),
+                text=messages.DISLIKE_BUTTON,
                 callback_data=f"feedback:{forecast_id}:dislike"
             )
         ]
@@ -51,103 +63,74 @@ def extract_recommendation_type(recommendation_text: str) -> str:
         return "unknown"
 
 
-async def save_forecast_to_db(user_id: int, car_wash_id: int, weather_data: dict, 
-                            recommendation_text: str, message_id: int, location_name: str = "") -> int:
-    """ Сохраняет прогноз в базу данных и возвращает его ID """
-    conn, cur = database_module.connect_to_db(
-        conf['db']['database_name'],
-        conf['db']['user_name'],
-        conf['db']['user_password'],
-        conf['db']['host']
-    )
-    if not conn or not cur:
-        logging.error("Не удалось подключиться к базе данных")
-        return None
-
-    try:
-        # Определяем тип рекомендации
-        rec_type = extract_recommendation_type(recommendation_text)
-
-        # Сохраняем прогноз
-        cur.execute("""
-            INSERT INTO forecasts 
-            (user_id, car_wash_id, weather_data, recommendation, recommendation_type, message_id, location_name)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (user_id, car_wash_id, json.dumps(weather_data), recommendation_text, rec_type, message_id, location_name))
-
-        forecast_id = cur.fetchone()[0]
-        conn.commit()
-        logging.info(f"Сохранен прогноз ID: {forecast_id} для пользователя {user_id}")
-
-        return forecast_id
-
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении прогноза: {e}")
-        conn.rollback()
-        return None
-    finally:
-        database_module.close_connection_db(conn, cur)
+async def reserve_forecast_id() -> int | None:
+    """
+    Резервирует ID прогноза в последовательности таблицы forecasts.
+    ID берутся из БД блоками по FORECAST_ID_BLOCK, чтобы не ходить в БД за каждым
+    """
+    if not _forecast_ids:
+        try:
+            with metrics.phase('reserve_forecast_id'):
+                async with database_module.connection() as conn:
+                    rows = await conn.fetch(
+                        "SELECT nextval(pg_get_serial_sequence('forecasts', 'id')) "
+                        "FROM generate_series(1, $1)", FORECAST_ID_BLOCK)
+        except database_module.DB_ERRORS as e:
+            logging.error(f"Ошибка при резервировании ID прогноза: {e}")
+            return None
+        _forecast_ids.extend(row[0] for row in rows)
+    return _forecast_ids.popleft()
+
+
+async def save_forecast_to_db(forecast_id: int, user_id: int, user_name: str, lat: float, lon: float,
+                              weather_snapshot: tuple, recommendation_text: str, message_id: int,
+                              location_name: str = "") -> None:
+    """
+    Сохраняет геопозицию пользователя и прогноз в базу данных.
+    forecast_id - ID, заранее полученный из reserve_forecast_id (он уже есть в кнопках оценки);
+    weather_snapshot - (хэш, JSON) из ForecastSeries.snapshot().
+    Запись выполняется в фоне (write-behind)
+    """
+    # Определяем тип рекомендации
+    rec_type = extract_recommendation_type(recommendation_text)
+
+    # Запись в очередь (ждет, только если очередь переполнена)
+    with metrics.phase('forecast_enqueue'):
+        await write_queue.put(
+            last_geo.SAVE_LOCATION_FORECAST_SQL,
+            (user_id, user_name, lat, lon, forecast_id, *weather_snapshot,
+             recommendation_text, rec_type, message_id, location_name),
+            # Пока прогноз не записан, его владельца и геопозицию видно в pending
+            key=('forecast', forecast_id), value=(user_id, lat, lon),
+            on_flush=partial(user_stats_cache.invalidate, user_id))
+    # Статистика изменится после записи, старое значение из кэша больше не нужно
+    user_stats_cache.invalidate(user_id)
+
+    logging.info(f"Прогноз ID: {forecast_id} для пользователя {user_id} поставлен в очередь записи")
 
 
 async def save_feedback_to_db(forecast_id: int, user_id: int, is_positive: bool) -> bool:
-    """ Сохраняет оценку пользователя """
-    conn, cur = database_module.connect_to_db(
-        conf['db']['database_name'],
-        conf['db']['user_name'],
-        conf['db']['user_password'],
-        conf['db']['host']
-    )
-    if not conn or not cur:
-        return False
-
-    try:
-        cur.execute("""
-            INSERT INTO feedback (forecast_id, user_id, is_positive)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (forecast_id, user_id) 
-            DO UPDATE SET is_positive = %s
-        """, (forecast_id, user_id, is_positive, is_positive))
-
-        conn.commit()
-        logging.info(f"Сохранена оценка {is_positive} для прогноза {forecast_id}")
+    """
+    Сохраняет оценку пользователя. Обычно запись выполняется в фоне (write-behind);
+    если БД недоступна или очередь заполнена - сразу, чтобы при ошибке вернуть False,
+    а не сообщать пользователю о сохранении оценки, которая не будет записана
+    """
+    args = (forecast_id, user_id, is_positive)
+    if database_module.is_available() and write_queue.healthy and write_queue.put_nowait(
+            SAVE_FEEDBACK_SQL, args, on_flush=partial(user_stats_cache.invalidate, user_id)):
+        user_stats_cache.invalidate(user_id)
+        logging.info(f"Оценка {is_positive} для прогноза {forecast_id} поставлена в очередь записи")
         return True
 
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении оценки: {e}")
-        conn.rollback()
-        return False
-    finally:
-        database_module.close_connection_db(conn, cur)
-
-
-async def get_last_car_wash_id(user_id: int) -> int:
-    """ Получает ID последней записи в car_washes для пользователя """
-    conn, cur = database_module.connect_to_db(
-        conf['db']['database_name'],
-        conf['db']['user_name'],
-        conf['db']['user_password'],
-        conf['db']['host']
-    )
-    if not conn or not cur:
-        return None
-
     try:
-        cur.execute("""
-            SELECT id FROM car_washes 
-            WHERE user_id = %s 
-            ORDER BY id DESC 
-            LIMIT 1
-        """, (user_id,))
-
-        result = cur.fetchone()
-        return result[0] if result else None
-
-    except Exception as e:
-        logging.error(f"Ошибка при получении car_wash_id: {e}")
-        return None
-    finally:
-        database_module.close_connection_db(conn, cur)
+        async with database_module.connection() as conn:
+            await conn.execute(SAVE_FEEDBACK_SQL, *args)
+    except database_module.DB_ERRORS as error:
+        logging.error(f"Ошибка при сохранении оценки: {error}")
+        return False
+    user_stats_cache.invalidate(user_id)
+    logging.info(f"Оценка {is_positive} для прогноза {forecast_id} сохранена")
+    return True
 
 
 @rate_router.callback_query(F.data.startswith("feedback:"))
@@ -159,35 +142,28 @@ async def handle_feedback(callback: CallbackQuery):
     user_id = callback.from_user.id
 
     # Проверяем, что пользователь оценивает свой прогноз
-    conn, cur = database_module.connect_to_db(
-        conf['db']['database_name'],
-        conf['db']['user_name'],
-        conf['db']['user_password'],
-        conf['db']['host']
-    )
-
-    if conn and cur:
-        try:
-            # Проверяем, принадлежит ли прогноз пользователю
-            cur.execute("SELECT user_id FROM forecasts WHERE id = %s", (forecast_id,))
-            result = cur.fetchone()
-
-            if not result:
-                await callback.answer("Прогноз не найден!", show_alert=True)
-                return
-
-            forecast_user_id = result[0]
-
-            if forecast_user_id != user_id:
-                await callback.answer("Вы не можете оценить чужой прогноз!", show_alert=True)
-                return
+    try:
+        # Проверяем, принадлежит ли прогноз пользователю
+        # (прогноз может быть еще не записан в БД - тогда он в очереди записи)
+        pending = write_queue.pending.get(('forecast', forecast_id))
+        forecast_user_id = pending[0] if pending else None
+        if forecast_user_id is None:
+            async with database_module.connection() as conn:
+                forecast_user_id = await conn.fetchval(
+                    "SELECT user_id FROM forecasts WHERE id = $1", forecast_id)
+
+        if forecast_user_id is None:
+            await callback.answer("Прогноз не найден!", show_alert=True)
+            return
 
-        except Exception as e:
-            logging.error(f"Ошибка при проверке прогноза: {e}")
-            await callback.answer("Ошибка при проверке прогноза", show_alert=True)
+        if forecast_user_id != user_id:
+            await callback.answer("Вы не можете оценить чужой прогноз!", show_alert=True)
             return
-        finally:
-            database_module.close_connection_db(conn, cur)
+
+    except Exception as e:
+        logging.error(f"Ошибка при проверке прогноза: {e}")
+        await callback.answer("Ошибка при проверке прогноза", show_alert=True)
+        return
 
     # Определяем тип оценки
     is_positive = (feedback_type == "like")
@@ -197,12 +173,7 @@ async def handle_feedback(callback: CallbackQuery):
 
     if success:
         # Меняем кнопки на подтверждение
-        new_keyboard = InlineKeyboardMarkup(inline_keyboard=[[
-            InlineKeyboardButton(
-                text=emoji.emojize(":check_mark_button: Оценка принята") if is_positive else emoji.emojize(":cross_mark: Оценка принята"),
-                callback_data="no_action"
-            )
-        ]])
+        new_keyboard = keyboards.like_accepted_keyboard if is_positive else keyboards.dislike_accepted_keyboard
 
         await callback.message.edit_reply_markup(reply_markup=new_keyboard)
         await callback.answer(
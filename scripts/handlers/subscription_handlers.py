@@ -0,0 +1,76 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Функциональность хэндлеров подписки на ежедневный совет
+"""
+
+import logging
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message
+
+import database_module
+import keyboards
+from subscriptions import (SUBSCRIBE_SQL, SUBSCRIBE_LOCATION_SQL, UNSUBSCRIBE_SQL, parse_send_time,
+                           pending_location, subscription_zone, subscription_scheduler,
+                           subscriptions_settings)
+
+subscription_router = Router()
+
+
+@subscription_router.message(Command(commands=['subscribe']))
+async def subscribe_handler(message: Message, command: CommandObject):
+    """Подписка на ежедневный совет: /subscribe ЧЧ:ММ (местное время)"""
+    user_id = message.from_user.id
+    try:
+        send_time = parse_send_time(command.args or subscriptions_settings()['default_time'])
+    except ValueError:
+        await message.answer("Укажите время в формате ЧЧ:ММ, например: /subscribe 08:00")
+        return
+
+    try:
+        async with database_module.connection() as conn:
+            row = await conn.fetchrow(SUBSCRIBE_SQL, user_id, send_time)
+            if row is None:
+                # Геопозиция только что отправлена и еще не записана очередью write-behind
+                location = pending_location(user_id)
+                if location is not None:
+                    row = await conn.fetchrow(SUBSCRIBE_LOCATION_SQL, user_id,
+                                              message.from_user.username, *location, send_time)
+    except database_module.DB_ERRORS as e:
+        logging.error(f"Ошибка при сохранении подписки: {e}")
+        await message.answer("Не удалось сохранить подписку, попробуйте позже.")
+        return
+
+    if row is None:
+        await message.answer("Чтобы подписаться, сначала отправьте свою геопозицию!",
+                             reply_markup=keyboards.send_position_keyboard)
+        return
+
+    # В многопроцессном режиме рассылкой занимается супервизор, он прочитает подписку из БД
+    if subscription_scheduler.running:
+        subscription_scheduler.schedule(user_id, send_time, subscription_zone(row['lat'], row['lon']))
+    logging.info(f"Пользователь {user_id} подписался на рассылку в {send_time:%H:%M}")
+    await message.answer(f"Каждый день в {send_time:%H:%M} (по местному времени) я пришлю совет "
+                         "для последней отправленной геопозиции.\nОтписаться: /unsubscribe")
+
+
+@subscription_router.message(Command(commands=['unsubscribe']))
+async def unsubscribe_handler(message: Message):
+    """Отписка от ежедневного совета"""
+    user_id = message.from_user.id
+    try:
+        async with database_module.connection() as conn:
+            await conn.execute(UNSUBSCRIBE_SQL, user_id)
+    except database_module.DB_ERRORS as e:
+        logging.error(f"Ошибка при отмене подписки: {e}")
+        await message.answer("Не удалось отменить подписку, попробуйте позже.")
+        return
+
+    subscription_scheduler.cancel(user_id)
+    logging.info(f"Пользователь {user_id} отписался от рассылки")
+    await message.answer("Ежедневный совет отключен.")
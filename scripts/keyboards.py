@@ -8,39 +8,43 @@ https://t.me/worth_wash_car_bot
 Вспомогательный файл для хранения переменных клавиатур
 """
 
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
-import emoji
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+import messages
 
 # Кнопка помощь
 help_button = KeyboardButton(text='Помощь')
 
 # Кнопка статистики
-stats_button = KeyboardButton(text=emoji.emojize(':bar_chart: Статистика'))
+stats_button = KeyboardButton(text=messages.STATS_BUTTON)
 
 # Приветственная клавиатура
-next_button = KeyboardButton(text=emoji.emojize('Далее :right_arrow:'))
+next_button = KeyboardButton(text=messages.NEXT_BUTTON)
 start_keyboard = ReplyKeyboardMarkup(keyboard=[[next_button],
                                                [help_button]],
                                      resize_keyboard=True)
 
 # Клавиатура соглашения
-accept_agreement = KeyboardButton(
-    text=emoji.emojize('Принять соглашение :newspaper:'))
+accept_agreement = KeyboardButton(text=messages.ACCEPT_AGREEMENT_BUTTON)
 accept_agreement_keyboard = ReplyKeyboardMarkup(keyboard=[[accept_agreement],
                                                           [help_button]],
                                                 resize_keyboard=True)
 
 # Клавиатура для отправки геопозиции
-send_position = KeyboardButton(text=emoji.emojize(
-    'Отправить геопозицию :round_pushpin:'), request_location=True)
+send_position = KeyboardButton(text=messages.SEND_LOCATION_BUTTON, request_location=True)
 send_position_keyboard = ReplyKeyboardMarkup(keyboard=[[send_position],
                                                        [help_button]],
                                              resize_keyboard=True)
 
 # Клавиатура для отправки геопозиции или использования старой
-use_old_position = KeyboardButton(text=emoji.emojize('Использовать последнюю геопозицию'))
+use_old_position = KeyboardButton(text='Использовать последнюю геопозицию')
 second_keyboard = ReplyKeyboardMarkup(
     keyboard=[[send_position],
               [use_old_position],
               [stats_button, help_button]],
     resize_keyboard=True)
+
+# Клавиатуры после оценки прогноза (заменяют кнопки оценки)
+like_accepted_keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text=messages.LIKE_ACCEPTED_BUTTON, callback_data='no_action')]])
+dislike_accepted_keyboard = InlineKeyboardMarkup(inline_keyboard=[[
+    InlineKeyboardButton(text=messages.DISLIKE_ACCEPTED_BUTTON, callback_data='no_action')]])
@@ -9,81 +9,61 @@ https://t.me/worth_wash_car_bot
 Вся информация хранится в БД postgres
 """
 
-import psycopg2
 import logging
-import logger
+import metrics
+from database_module import DB_ERRORS
 
-logger.setup_logging()
+LAST_GEO_SQL = "SELECT lat, lon FROM car_washes WHERE user_id = $1"
 
+# Геопозиция пользователя (одна запись на пользователя, нужен UNIQUE(user_id))
+UPSERT_LAST_GEO_SQL = """
+    INSERT INTO car_washes (user_id, user_name, lat, lon)
+    VALUES ($1, $2, $3, $4)
+    ON CONFLICT (user_id) DO UPDATE SET lat = EXCLUDED.lat, lon = EXCLUDED.lon
+    RETURNING id
+"""
 
-def check_last_geo(cur, user_id) -> bool | None:
-    """
-    Функция принимает курсор и user_id
-    Ищет есть ли уже запись у пользователя в таблице
-    Функция возвращает:
-        True - запись найдена
-        False - запись не найдена
-        None - если возникла ошибка
-    """
-    try:
-        cur.execute("SELECT * FROM car_washes WHERE user_id = %s;", (user_id,))
-        rows = cur.fetchall()
-        if rows:
-            logging.info(f"Found {len(rows)} records for user_id {user_id}:")
-            for row in rows:
-                logging.info(row)
-            return True
-        logging.info(f"No records found for user_id {user_id}")
-        return False
-    except psycopg2.Error as error:
-        logging.error(f"Error getting last geo information: {error}")
-        return None
+# Геопозиция и прогноз одним выражением: CTE обновляет car_washes и передает
+# id записи во вставку прогноза (ID прогноза резервируется заранее).
+# Снимок погоды записывается, только если такого еще нет (ключ - хэш содержимого)
+SAVE_LOCATION_FORECAST_SQL = f"""
+    WITH car_wash AS ({UPSERT_LAST_GEO_SQL}),
+    snapshot AS (
+        INSERT INTO weather_snapshots (content_hash, payload)
+        VALUES ($6, $7)
+        ON CONFLICT (content_hash) DO NOTHING
+    )
+    INSERT INTO forecasts
+    (id, user_id, car_wash_id, snapshot_hash, recommendation, recommendation_type, message_id, location_name)
+    SELECT $5, $1, car_wash.id, $6, $8, $9, $10, $11 FROM car_wash
+"""
 
 
-def get_last_geo(cur, user_id) -> tuple:
+async def get_last_geo(conn, user_id) -> tuple:
     """
     Функция достает из БД последнюю использованную геопозицию
     """
     try:
-        cur.execute("SELECT lat, lon FROM car_washes WHERE user_id = %s "
-                    "ORDER BY date DESC, notification_time DESC LIMIT 1;", (user_id,))
-        result = cur.fetchone()
+        # Запись у пользователя одна (UNIQUE(user_id)), читается из индекса
+        with metrics.phase('last_geo_query'):
+            result = await conn.fetchrow(LAST_GEO_SQL, user_id)
         if result:
             lat, lon = result
             return lat, lon
         return None, None
-    except psycopg2.Error as error:
+    except DB_ERRORS as error:
         logging.error(f"Error getting last geo information: {error}")
         return None, None
 
 
-def insert_last_geo(conn, cur, date, user_id, user_name, lat, lon, notification_time) -> None:
+async def upsert_last_geo(conn, user_id, user_name, lat, lon) -> None:
     """
-    Функция записывает последнюю отправленную
-    геопозицию в БД (если впервые отправлена)
+    Функция записывает последнюю отправленную геопозицию в БД
+    (одним запросом: вставка при первой отправке, иначе обновление)
     """
     try:
-        cur.execute(
-            "INSERT INTO car_washes (date, user_id, user_name, lat, lon, notification_time) "
-            "VALUES (%s, %s, %s, %s, %s, %s);",
-            (date, user_id, user_name, lat, lon, notification_time)
-        )
-        conn.commit()
-    except psycopg2.Error as error:
-        logging.error(f"Error inserting last geo information: {error}")
-
+        await conn.execute(UPSERT_LAST_GEO_SQL, user_id, user_name, lat, lon)
+        logging.info(f"Successfully saved lat and lon for user_id {user_id}")
+    except DB_ERRORS as error:
+        logging.error(f"Error saving last geo information: {error}")
 
-def update_last_geo(conn, cur, user_id, new_lat, new_lon) -> None:
-    """
-    Функция обновляет в БД последнюю отправленную геопозицию
-    """
-    try:
-        cur.execute(
-            "UPDATE car_washes SET lat = %s, lon = %s WHERE user_id = %s;",
-            (new_lat, new_lon, user_id)
-        )
-        conn.commit()
-        logging.info(f"Successfully updated lat and lon for user_id {user_id}")
-    except psycopg2.Error as error:
-        logging.error(f"Error updating last geo information: {error}")
-        conn.rollback()
@@ -5,41 +5,164 @@ OpenWeather) и дает совет, целесообразно ли сегод
 Бот можно найти по адресу:
 https://t.me/worth_wash_car_bot
 
-Функции логирования
+Функции логирования.
+Записи передаются в очередь (QueueHandler), в файл их пишет фоновый поток
+(QueueListener), поэтому запись на диск не задерживает обработку сообщений.
+Файл переключается в полночь (TimedRotatingFileHandler), частые записи из одного
+места кода ограничиваются по количеству (RateLimitFilter).
 """
 
+import atexit
 import logging
+import logging.handlers
+import multiprocessing
+import queue
+import threading
+import time
 from pathlib import Path
-import datetime
-import functions
 
-conf = functions.read_yaml('config.yml')
+from settings import conf, section_settings
 
-def setup_logging():
+LOGGING_FORMAT = "[%(asctime)s:%(processName)s:%(funcName)s] <%(levelname)s> %(message)s"
+
+# Значения по умолчанию для секции logs в config.yml
+LOGS_DEFAULTS = {
+    'logs_dir': 'logs',
+    'logs_file': 'app.log',
+    'level': 'INFO',              # уровень логирования
+    'backup_count': 30,           # сколько дневных файлов хранить
+    'queue_size': 10000,          # записей в очереди (дальше записи отбрасываются)
+    'rate_limit': 20,             # записей из одного места кода за интервал (0 - без ограничения)
+    'rate_limit_interval': 1,     # интервал ограничения, секунды
+    'rate_limit_level': 'INFO',   # ограничиваются записи этого уровня и ниже
+}
+
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+class RateLimitFilter(logging.Filter):
     """
-    Настраивает логирование с учётом даты в имени файла.
-    Автоматически создаёт новый файл при смене даты.
+    Ограничивает число записей из одного места кода (файл и строка):
+    не больше rate_limit за rate_limit_interval секунд. Число отброшенных записей
+    добавляется к следующей записи из того же места
     """
-    logging_format = "[%(asctime)s:%(funcName)s] <%(levelname)s> %(message)s"
 
-    logs_dir = conf.get('logs', {}).get('logs_dir', 'logs')
-    logs_file = conf.get('logs', {}).get('logs_file', 'app.log')
+    def __init__(self, rate_limit: int, interval: float, max_level: int):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.interval = interval
+        self.max_level = max_level
+        # (файл, строка) -> [начало интервала, записей в интервале, пропущено]
+        self._windows = {}
+        self.suppressed = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or not self.rate_limit:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            skipped = window[2] if window else 0
+            self._windows[key] = [now, 1, 0]
+            if skipped:
+                record.msg = f"{record.getMessage()} [{skipped} similar records suppressed]"
+                record.args = None
+            return True
+        if window[1] < self.rate_limit:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """ QueueHandler, который при переполненной очереди отбрасывает запись, а не ждет """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def log_settings() -> dict:
+    """ Настройки логирования из config.yml поверх значений по умолчанию """
+    return section_settings(conf.get('logs'), LOGS_DEFAULTS, 'logs')
 
-    logs_path = Path(logs_dir)
+
+def log_path(settings: dict) -> Path:
+    """
+    Путь к файлу лога. Процессы-обработчики (многопроцессный режим) пишут в свои файлы,
+    чтобы не переключать один файл одновременно
+    """
+    logs_path = Path(settings['logs_dir'])
     logs_path.mkdir(parents=True, exist_ok=True)
+    log_file = Path(settings['logs_file'])
+    process_name = multiprocessing.current_process().name
+    if process_name != 'MainProcess':
+        log_file = log_file.with_name(f"{log_file.stem}.{process_name}{log_file.suffix}")
+    return logs_path / log_file
+
+
+def setup_logging():
+    """
+    Настраивает логирование (повторные вызовы ничего не делают).
+    Корневой логгер пишет в очередь, фоновый поток - в файл, который
+    переключается в полночь; старые файлы получают суффикс с датой
+    """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            return
+        settings = log_settings()
+        level = logging.getLevelName(str(settings['level']).upper())
+
+        file_handler = logging.handlers.TimedRotatingFileHandler(
+            log_path(settings), when='midnight', backupCount=settings['backup_count'],
+            encoding='utf-8', delay=True)
+        file_handler.setFormatter(logging.Formatter(LOGGING_FORMAT))
+
+        queue_handler = DroppingQueueHandler(queue.Queue(maxsize=settings['queue_size']))
+        queue_handler.addFilter(RateLimitFilter(
+            settings['rate_limit'], settings['rate_limit_interval'],
+            logging.getLevelName(str(settings['rate_limit_level']).upper())))
+
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+        _queue_handler = queue_handler
 
-    if not logs_file:
-        logs_file = "app.log"
+        _listener = logging.handlers.QueueListener(queue_handler.queue, file_handler,
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
 
-    original_log = Path(logs_file)
 
-    current_date = datetime.datetime.now().strftime('%Y-%m-%d')
-    log_filename = f"{original_log.stem}_{current_date}{original_log.suffix}"
+def stop_logging() -> None:
+    """ Дописывает записи из очереди и останавливает фоновый поток """
+    global _listener, _queue_handler
+    with _setup_lock:
+        if _listener is not None:
+            logging.getLogger().removeHandler(_queue_handler)
+            _listener.stop()
+            for handler in _listener.handlers:
+                handler.close()
+            _listener = None
+            _queue_handler = None
 
-    log_path = logs_path / log_filename
 
-    logging.basicConfig(
-        level=logging.DEBUG,
-        filename=log_path,
-        format=logging_format
-    )
+def stats() -> dict:
+    """ Счетчики логирования: пропущенные ограничением и отброшенные при переполнении записи """
+    if _queue_handler is None:
+        return {}
+    rate_limit = _queue_handler.filters[0]
+    return {'suppressed': rate_limit.suppressed, 'dropped': _queue_handler.dropped,
+            'queued': _queue_handler.queue.qsize()}
@@ -12,21 +12,34 @@ import asyncio
 import sys
 import os
 import logging
+from contextlib import suppress
 
 # Добавляем родительскую директорию в sys.path для корректного импорта
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 sys.path.insert(0, parent_dir)
 
+# Первым, чтобы отчет о запуске учитывал импорт остальных модулей
+import startup
 from aiogram import Bot
 from aiogram.enums import ParseMode
 from aiogram.client.bot import DefaultBotProperties
-from functions import read_yaml
+import settings
+from settings import conf
 from scripts.handlers.main_handlers import dp
+from scripts.handlers.basic_handlers import get_forecast
+import database_module
+import weather_providers
+import webhook_server
+import supervisor
+import metrics
+from write_behind import write_queue
+from subscriptions import subscription_scheduler
+from outbound import outbound_queue
 import logger
 
-logger.setup_logging()
-conf = read_yaml('config.yml')
+startup.mark('imports')
+settings.require('telegram_token', *weather_providers.get_provider().required_settings)
 bot = Bot(conf['telegram_token'], default=DefaultBotProperties(parse_mode=ParseMode.HTML))
 
 
@@ -35,8 +48,68 @@ async def main() -> None:
     Функция стартует бота
     """
     logging.info('Bot started!')
-    await dp.start_polling(bot)
+    outbound_queue.install(bot)
+    metrics_runner = await metrics.start_server(conf)
+    startup.mark('metrics_server')
+    await database_module.create_pool(conf['db'])
+    startup.mark('db_pool')
+    write_queue.start()
+    scheduler_task = asyncio.create_task(subscription_scheduler.run(bot, get_forecast))
+    # Отчет о запуске; NumPy и данные часовых поясов загружаются в фоне
+    startup.ready()
+    try:
+        if conf.get('mode') == 'webhook':
+            await webhook_server.run_webhook(dp, bot, conf.get('webhook'))
+        else:
+            await dp.start_polling(bot)
+    finally:
+        await stop_scheduler(scheduler_task)
+        logging.info(f"Outbound queue stats: {outbound_queue.stats()}")
+        await weather_providers.close()
+        # Дописываем накопленные прогнозы и оценки, пока пул еще открыт
+        await write_queue.drain()
+        await database_module.close_pool()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+async def main_supervisor() -> None:
+    """
+    Функция стартует бота в многопроцессном режиме
+    (обновления обрабатываются в supervisor.workers процессах)
+    """
+    logging.info('Bot supervisor started!')
+    outbound_queue.install(bot, share=supervisor.outbound_share(supervisor.supervisor_settings(conf)))
+    metrics_runner = await metrics.start_server(conf)
+    startup.mark('metrics_server')
+    # Рассылка по подпискам выполняется в процессе-супервизоре (один планировщик на бота)
+    await database_module.create_pool(conf['db'])
+    startup.mark('db_pool')
+    write_queue.start()
+    scheduler_task = asyncio.create_task(subscription_scheduler.run(bot, get_forecast))
+    startup.ready()
+    try:
+        await supervisor.Supervisor(conf).run(bot, dp)
+    finally:
+        await stop_scheduler(scheduler_task)
+        await weather_providers.close()
+        await write_queue.drain()
+        await database_module.close_pool()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+async def stop_scheduler(scheduler_task) -> None:
+    """ Останавливает планировщик рассылки """
+    scheduler_task.cancel()
+    with suppress(asyncio.CancelledError):
+        await scheduler_task
+    logging.info(f"Subscriptions stats: {subscription_scheduler.stats()}")
 
 
 if __name__ == '__main__':
-    asyncio.run(main())
+    logger.setup_logging()
+    if supervisor.supervisor_settings(conf)['workers'] > 1:
+        asyncio.run(main_supervisor())
+    else:
+        asyncio.run(main())
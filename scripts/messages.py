@@ -0,0 +1,140 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Шаблоны сообщений и подписей кнопок.
+Эмодзи (:название:) подставляются один раз при загрузке модуля, сообщение собирается
+подстановкой параметров в шаблон (str.format). Поэтому emoji.emojize не просматривает
+текст каждого ответа, а названия из прогноза и имена пользователей не проходят через emojize.
+"""
+
+from aiogram.utils.markdown import hbold
+import emoji
+
+
+def emojize(text: str) -> str:
+    """
+    Подставляет эмодзи в шаблон. Названия ищутся и среди алиасов:
+    :sunny:, :sweat_drops: и :exclamation: не входят в английские названия emoji
+    """
+    return emoji.emojize(text, language='alias')
+
+
+BOT_NAME = hbold('Мыть машину?')
+ABOUT_BOT = (f"{BOT_NAME} - телеграм бот, который по запросу анализирует погоду "
+             "(используется OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.")
+
+# Подписи кнопок
+STATS_BUTTON = emojize(':bar_chart: Статистика')
+NEXT_BUTTON = emojize('Далее :right_arrow:')
+ACCEPT_AGREEMENT_BUTTON = emojize('Принять соглашение :newspaper:')
+SEND_LOCATION_BUTTON = emojize('Отправить геопозицию :round_pushpin:')
+LIKE_BUTTON = emojize(':thumbs_up: Правильно')
+DISLIKE_BUTTON = emojize(':thumbs_down: Ошибся')
+LIKE_ACCEPTED_BUTTON = emojize(':check_mark_button: Оценка принята')
+DISLIKE_ACCEPTED_BUTTON = emojize(':cross_mark: Оценка принята')
+
+# Сообщения обработчиков
+HELP_MESSAGE = (f"\n{ABOUT_BOT}\n\n"
+                "/start - старт бота;\n"
+                "/restart - рестарт бота;\n"
+                "/help - открыть помощь;\n"
+                "/stats - статистика оценок;\n"
+                "/subscribe ЧЧ:ММ - ежедневный совет в указанное время;\n"
+                "/unsubscribe - отключить ежедневный совет.")
+# name - имя пользователя, уже экранированное для HTML
+START_MESSAGE = emojize(f"Привет, {{name}}!\n"
+                        f"\n{ABOUT_BOT}\n\n"
+                        "Чтобы начать, примите соглашение :newspaper: и отправьте свою "
+                        "геопозицию :round_pushpin:")
+AGREEMENT_MESSAGE = (f"{BOT_NAME} анализирует данные об использовании бота, "
+                     "в том числе об устройстве, на котором он функционирует, источник "
+                     "установки, составляет конверсию и статистику вашей активности в "
+                     "целях продуктовой аналитики, анализа и оптимизации рекламных "
+                     "кампаний, а также для устранения ошибок. Собранная таким образом "
+                     "информация не может идентифицировать вас.")
+SEND_LOCATION_MESSAGE = emojize("Чтобы получить прогноз, отправьте свою геопозицию :round_pushpin:")
+FORECAST_MESSAGE = emojize("{recommendation}\n\n:round_pushpin: Локация: {location}")
+STATS_MESSAGE = emojize(":bar_chart: <b>Ваша статистика</b>\n\n"
+                        ":chart_increasing: Всего прогнозов: {total_forecasts}\n"
+                        ":round_pushpin: Уникальных локаций: {locations}\n"
+                        ":check_mark_button: Лайков: {likes}\n"
+                        ":cross_mark: Дизлайков: {dislikes}\n"
+                        ":bar_chart: Точность рекомендаций: {accuracy:.1f}%\n\n"
+                        "<i>Ваши оценки помогают улучшить алгоритм бота!</i>")
+
+# Части рекомендации (wash_functions)
+REAGENT_WARNING = emojize(":warning: Внимание! На дорогах могут использоваться реагенты.")
+REAGENT_FROST_ADVICE = emojize(":droplet: Частая мойка кузова защищает от коррозии")
+REAGENT_THAW_ADVICE = emojize(":thermometer: При плюсовой температуре реагенты смываются дождём")
+REAGENT_INTERVAL_ADVICE = emojize(":alarm_clock: Рекомендуем мыть каждые {days} дня")
+SNOW_WARNING = emojize(":snowflake: Ожидается снег: {snow:.1f} мм")
+WIND_WARNING = emojize(":dashing_away: Сильный ветер: до {wind} м/с")
+ROAD_REAGENT_WARNING = emojize(":triangular_flag: Внимание: на дорогах могут быть реагенты!")
+WINTER_WASH_OK = emojize(":sunny: Условия подходящие для мойки")
+WINTER_BEST_TIME = emojize(":alarm_clock: Лучшее время мойки: {start} (на {duration}ч)")
+WINTER_WINDOW_TEMPERATURE = emojize(":thermometer: Температура: {temp_range}")
+WINTER_CONDITIONS = emojize(":snowflake: Зимние условия:")
+LOW_TEMPERATURE = emojize("\n:thermometer: Температура низкая: {temperature:.1f}°C")
+WIND_MARK = emojize(" :dashing_away:")
+COLD_WASH_ADVICE = emojize("\n:warning: Температура низкая - используйте горячую воду "
+                           "и просушите замки и уплотнители!")
+RAIN_REASON = emojize(":cloud_with_rain: высокая вероятность осадков ({rain_probability:.1f}%)")
+HUMIDITY_REASON = emojize(":sweat_drops: высокая влажность ({humidity:.0f}%)")
+ZERO_TEMPERATURE_REASON = emojize(":thermometer: температура около 0°C ({temperature:.1f}°C)")
+REASONS = emojize(":exclamation: Причины:")
+REAGENT_NOTE = emojize("\n\n:triangular_flag: Примечание: при температуре ниже 10°C "
+                       "на дорогах могут быть реагенты")
+
+# Рекомендации целиком
+WINTER_PRECIPITATION = emojize(":snowflake: Зимний режим\n"
+                               "Лучше отложить мытьё машины.\n\n"
+                               ":cloud_with_snow: Осадки в ближайшие часы:\n"
+                               "{intervals}"
+                               "{warnings}\n\n"
+                               ":thermometer: Средняя температура: {temperature_avg:.1f}°C\n"
+                               ":snowflake: Накопление снега: {snow:.1f} мм")
+WINTER_WINDOW = emojize("{advice}"
+                        "{warnings}\n\n"
+                        ":sun_behind_cloud: Погода сейчас: {description}\n"
+                        ":cloud_with_rain: Вероятность осадков: {rain_probability:.1f}%")
+WINTER_NO_WINDOW = emojize(":snowflake: Зимний режим\n"
+                           "Сегодня не лучшее время для мойки.\n"
+                           "{warnings}\n\n"
+                           ":thermometer: Средняя температура: {temperature_avg:.1f}°C\n"
+                           ":snowflake: Накопление снега: {snow:.1f} мм\n"
+                           ":sweat_drops: Влажность: {humidity:.0f}%")
+RAIN_SOON = emojize(":cloud_with_rain: Лучше отложить мытьё машины на другой день.\n\n"
+                    "Краткая погодная сводка:\n"
+                    ":cloud_with_rain: Взвешенная вероятность дождя: "
+                    "{rain_probability:.2f}%\n"
+                    ":alarm_clock: Дождь в ближайшие часы:\n"
+                    "{intervals}"
+                    "{low_temperature}")
+WASH_OK = emojize(":soap: Сегодня можно мыть машину.{wind}\n"
+                  ":sun_behind_cloud: Погода: {description}\n"
+                  ":thermometer: Температура: {temperature:.1f}°C"
+                  "{advice}")
+# temperature_avg - уже округленное значение (выводится как есть)
+DONT_WASH = emojize(":cloud_with_rain: Лучше отложить мытьё машины на другой день.\n\n"
+                    "Краткая погодная сводка:\n"
+                    ":cloud_with_rain: Взвешенная вероятность дождя: "
+                    "{rain_probability:.2f}%\n"
+                    ":alarm_clock: Осадки в ближайшие дни:\n"
+                    "{intervals}\n\n"
+                    ":thermometer: Средняя температура: {temperature_avg}°C\n"
+                    ":thermometer: Температура сейчас: {temperature:.1f}°C\n"
+                    ":sweat_drops: Средняя влажность: {humidity:.0f}%"
+                    "{reasons}"
+                    "{reagent_note}")
+
+# Эмодзи сезонов
+SEASON_EMOJI = {
+    'winter': emojize(':snowflake:'),
+    'spring': emojize(':cherry_blossom:'),
+    'summer': emojize(':sun_with_face:'),
+    'autumn': emojize(':fallen_leaf:'),
+}
@@ -0,0 +1,309 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Метрики бота в формате Prometheus.
+Счетчики, gauge и гистограммы времени этапов обработки хранятся в памяти процесса
+и отдаются по HTTP (GET /metrics) на локальном порту.
+"""
+
+import logging
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+
+from settings import section_settings
+
+# Значения по умолчанию для секции metrics в config.yml
+METRICS_DEFAULTS = {
+    'host': '127.0.0.1',   # адрес HTTP-сервера метрик
+    'port': 9108,          # порт (0 - метрики не отдаются); обработчики: port + 1 + номер
+}
+# Границы гистограмм времени, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    """ Экранирование значения метки """
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Registry:
+    """ Набор метрик процесса """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        """ Все метрики в текстовом формате Prometheus """
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric(ABC):
+    """ Метрика с метками: значения хранятся по кортежу значений меток """
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._children[()] = self._new_child()
+        registry.register(self)
+
+    @abstractmethod
+    def _new_child(self):
+        """ Значение метрики для одного набора меток """
+
+    def labels(self, *values, **labels):
+        """ Метрика для конкретных значений меток """
+        if labels:
+            values = tuple(labels[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _items(self):
+        for key, child in self._children.items():
+            yield dict(zip(self.labelnames, key)), child
+
+    def samples(self):
+        for labels, child in self._items():
+            yield '', labels, child.get()
+
+
+class _Value:
+    """ Значение счетчика или gauge (может вычисляться функцией при чтении) """
+
+    def __init__(self):
+        self.value = 0.0
+        self._function = None
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function) -> None:
+        """ Значение берется из function() при каждом чтении метрики """
+        self._function = function
+
+    def get(self) -> float:
+        return self._function() if self._function is not None else self.value
+
+
+class Counter(_Metric):
+    """ Счетчик (только растет) """
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def set_function(self, function) -> None:
+        self.labels().set_function(function)
+
+
+class Gauge(_Metric):
+    """ Текущее значение (может расти и уменьшаться) """
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function) -> None:
+        self.labels().set_function(function)
+
+
+class _Timer:
+    """ Контекстный менеджер: записывает в гистограмму время выполнения блока """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+
+class _HistogramValue:
+    """ Распределение значений по интервалам buckets """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """ Гистограмма (время выполнения) """
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS,
+                 registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def samples(self):
+        for labels, child in self._items():
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), child.counts):
+                total += count
+                yield '_bucket', dict(labels, le=_format_value(bound)), total
+            yield '_sum', labels, child.sum
+            yield '_count', labels, total
+
+
+# Метрики бота
+UPDATES_TOTAL = Counter('wash_bot_updates_total', 'Processed Telegram updates',
+                        ['event', 'status'])
+UPDATE_SECONDS = Histogram('wash_bot_update_duration_seconds', 'Update handling time', ['event'])
+UPDATES_IN_FLIGHT = Gauge('wash_bot_updates_in_flight', 'Updates being handled now')
+PHASE_SECONDS = Histogram('wash_bot_phase_duration_seconds',
+                          'Time spent in a phase of request handling', ['phase'])
+FORECAST_CACHE_TOTAL = Counter('wash_bot_forecast_cache_total', 'Forecast cache lookups',
+                               ['result'])
+DB_ERRORS_TOTAL = Counter('wash_bot_db_errors_total', 'Database errors', ['error'])
+WEATHER_API_ERRORS_TOTAL = Counter('wash_bot_weather_api_errors_total', 'OpenWeather request errors')
+TELEGRAM_REQUEST_SECONDS = Histogram('wash_bot_telegram_request_duration_seconds',
+                                     'Telegram Bot API request time', ['method'])
+TELEGRAM_WAIT_SECONDS = Histogram('wash_bot_telegram_queue_wait_seconds',
+                                  'Time a Telegram request waited for rate limits', ['priority'])
+TELEGRAM_ERRORS_TOTAL = Counter('wash_bot_telegram_errors_total', 'Telegram Bot API errors',
+                                ['method', 'error'])
+WRITE_QUEUE_DEPTH = Gauge('wash_bot_write_queue_depth', 'Writes waiting in the write-behind queue')
+OUTBOUND_QUEUE_DEPTH = Gauge('wash_bot_outbound_queue_depth',
+                             'Telegram requests waiting for rate limits', ['priority'])
+STARTUP_SECONDS = Gauge('wash_bot_startup_seconds', 'Time spent in a startup phase of the process',
+                        ['phase'])
+
+
+def phase(name: str) -> _Timer:
+    """ Таймер этапа обработки: with metrics.phase('weather_fetch'): ... """
+    return PHASE_SECONDS.labels(name).time()
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Middleware диспетчера (outer, на update): число обновлений по типу и результату,
+    время обработки и число обновлений в обработке
+    """
+
+    async def __call__(self, handler, event, data):
+        event_type = event.event_type
+        UPDATES_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            result = await handler(event, data)
+            status = 'ok'
+            return result
+        finally:
+            UPDATE_SECONDS.labels(event_type).observe(time.perf_counter() - started)
+            UPDATES_TOTAL.labels(event_type, status).inc()
+            UPDATES_IN_FLIGHT.dec()
+
+
+def metrics_settings(conf: dict) -> dict:
+    """ Настройки метрик из config.yml поверх значений по умолчанию """
+    return section_settings(conf.get('metrics'), METRICS_DEFAULTS, 'metrics')
+
+
+async def _handle_metrics(request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+
+async def start_server(conf: dict, offset: int = 0):
+    """
+    Запускает HTTP-сервер метрик на порту metrics.port + offset.
+    Возвращает AppRunner (для остановки) или None, если метрики отключены
+    """
+    settings = metrics_settings(conf)
+    if not settings['port']:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    port = settings['port'] + offset
+    try:
+        await web.TCPSite(runner, host=settings['host'], port=port).start()
+    except OSError as error:
+        logging.error(f"Can not start metrics server on port {port}: {error}")
+        await runner.cleanup()
+        return None
+    logging.info(f"Metrics server listening on {settings['host']}:{port}/metrics")
+    return runner
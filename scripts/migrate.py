@@ -0,0 +1,201 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Миграции схемы БД.
+Миграции - файлы scripts/migrations/NNN_название.sql, применяются по порядку номеров,
+каждая в своей транзакции; примененные версии хранятся в таблице schema_migrations.
+Запуск из корня репозитория:
+python scripts/migrate.py upgrade  - применить новые миграции
+python scripts/migrate.py status   - список миграций и их состояние
+python scripts/migrate.py check    - проверить планы частых запросов (EXPLAIN) на тестовых данных
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+import database_module
+from settings import conf
+from last_geo import LAST_GEO_SQL
+from user_stats import USER_STATS_SQL
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / 'migrations'
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d+)_(\w+)\.sql$')
+# Блокировка, чтобы миграции не применялись одновременно из двух процессов
+MIGRATION_LOCK_ID = 73_310_001
+
+SCHEMA_MIGRATIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMP DEFAULT NOW()
+    )
+"""
+
+# Частые запросы бота и параметры для EXPLAIN (пользователи тестовых данных - отрицательные id)
+HOT_QUERIES = {
+    'last geo': (LAST_GEO_SQL, (-1,)),
+    'forecast owner': ("SELECT user_id FROM forecasts WHERE id = $1", (1,)),
+    'last user forecast': ("SELECT id FROM forecasts WHERE user_id = $1 "
+                           "ORDER BY id DESC LIMIT 1", (-1,)),
+    'user stats': (USER_STATS_SQL, (-1,)),
+    'user feedback': ("SELECT is_positive FROM feedback "
+                      "WHERE forecast_id = $1 AND user_id = $2", (1, -1)),
+    'weather snapshot': ("SELECT payload FROM weather_snapshots WHERE content_hash = $1",
+                         (bytes(32),)),
+}
+# Тестовые данные для check (откатываются после проверки)
+SEED_SQL = """
+    INSERT INTO weather_snapshots (content_hash, payload)
+    SELECT sha256(convert_to(g::text, 'UTF8')), '{}'::jsonb
+    FROM generate_series(1, $1 / 10) g
+    ON CONFLICT DO NOTHING;
+
+    INSERT INTO car_washes (user_id, user_name, lat, lon)
+    SELECT -g, 'seed', 55 + random(), 37 + random()
+    FROM generate_series(1, $1 / 10) g
+    ON CONFLICT (user_id) DO NOTHING;
+
+    INSERT INTO forecasts (user_id, snapshot_hash, recommendation, recommendation_type, location_name)
+    SELECT -(g % ($1 / 10) + 1), sha256(convert_to((g % ($1 / 10) + 1)::text, 'UTF8')),
+           'seed', 'unknown', 'Город ' || g % 100
+    FROM generate_series(1, $1) g;
+
+    INSERT INTO feedback (forecast_id, user_id, is_positive)
+    SELECT id, user_id, id % 2 = 0 FROM forecasts WHERE user_id < 0
+    ON CONFLICT DO NOTHING;
+
+    ANALYZE car_washes, forecasts, feedback, weather_snapshots, user_stats;
+"""
+
+
+def load_migrations() -> list:
+    """ Список миграций (версия, название, SQL) в порядке версий """
+    migrations = []
+    for path in MIGRATIONS_DIR.iterdir():
+        match = MIGRATION_FILE_PATTERN.match(path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path.read_text(encoding='utf-8')))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions in {MIGRATIONS_DIR}")
+    return migrations
+
+
+def checksum(sql: str) -> str:
+    """ Контрольная сумма миграции (чтобы заметить изменение уже примененного файла) """
+    return hashlib.sha256(sql.encode()).hexdigest()
+
+
+async def applied_migrations(conn) -> dict:
+    """ Примененные миграции: версия -> контрольная сумма """
+    await conn.execute(SCHEMA_MIGRATIONS_SQL)
+    rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    return {row['version']: row['checksum'] for row in rows}
+
+
+async def upgrade(conn) -> int:
+    """ Применяет новые миграции, возвращает их количество """
+    await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+    try:
+        applied = await applied_migrations(conn)
+        count = 0
+        for version, name, sql in load_migrations():
+            if version in applied:
+                continue
+            print(f"Applying {version:03d}_{name} ...")
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                    version, name, checksum(sql))
+            count += 1
+        print(f"Applied {count} migration(s)")
+        return count
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+
+
+async def status(conn) -> None:
+    """ Печатает список миграций и их состояние """
+    applied = await applied_migrations(conn)
+    for version, name, sql in load_migrations():
+        if version not in applied:
+            state = 'pending'
+        elif applied[version] != checksum(sql):
+            state = 'applied, file changed'
+        else:
+            state = 'applied'
+        print(f"{version:03d}_{name}: {state}")
+
+
+def seq_scans(plan, found=None) -> list:
+    """ Таблицы, которые план читает последовательным сканированием """
+    if found is None:
+        found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        found.append(plan.get('Relation Name'))
+    for child in plan.get('Plans', []):
+        seq_scans(child, found)
+    return found
+
+
+async def check(conn, rows: int) -> bool:
+    """
+    Заполняет таблицы тестовыми данными (в транзакции, которая затем откатывается)
+    и проверяет, что ни один частый запрос не читает таблицу целиком
+    """
+    failed = []
+    transaction = conn.transaction()
+    await transaction.start()
+    try:
+        # Параметр в многооператорном скрипте недоступен, число строк подставляется в текст
+        await conn.execute(SEED_SQL.replace('$1', str(int(rows))))
+        for name, (sql, args) in HOT_QUERIES.items():
+            plan = json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", *args))[0]['Plan']
+            tables = seq_scans(plan)
+            print(f"{name}: {'Seq Scan on ' + ', '.join(tables) if tables else 'ok'}")
+            if tables:
+                failed.append(name)
+    finally:
+        await transaction.rollback()
+    if failed:
+        print(f"Sequential scans in: {', '.join(failed)}")
+    return not failed
+
+
+async def run(args) -> int:
+    """ Выполняет команду, возвращает код выхода """
+    conn = await database_module.connect(conf['db'])
+    try:
+        if args.command == 'upgrade':
+            await upgrade(conn)
+        elif args.command == 'status':
+            await status(conn)
+        elif args.command == 'check':
+            return 0 if await check(conn, args.rows) else 1
+        return 0
+    finally:
+        await conn.close()
+
+
+def main() -> None:
+    """ Разбирает аргументы командной строки """
+    parser = argparse.ArgumentParser(description='Миграции схемы БД')
+    parser.add_argument('command', choices=['upgrade', 'status', 'check'], nargs='?', default='upgrade')
+    parser.add_argument('--rows', type=int, default=20000, help='прогнозов в тестовых данных для check')
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == '__main__':
+    main()
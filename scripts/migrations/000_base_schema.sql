@@ -0,0 +1,44 @@
+-- Wash your car: исходная схема БД.
+-- Таблицы создаются, только если их еще нет, поэтому на уже работающей базе
+-- миграция ничего не меняет.
+
+-- Таблица последних геопозиций пользователей
+CREATE TABLE IF NOT EXISTS car_washes (
+    id SERIAL PRIMARY KEY,
+    date DATE,
+    user_id BIGINT NOT NULL,
+    user_name TEXT,
+    lat DOUBLE PRECISION,
+    lon DOUBLE PRECISION,
+    notification_time TIME
+);
+
+-- Таблица для хранения прогнозов
+CREATE TABLE IF NOT EXISTS forecasts (
+    id SERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    car_wash_id INTEGER REFERENCES car_washes (id),
+    date DATE NOT NULL DEFAULT CURRENT_DATE,
+    weather_data JSONB,           -- Данные погоды
+    recommendation TEXT,          -- Текст рекомендации
+    recommendation_type TEXT,     -- Тип рекомендации ('wash'/'dont_wash'/'unknown')
+    message_id INTEGER,           -- ID сообщения в Telegram
+    location_name TEXT,           -- Название локации
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Таблица для оценок пользователей
+CREATE TABLE IF NOT EXISTS feedback (
+    id SERIAL PRIMARY KEY,
+    forecast_id INTEGER REFERENCES forecasts (id) ON DELETE CASCADE,
+    user_id BIGINT NOT NULL,
+    is_positive BOOLEAN,          -- TRUE = лайк, FALSE = дизлайк
+    created_at TIMESTAMP DEFAULT NOW(),
+    UNIQUE (forecast_id, user_id) -- Одна оценка на прогноз
+);
+
+-- Колонки, которые добавлялись в уже созданные таблицы
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS car_wash_id INTEGER REFERENCES car_washes (id);
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS recommendation_type TEXT;
+ALTER TABLE forecasts ADD COLUMN IF NOT EXISTS location_name TEXT;
+ALTER TABLE forecasts ALTER COLUMN date SET DEFAULT CURRENT_DATE;
@@ -0,0 +1,43 @@
+-- Wash your car: хранение снимков погоды без дубликатов.
+-- Одинаковые прогнозы (одна ячейка сетки и один 3-часовой слот) записываются
+-- в weather_snapshots один раз, forecasts ссылается на снимок по хэшу содержимого.
+-- Существующие forecasts.weather_data переносятся в weather_snapshots.
+
+CREATE TABLE IF NOT EXISTS weather_snapshots (
+    content_hash BYTEA PRIMARY KEY,   -- sha256 нормализованного JSON
+    payload JSONB NOT NULL,           -- Данные погоды
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+ALTER TABLE forecasts
+    ADD COLUMN IF NOT EXISTS snapshot_hash BYTEA REFERENCES weather_snapshots (content_hash);
+
+-- Перенос старых прогнозов: хэш считается по тексту jsonb
+-- (ключи в jsonb уже упорядочены, поэтому одинаковые данные дают одинаковый хэш)
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'forecasts' AND column_name = 'weather_data') THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO weather_snapshots (content_hash, payload, created_at)
+    SELECT DISTINCT ON (content_hash) content_hash, weather_data, created_at
+    FROM (
+        SELECT sha256(convert_to(weather_data::text, 'UTF8')) AS content_hash, weather_data, created_at
+        FROM forecasts
+        WHERE weather_data IS NOT NULL AND snapshot_hash IS NULL
+    ) old_forecasts
+    ORDER BY content_hash, created_at
+    ON CONFLICT (content_hash) DO NOTHING;
+
+    UPDATE forecasts
+    SET snapshot_hash = sha256(convert_to(weather_data::text, 'UTF8'))
+    WHERE weather_data IS NOT NULL AND snapshot_hash IS NULL;
+
+    ALTER TABLE forecasts DROP COLUMN weather_data;
+END;
+$$;
+
+-- Место, занятое старыми данными, освобождается после
+-- VACUUM FULL forecasts; (блокирует таблицу, выполнять отдельно)
@@ -0,0 +1,104 @@
+-- Wash your car: статистика пользователя, которая обновляется при записи.
+-- Триггеры на forecasts и feedback ведут счетчики в user_stats, поэтому /stats
+-- читает одну строку, сколько бы прогнозов ни было у пользователя.
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id BIGINT PRIMARY KEY,
+    total_forecasts INTEGER NOT NULL DEFAULT 0,
+    locations_count INTEGER NOT NULL DEFAULT 0,   -- Уникальных локаций
+    likes INTEGER NOT NULL DEFAULT 0,
+    dislikes INTEGER NOT NULL DEFAULT 0
+);
+
+-- Локации пользователя (для подсчета уникальных без COUNT(DISTINCT))
+CREATE TABLE IF NOT EXISTS user_locations (
+    user_id BIGINT NOT NULL,
+    location_name TEXT NOT NULL,
+    PRIMARY KEY (user_id, location_name)
+);
+
+CREATE OR REPLACE FUNCTION user_stats_on_forecast() RETURNS trigger AS $$
+DECLARE
+    new_locations INTEGER := 0;
+BEGIN
+    IF NEW.location_name IS NOT NULL THEN
+        INSERT INTO user_locations (user_id, location_name)
+        VALUES (NEW.user_id, NEW.location_name)
+        ON CONFLICT DO NOTHING;
+        GET DIAGNOSTICS new_locations = ROW_COUNT;
+    END IF;
+
+    INSERT INTO user_stats (user_id, total_forecasts, locations_count)
+    VALUES (NEW.user_id, 1, new_locations)
+    ON CONFLICT (user_id) DO UPDATE
+    SET total_forecasts = user_stats.total_forecasts + 1,
+        locations_count = user_stats.locations_count + EXCLUDED.locations_count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Оценки учитываются у владельца прогноза (как в прежнем запросе /stats)
+CREATE OR REPLACE FUNCTION user_stats_on_feedback() RETURNS trigger AS $$
+DECLARE
+    owner_id BIGINT;
+    likes_delta INTEGER := 0;
+    dislikes_delta INTEGER := 0;
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        likes_delta := likes_delta + (NEW.is_positive IS TRUE)::INTEGER;
+        dislikes_delta := dislikes_delta + (NEW.is_positive IS FALSE)::INTEGER;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        likes_delta := likes_delta - (OLD.is_positive IS TRUE)::INTEGER;
+        dislikes_delta := dislikes_delta - (OLD.is_positive IS FALSE)::INTEGER;
+    END IF;
+    IF likes_delta = 0 AND dislikes_delta = 0 THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT user_id INTO owner_id FROM forecasts
+    WHERE id = (CASE WHEN TG_OP = 'DELETE' THEN OLD.forecast_id ELSE NEW.forecast_id END);
+    IF owner_id IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    INSERT INTO user_stats (user_id, likes, dislikes)
+    VALUES (owner_id, likes_delta, dislikes_delta)
+    ON CONFLICT (user_id) DO UPDATE
+    SET likes = user_stats.likes + EXCLUDED.likes,
+        dislikes = user_stats.dislikes + EXCLUDED.dislikes;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS user_stats_forecast ON forecasts;
+CREATE TRIGGER user_stats_forecast
+    AFTER INSERT ON forecasts
+    FOR EACH ROW EXECUTE FUNCTION user_stats_on_forecast();
+
+DROP TRIGGER IF EXISTS user_stats_feedback ON feedback;
+CREATE TRIGGER user_stats_feedback
+    AFTER INSERT OR UPDATE OF is_positive OR DELETE ON feedback
+    FOR EACH ROW EXECUTE FUNCTION user_stats_on_feedback();
+
+-- Заполнение по существующим данным
+TRUNCATE user_stats, user_locations;
+
+INSERT INTO user_locations (user_id, location_name)
+SELECT DISTINCT user_id, location_name FROM forecasts WHERE location_name IS NOT NULL;
+
+INSERT INTO user_stats (user_id, total_forecasts, locations_count, likes, dislikes)
+SELECT fc.user_id,
+       COUNT(*),
+       COUNT(DISTINCT fc.location_name),
+       COALESCE(SUM(fb.likes), 0),
+       COALESCE(SUM(fb.dislikes), 0)
+FROM forecasts fc
+LEFT JOIN (
+    SELECT forecast_id,
+           COUNT(*) FILTER (WHERE is_positive) AS likes,
+           COUNT(*) FILTER (WHERE NOT is_positive) AS dislikes
+    FROM feedback
+    GROUP BY forecast_id
+) fb ON fb.forecast_id = fc.id
+GROUP BY fc.user_id;
@@ -0,0 +1,23 @@
+-- Wash your car: индексы для частых запросов бота.
+-- Проверка планов: python scripts/migrate.py check
+
+-- Одна запись car_washes на пользователя (нужно для upsert геопозиции
+-- ON CONFLICT (user_id)): оставляем последнюю, ссылки прогнозов переносим на нее
+UPDATE forecasts f SET car_wash_id = last.id
+FROM (SELECT user_id, MAX(id) AS id FROM car_washes GROUP BY user_id) last
+WHERE f.user_id = last.user_id AND f.car_wash_id IS DISTINCT FROM last.id;
+
+DELETE FROM car_washes a USING car_washes b
+WHERE a.user_id = b.user_id AND a.id < b.id;
+
+-- Последняя геопозиция пользователя: index-only scan без обращения к таблице
+CREATE UNIQUE INDEX IF NOT EXISTS car_washes_user_id_key
+    ON car_washes (user_id) INCLUDE (lat, lon);
+
+-- Прогнозы пользователя (последние - первыми)
+CREATE INDEX IF NOT EXISTS forecasts_user_id_idx ON forecasts (user_id, id DESC);
+
+-- Внешние ключи forecasts: без индексов удаление car_washes/снимков
+-- проверяет forecasts целиком
+CREATE INDEX IF NOT EXISTS forecasts_car_wash_id_idx ON forecasts (car_wash_id);
+CREATE INDEX IF NOT EXISTS forecasts_snapshot_hash_idx ON forecasts (snapshot_hash);
@@ -0,0 +1,12 @@
+-- Wash your car: ежедневная рассылка по подписке.
+-- car_washes.notification_time - местное время рассылки (NULL - подписки нет),
+-- car_washes.date - местная дата последней отправленной рассылки.
+
+-- Раньше колонки не использовались
+UPDATE car_washes SET notification_time = NULL, date = NULL
+WHERE notification_time IS NOT NULL OR date IS NOT NULL;
+
+-- Подписки читаются при старте и периодически: индекс только по подписанным пользователям
+CREATE INDEX IF NOT EXISTS car_washes_subscribed_idx
+    ON car_washes (user_id) INCLUDE (lat, lon, notification_time, date)
+    WHERE notification_time IS NOT NULL;
@@ -0,0 +1,282 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Очередь исходящих запросов к Telegram.
+Подключается к сессии бота (request middleware), поэтому через нее проходят все вызовы
+с chat_id: message.answer, edit_reply_markup, bot.send_message и т.д.
+Ограничения Telegram соблюдаются token bucket'ами: общий на бота и отдельный на каждый чат.
+Ответы пользователям (interactive) получают слот раньше рассылки (bulk), при ответе 429
+запрос повторяется через retry_after.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+
+import metrics
+from settings import conf, section_settings
+
+# Приоритеты запросов (меньше - раньше)
+INTERACTIVE = 0
+BULK = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BULK: 'bulk'}
+
+# Приоритет запросов текущей задачи (рассылка выставляет BULK через bulk_sends)
+send_priority = contextvars.ContextVar('send_priority', default=INTERACTIVE)
+
+# Значения по умолчанию для секции outbound в config.yml
+OUTBOUND_DEFAULTS = {
+    'global_rate': 30,      # запросов в секунду на бота
+    'global_burst': 30,     # допустимая пачка запросов на бота
+    'chat_rate': 1,         # запросов в секунду в один личный чат
+    'chat_burst': 3,        # допустимая пачка запросов в один личный чат
+    'group_rate': 0.33,     # запросов в секунду в одну группу (20 в минуту)
+    'group_burst': 3,       # допустимая пачка запросов в одну группу
+    'max_retries': 3,       # повторов запроса после ответа 429
+    'max_chats': 10000,     # максимум чатов, для которых хранится состояние лимита
+}
+
+
+@contextmanager
+def bulk_sends():
+    """ Запросы внутри блока идут с приоритетом рассылки """
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    """
+    Token bucket с резервированием: reserve забирает токен, даже если его еще нет,
+    и возвращает, сколько нужно подождать до его появления
+    """
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """ Забирает токен, возвращает ожидание до его появления (секунды) """
+        self._refill(now)
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self) -> None:
+        """ Возвращает неиспользованный токен """
+        self.tokens = min(self.burst, self.tokens + 1)
+
+    def pause(self, seconds: float, now: float) -> None:
+        """ Следующий токен появится не раньше, чем через seconds """
+        self._refill(now)
+        self.tokens = min(self.tokens, 1.0 - seconds * self.rate)
+
+
+class OutboundQueue(BaseRequestMiddleware):
+    """
+    Ограничение скорости исходящих запросов.
+    Запрос сначала ждет токен своего чата, затем встает в общую очередь по приоритету;
+    общая очередь выдает токены со скоростью global_rate
+    """
+
+    def __init__(self, global_rate: float = OUTBOUND_DEFAULTS['global_rate'],
+                 global_burst: float = OUTBOUND_DEFAULTS['global_burst'],
+                 chat_rate: float = OUTBOUND_DEFAULTS['chat_rate'],
+                 chat_burst: float = OUTBOUND_DEFAULTS['chat_burst'],
+                 group_rate: float = OUTBOUND_DEFAULTS['group_rate'],
+                 group_burst: float = OUTBOUND_DEFAULTS['group_burst'],
+                 max_retries: int = OUTBOUND_DEFAULTS['max_retries'],
+                 max_chats: int = OUTBOUND_DEFAULTS['max_chats']):
+        self.global_rate = global_rate
+        self.global_burst = global_burst
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._global = None
+        self._chats = OrderedDict()
+        # Ожидающие общего токена: (приоритет, номер, future)
+        self._waiting = []
+        self._counter = itertools.count()
+        self._dispatcher = None
+        self.depth = {priority: 0 for priority in PRIORITY_NAMES}
+        self.requests = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_total = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.wait_max = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.retries = 0
+        self.failed = 0
+
+    def install(self, bot, share: float = 1.0) -> None:
+        """
+        Подключает очередь к сессии бота.
+        share - доля общего лимита для этого процесса (в многопроцессном режиме)
+        """
+        self.global_rate = self.global_rate * share
+        self.global_burst = max(1.0, self.global_burst * share)
+        bot.session.middleware(self)
+
+    def _global_bucket(self, now: float) -> TokenBucket:
+        if self._global is None:
+            self._global = TokenBucket(self.global_rate, self.global_burst, now)
+        return self._global
+
+    def _chat_bucket(self, chat_id, now: float) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательный chat_id - группа или канал, у них лимит ниже
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst, now)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst, now)
+            self._chats[chat_id] = bucket
+            # Давно не использованные чаты уже восстановили лимит, их состояние не нужно
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def acquire(self, chat_id, priority: int = INTERACTIVE) -> None:
+        """ Ждет разрешения на запрос в чат chat_id """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self.depth[priority] += 1
+        try:
+            delay = self._chat_bucket(chat_id, started).reserve(started)
+            if delay:
+                await asyncio.sleep(delay)
+            await self._acquire_global(priority)
+        finally:
+            self.depth[priority] -= 1
+        waited = loop.time() - started
+        self.requests[priority] += 1
+        self.wait_total[priority] += waited
+        self.wait_max[priority] = max(self.wait_max[priority], waited)
+        metrics.TELEGRAM_WAIT_SECONDS.labels(PRIORITY_NAMES[priority]).observe(waited)
+
+    async def _acquire_global(self, priority: int) -> None:
+        loop = asyncio.get_running_loop()
+        bucket = self._global_bucket(loop.time())
+        if not self._waiting:
+            # Очереди нет: если токен есть, запрос идет сразу
+            if bucket.reserve(loop.time()) == 0:
+                return
+            bucket.refund()
+        future = loop.create_future()
+        heapq.heappush(self._waiting, (priority, next(self._counter), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        await future
+
+    async def _dispatch(self) -> None:
+        """ Выдает общие токены ожидающим в порядке приоритета """
+        loop = asyncio.get_running_loop()
+        while self._waiting:
+            delay = self._global_bucket(loop.time()).reserve(loop.time())
+            if delay:
+                await asyncio.sleep(delay)
+            # Токен получает самый приоритетный из ожидающих на момент его появления
+            while self._waiting:
+                _, _, future = heapq.heappop(self._waiting)
+                if not future.done():
+                    future.set_result(None)
+                    break
+            else:
+                self._global.refund()
+
+    def pause(self, chat_id, seconds: float) -> None:
+        """ Telegram ответил 429: запросы в чат и общая очередь ждут seconds """
+        now = asyncio.get_running_loop().time()
+        self._chat_bucket(chat_id, now).pause(seconds, now)
+        self._global_bucket(now).pause(seconds, now)
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, 'chat_id', None)
+        if chat_id is None:
+            return await _timed_request(make_request, bot, method)
+        priority = send_priority.get()
+        attempt = 0
+        while True:
+            await self.acquire(chat_id, priority)
+            try:
+                return await _timed_request(make_request, bot, method)
+            except TelegramRetryAfter as error:
+                self.retries += 1
+                if attempt >= self.max_retries:
+                    self.failed += 1
+                    raise
+                attempt += 1
+                logging.warning(f"Telegram flood control in chat {chat_id}: "
+                                f"retry {attempt} in {error.retry_after} s")
+                self.pause(chat_id, error.retry_after)
+
+    def stats(self) -> dict:
+        """ Глубина очереди, время ожидания и счетчики по приоритетам """
+        report = {'retries': self.retries, 'failed': self.failed, 'chats': len(self._chats)}
+        for priority, name in PRIORITY_NAMES.items():
+            requests = self.requests[priority]
+            report[name] = {
+                'depth': self.depth[priority],
+                'requests': requests,
+                'wait_avg': self.wait_total[priority] / requests if requests else 0.0,
+                'wait_max': self.wait_max[priority],
+            }
+        return report
+
+
+async def _timed_request(make_request, bot, method):
+    """ Запрос к Telegram с записью времени и ошибок в метрики """
+    method_name = type(method).__name__
+    started = time.perf_counter()
+    try:
+        return await make_request(bot, method)
+    except TelegramAPIError as error:
+        metrics.TELEGRAM_ERRORS_TOTAL.labels(method_name, type(error).__name__).inc()
+        raise
+    finally:
+        metrics.TELEGRAM_REQUEST_SECONDS.labels(method_name).observe(time.perf_counter() - started)
+
+
+def _create_queue() -> OutboundQueue:
+    """ Создает очередь с настройками из config.yml """
+    settings = section_settings(conf.get('outbound'), OUTBOUND_DEFAULTS, 'outbound')
+    return OutboundQueue(global_rate=settings['global_rate'],
+                         global_burst=settings['global_burst'],
+                         chat_rate=settings['chat_rate'],
+                         chat_burst=settings['chat_burst'],
+                         group_rate=settings['group_rate'],
+                         group_burst=settings['group_burst'],
+                         max_retries=settings['max_retries'],
+                         max_chats=settings['max_chats'])
+
+
+def _register_metrics(queue: OutboundQueue) -> None:
+    """ Глубина очереди по приоритетам отдается в метрики """
+    for priority, name in PRIORITY_NAMES.items():
+        metrics.OUTBOUND_QUEUE_DEPTH.labels(name).set_function(partial(queue.depth.get, priority))
+
+
+outbound_queue = _create_queue()
+_register_metrics(outbound_queue)
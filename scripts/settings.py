@@ -0,0 +1,98 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Настройки бота.
+config.yml читается один раз за процесс (при первом импорте модуля) и проверяется,
+модули берут его отсюда: from settings import conf. Секции со значениями по умолчанию
+собираются функцией section_settings, которая проверяет ключи и типы значений.
+"""
+
+import sys
+import time
+
+from functions import read_yaml
+
+CONFIG_FILE = 'config.yml'
+# Секции config.yml (каждая - словарь или пусто)
+SECTIONS = ('webhook', 'weather', 'forecast_cache', 'supervisor', 'outbound', 'metrics',
+            'write_behind', 'subscriptions', 'user_stats', 'db', 'logs')
+MODES = ('polling', 'webhook')
+
+
+class SettingsError(ValueError):
+    """ Ошибка в config.yml """
+
+
+def _same_type(value, default) -> bool:
+    """ Подходит ли тип значения из config.yml к значению по умолчанию """
+    if isinstance(default, bool) or isinstance(value, bool):
+        return isinstance(value, bool) and isinstance(default, bool)
+    if isinstance(default, (int, float)):
+        return isinstance(value, (int, float))
+    return isinstance(value, type(default))
+
+
+def section_settings(section, defaults: dict, name: str) -> dict:
+    """
+    Секция config.yml поверх значений по умолчанию.
+    Пустые значения заменяются значениями по умолчанию. Неизвестный ключ
+    или значение не того типа - SettingsError
+    """
+    settings = dict(defaults)
+    for key, value in (section or {}).items():
+        if key not in defaults:
+            raise SettingsError(f"Unknown setting {name}.{key} in {CONFIG_FILE}")
+        if value is None or value == '':
+            continue
+        default = defaults[key]
+        if default is not None and not _same_type(value, default):
+            raise SettingsError(f"{name}.{key} in {CONFIG_FILE} must be {type(default).__name__}, "
+                                f"got {value!r}")
+        settings[key] = value
+    return settings
+
+
+def validate(data) -> list:
+    """ Проверка структуры config.yml, возвращает список ошибок """
+    if not isinstance(data, dict):
+        return [f"{CONFIG_FILE} must contain a mapping"]
+    errors = []
+    for name in SECTIONS:
+        if not isinstance(data.get(name) or {}, dict):
+            errors.append(f"Section {name} must be a mapping")
+    if (data.get('mode') or 'polling') not in MODES:
+        errors.append(f"mode must be one of {', '.join(MODES)}, got {data.get('mode')!r}")
+    for key in ('telegram_token', 'open_weather_token'):
+        if data.get(key) is not None and not isinstance(data[key], str):
+            errors.append(f"{key} must be a string")
+    return errors
+
+
+def require(*keys) -> None:
+    """ Проверяет, что обязательные параметры заданы (для запуска бота) """
+    missing = [key for key in keys if not conf.get(key)]
+    if missing:
+        raise SettingsError(f"{', '.join(missing)} must be set in {CONFIG_FILE}")
+
+
+def load(filename: str = CONFIG_FILE) -> dict:
+    """
+    Читает и проверяет конфиг, возвращает словарь.
+    Если конфиг с ошибками - печатает их и завершает процесс (как read_yaml при отсутствии файла)
+    """
+    data = read_yaml(filename) or {}
+    errors = validate(data)
+    if errors:
+        print(f"Config file {filename} is invalid:\n" + '\n'.join(f"  {error}" for error in errors))
+        sys.exit(1)
+    return data
+
+
+_started = time.perf_counter()
+conf = load()
+# Время чтения конфига (для отчета о запуске)
+load_seconds = time.perf_counter() - _started
@@ -0,0 +1,60 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Объединение одновременных одинаковых запросов (single-flight).
+Пока запрос по ключу выполняется, остальные вызовы с тем же ключом
+ждут его результат, а не запускают свой.
+"""
+
+import asyncio
+
+
+class SingleFlight:
+    """
+    Группа запросов с общим результатом по ключу.
+    Результат или исключение первого запроса получают все ожидающие
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key, func):
+        """
+        Выполняет корутину func() для ключа key или присоединяется
+        к уже выполняющемуся запросу с тем же ключом
+        """
+        task = self._in_flight.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced += 1
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task) -> None:
+        """ Убирает завершившийся запрос, чтобы следующий вызов начал новый """
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Помечаем исключение полученным, даже если все ожидающие были отменены
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._in_flight)
+
+    def stats(self) -> dict:
+        """ Счетчики выполненных и объединенных запросов """
+        return {
+            'in_flight': len(self._in_flight),
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
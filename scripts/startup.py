@@ -0,0 +1,87 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Отчет о времени запуска процесса и фоновый прогрев тяжелых зависимостей.
+Модуль импортируется первым в main.py: время считается от начала импорта модулей бота.
+NumPy, timezonefinder (с данными часовых поясов) и pytz не загружаются при запуске,
+их загружает фоновый поток, когда бот уже принимает обновления.
+"""
+
+import logging
+import threading
+import time
+
+STARTED = time.perf_counter()
+# Координаты для прогрева определения часового пояса (Москва)
+WARM_UP_POINT = (55.75, 37.62)
+
+# Этапы запуска: (название, секунды)
+_phases = []
+_last_mark = STARTED
+_warm_up_thread = None
+
+
+def mark(phase: str) -> None:
+    """ Отмечает завершение этапа запуска (время считается от предыдущей отметки) """
+    global _last_mark
+    now = time.perf_counter()
+    _phases.append((phase, now - _last_mark))
+    _last_mark = now
+
+
+def report() -> dict:
+    """ Пишет в лог и в метрики время этапов запуска, возвращает {этап: секунды} """
+    import metrics
+    import settings
+
+    phases = dict(_phases)
+    phases['total'] = _last_mark - STARTED
+    for phase, seconds in phases.items():
+        metrics.STARTUP_SECONDS.labels(phase).set(seconds)
+    details = ', '.join(f"{phase} {seconds:.3f} s" for phase, seconds in _phases)
+    logging.info(f"Started in {phases['total']:.3f} s: {details} "
+                 f"(config read in {settings.load_seconds * 1000:.1f} ms)")
+    return phases
+
+
+def _warm_up() -> None:
+    """ Загружает NumPy, данные часовых поясов и pytz """
+    import metrics
+    from timezone_resolver import get_zone, resolve_timezone
+
+    started = time.perf_counter()
+    try:
+        import numpy  # noqa: F401
+        resolve_timezone(*WARM_UP_POINT)
+        get_zone('UTC')
+    except Exception as error:
+        # Не страшно: загрузится при первом прогнозе
+        logging.warning(f"Warm-up failed: {error!r}")
+        return
+    seconds = time.perf_counter() - started
+    metrics.STARTUP_SECONDS.labels('warm_up').set(seconds)
+    logging.info(f"Warm-up finished in {seconds:.3f} s")
+
+
+def warm_up() -> threading.Thread:
+    """ Запускает прогрев в фоновом потоке (один раз на процесс) """
+    global _warm_up_thread
+    if _warm_up_thread is None:
+        _warm_up_thread = threading.Thread(target=_warm_up, name='warm-up', daemon=True)
+        _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def ready() -> dict:
+    """
+    Процесс готов принимать обновления: отмечает этап, пишет отчет о запуске
+    и запускает фоновый прогрев
+    """
+    mark('ready')
+    phases = report()
+    warm_up()
+    return phases
@@ -0,0 +1,376 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Ежедневная рассылка совета по подписке.
+Время рассылки - местное время пользователя (car_washes.notification_time), дата последней
+рассылки - car_washes.date. Подписки лежат в куче по времени следующей отправки (epoch);
+пользователи, у которых время наступило, группируются по ячейкам сетки прогноза:
+прогноз и рекомендация считаются один раз на ячейку и рассылаются всем ее пользователям.
+"""
+
+import asyncio
+import datetime
+import heapq
+import logging
+import time
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramAPIError
+
+import database_module
+import messages
+import metrics
+import weather_providers
+from settings import conf, section_settings
+from outbound import bulk_sends
+from timezone_resolver import get_timezone, get_zone
+from wash_functions import recommend_car_wash
+from write_behind import write_queue
+
+# Значения по умолчанию для секции subscriptions в config.yml
+SUBSCRIPTIONS_DEFAULTS = {
+    'default_time': '08:00',    # время рассылки, если в /subscribe оно не указано
+    'precision': 1,             # знаков после запятой в координатах ячейки рассылки (~10 км)
+    'max_delay': 1800,          # насколько можно опоздать с рассылкой (после простоя), секунды
+    'retry_delay': 300,         # повтор для ячейки, прогноз которой не удалось получить, секунды
+    'reload_interval': 300,     # как часто перечитывать подписки из БД, секунды
+    'fetch_concurrency': 10,    # одновременных запросов прогноза
+    'send_concurrency': 20,     # одновременных отправок (скорость ограничивает очередь outbound)
+}
+
+SUBSCRIPTIONS_SQL = """
+    SELECT user_id, lat, lon, notification_time, date
+    FROM car_washes
+    WHERE notification_time IS NOT NULL
+"""
+DUE_SUBSCRIPTIONS_SQL = """
+    SELECT user_id, lat, lon, notification_time, date
+    FROM car_washes
+    WHERE user_id = ANY($1::bigint[]) AND notification_time IS NOT NULL
+"""
+SUBSCRIBE_SQL = """
+    UPDATE car_washes SET notification_time = $2, date = NULL
+    WHERE user_id = $1
+    RETURNING lat, lon
+"""
+# Подписка, когда записи car_washes еще нет: первая геопозиция пользователя
+# может быть еще в очереди записи (write-behind)
+SUBSCRIBE_LOCATION_SQL = """
+    INSERT INTO car_washes (user_id, user_name, lat, lon, notification_time)
+    VALUES ($1, $2, $3, $4, $5)
+    ON CONFLICT (user_id) DO UPDATE SET notification_time = EXCLUDED.notification_time, date = NULL
+    RETURNING lat, lon
+"""
+UNSUBSCRIBE_SQL = "UPDATE car_washes SET notification_time = NULL WHERE user_id = $1"
+MARK_SENT_SQL = "UPDATE car_washes SET date = $2 WHERE user_id = $1"
+
+
+def parse_send_time(text: str) -> datetime.time:
+    """ Время рассылки из строки ЧЧ:ММ (ValueError, если формат неверный) """
+    hours, minutes = text.strip().split(':')
+    return datetime.time(int(hours), int(minutes))
+
+
+def pending_location(user_id):
+    """
+    Геопозиция (lat, lon) из последнего прогноза пользователя, который еще
+    не записан в БД очередью write-behind; None, если такого прогноза нет
+    """
+    for key, value in reversed(write_queue.pending.items()):
+        if key[0] == 'forecast' and value[0] == user_id:
+            return value[1], value[2]
+    return None
+
+
+def subscription_zone(lat, lon):
+    """ Часовой пояс пользователя по координатам (UTC, если определить не удалось) """
+    timezone_str = get_timezone(lat, lon)
+    return get_zone(timezone_str or 'UTC')
+
+
+def next_send_time(now: float, send_time: datetime.time, zone, last_sent=None,
+                   max_delay: float = 0) -> tuple:
+    """
+    Ближайшая рассылка: (время epoch, местная дата).
+    Рассылка, которая уже была (last_sent) или опоздала больше чем на max_delay, пропускается
+    """
+    today = datetime.datetime.fromtimestamp(now, zone).date()
+    for days in range(-1, 3):
+        local_date = today + datetime.timedelta(days=days)
+        if local_date == last_sent:
+            continue
+        send_at = zone.localize(datetime.datetime.combine(local_date, send_time)).timestamp()
+        if send_at >= now - max_delay:
+            return send_at, local_date
+    raise ValueError(f"No send time for {send_time} in {zone}")
+
+
+class SubscriptionScheduler:
+    """
+    Планировщик рассылки.
+    Куча (время отправки, версия, user_id); при изменении подписки старая запись
+    в куче не удаляется, а пропускается по несовпадающей версии
+    """
+
+    def __init__(self, precision: int = SUBSCRIPTIONS_DEFAULTS['precision'],
+                 max_delay: float = SUBSCRIPTIONS_DEFAULTS['max_delay'],
+                 retry_delay: float = SUBSCRIPTIONS_DEFAULTS['retry_delay'],
+                 reload_interval: float = SUBSCRIPTIONS_DEFAULTS['reload_interval'],
+                 fetch_concurrency: int = SUBSCRIPTIONS_DEFAULTS['fetch_concurrency'],
+                 send_concurrency: int = SUBSCRIPTIONS_DEFAULTS['send_concurrency']):
+        self.precision = precision
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.reload_interval = reload_interval
+        self.fetch_concurrency = fetch_concurrency
+        self.send_concurrency = send_concurrency
+        self._heap = []
+        # user_id -> (версия, время рассылки, дата последней рассылки)
+        self._entries = {}
+        self._version = 0
+        self._wakeup = asyncio.Event()
+        self._batches = set()
+        self.running = False
+        self.sent = 0
+        self.failed = 0
+        self.fetches = 0
+
+    def schedule(self, user_id, send_time: datetime.time, zone, last_sent=None,
+                 now: float = None) -> None:
+        """ Ставит (или переставляет) рассылку пользователю """
+        if now is None:
+            now = time.time()
+        send_at, _ = next_send_time(now, send_time, zone, last_sent, self.max_delay)
+        self._push(user_id, send_at, send_time, last_sent)
+
+    def cancel(self, user_id) -> None:
+        """ Отменяет рассылку пользователю """
+        self._entries.pop(user_id, None)
+
+    def _push(self, user_id, send_at: float, send_time, last_sent) -> None:
+        self._version += 1
+        self._entries[user_id] = (self._version, send_time, last_sent)
+        heapq.heappush(self._heap, (send_at, self._version, user_id))
+        if self._heap[0][1] == self._version:
+            self._wakeup.set()
+
+    def pop_due(self, now: float) -> list:
+        """ user_id пользователей, у которых наступило время рассылки """
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, version, user_id = heapq.heappop(self._heap)
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version:
+                due.append(user_id)
+        return due
+
+    def next_wakeup(self):
+        """ Время ближайшей актуальной записи в куче (устаревшие записи удаляются) """
+        while self._heap:
+            _, version, user_id = self._heap[0]
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version:
+                return self._heap[0][0]
+            heapq.heappop(self._heap)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def cell(self, lat, lon) -> tuple:
+        """ Ячейка сетки рассылки для координат """
+        lon = (float(lon) + 180) % 360 - 180
+        return round(float(lat), self.precision), round(lon, self.precision)
+
+    async def reload(self, now: float = None) -> None:
+        """ Перечитывает подписки из БД (подписки, измененные в других процессах) """
+        if now is None:
+            now = time.time()
+        async with database_module.connection() as conn:
+            rows = await conn.fetch(SUBSCRIPTIONS_SQL)
+        subscribed = set()
+        for row in rows:
+            user_id = row['user_id']
+            subscribed.add(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] != row['notification_time']:
+                self.schedule(user_id, row['notification_time'],
+                              subscription_zone(row['lat'], row['lon']), row['date'], now)
+        for user_id in list(self._entries):
+            if user_id not in subscribed:
+                self.cancel(user_id)
+        logging.info(f"Subscriptions loaded: {len(self._entries)}")
+
+    async def fire(self, bot, get_forecast, user_ids: list, now: float = None) -> None:
+        """
+        Рассылка пользователям user_ids.
+        Подписка перечитывается из БД (пользователь мог отписаться или сменить геопозицию),
+        пользователи группируются по ячейкам, прогноз запрашивается один раз на ячейку.
+        Внутри ячейки рекомендация считается отдельно для каждого часового пояса
+        (ячейка может лежать на границе поясов) по геопозиции одного из ее пользователей
+        """
+        if now is None:
+            now = time.time()
+        async with database_module.connection() as conn:
+            rows = await conn.fetch(DUE_SUBSCRIPTIONS_SQL, user_ids)
+        found = {row['user_id'] for row in rows}
+        for user_id in user_ids:
+            if user_id not in found:
+                self.cancel(user_id)
+
+        cells = {}
+        for row in rows:
+            zone = subscription_zone(row['lat'], row['lon'])
+            send_at, local_date = next_send_time(now, row['notification_time'], zone,
+                                                 row['date'], self.max_delay)
+            if send_at > now:
+                # Время рассылки изменилось (другое время или часовой пояс)
+                self._push(row['user_id'], send_at, row['notification_time'], row['date'])
+                continue
+            zones = cells.setdefault(self.cell(row['lat'], row['lon']), {})
+            if zone not in zones:
+                zones[zone] = ((row['lat'], row['lon']), [])
+            zones[zone][1].append((row['user_id'], row['notification_time'], zone, local_date))
+
+        semaphore = asyncio.Semaphore(self.fetch_concurrency)
+
+        async def prepare(cell, zones):
+            async with semaphore:
+                try:
+                    self.fetches += 1
+                    forecast = await get_forecast(*cell)
+                except weather_providers.WeatherApiError as error:
+                    logging.error(f"Subscription forecast failed for cell {cell}: {error}")
+                    for _, users in zones.values():
+                        for user_id, send_time, _, _ in users:
+                            self._push(user_id, now + self.retry_delay, send_time, None)
+                    return []
+            prepared_zones = []
+            for (lat, lon), users in zones.values():
+                with metrics.phase('recommend'):
+                    recommendation_text = recommend_car_wash(forecast, lat, lon)
+                text = messages.FORECAST_MESSAGE.format(recommendation=recommendation_text,
+                                                        location=forecast.city_name)
+                prepared_zones.append((text, users))
+            return prepared_zones
+
+        prepared = await asyncio.gather(*(prepare(cell, zones) for cell, zones in cells.items()))
+        logging.info(f"Subscriptions due: {len(rows)} users in {len(cells)} cells")
+
+        deliveries = iter([(text, user) for prepared_zones in prepared
+                           for text, users in prepared_zones for user in users])
+
+        async def sender():
+            for text, (user_id, send_time, zone, local_date) in deliveries:
+                if await self._send(bot, user_id, text):
+                    await write_queue.put(MARK_SENT_SQL, (user_id, local_date))
+                    self.schedule(user_id, send_time, zone, local_date, now)
+
+        # Скорость отправки ограничивает очередь outbound, рассылка уступает ответам пользователям
+        with bulk_sends():
+            await asyncio.gather(*(sender() for _ in range(self.send_concurrency)))
+
+    async def _send(self, bot, user_id, text: str) -> bool:
+        """
+        Отправляет сообщение рассылки (429 повторяет очередь outbound).
+        Возвращает False, если пользователь заблокировал бота и подписка отменена
+        """
+        try:
+            await bot.send_message(user_id, text, parse_mode='HTML')
+            self.sent += 1
+            return True
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота - подписка больше не нужна
+            logging.info(f"User {user_id} blocked the bot, unsubscribing")
+            self.cancel(user_id)
+            await write_queue.put(UNSUBSCRIBE_SQL, (user_id,))
+            self.failed += 1
+            return False
+        except TelegramAPIError as error:
+            logging.error(f"Can not send subscription to {user_id}: {error}")
+            self.failed += 1
+            return True
+
+    async def run(self, bot, get_forecast) -> None:
+        """
+        Основной цикл: ждет ближайшую рассылку и запускает ее в фоне.
+        get_forecast(lat, lon) - получение прогноза (с кэшем обработчиков)
+        """
+        self.running = True
+        last_reload = None
+        try:
+            while True:
+                now = time.time()
+                if last_reload is None or now - last_reload >= self.reload_interval:
+                    try:
+                        await self.reload(now)
+                        last_reload = now
+                    except database_module.DB_ERRORS as error:
+                        logging.error(f"Can not load subscriptions: {error}")
+                        last_reload = now - self.reload_interval + self.retry_delay
+
+                due = self.pop_due(now)
+                if due:
+                    batch = asyncio.create_task(self._fire_logged(bot, get_forecast, due, now))
+                    self._batches.add(batch)
+                    batch.add_done_callback(self._batches.discard)
+
+                wakeup = self.next_wakeup()
+                timeout = last_reload + self.reload_interval - time.time()
+                if wakeup is not None:
+                    timeout = min(timeout, wakeup - time.time())
+                self._wakeup.clear()
+                if timeout > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self.running = False
+            for batch in list(self._batches):
+                batch.cancel()
+
+    async def _fire_logged(self, bot, get_forecast, user_ids, now) -> None:
+        """ fire в фоне: при ошибке рассылка пользователям повторяется через retry_delay """
+        versions = {user_id: self._entries[user_id][0] for user_id in user_ids
+                    if user_id in self._entries}
+        try:
+            await self.fire(bot, get_forecast, user_ids, now)
+        except Exception as error:
+            logging.error(f"Subscription batch failed: {error!r}")
+            # Повторяется только тем, кому рассылка не была отправлена или переставлена
+            for user_id, version in versions.items():
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] == version:
+                    self._push(user_id, time.time() + self.retry_delay, entry[1], entry[2])
+
+    def stats(self) -> dict:
+        """ Счетчики рассылки """
+        return {
+            'subscribers': len(self._entries),
+            'sent': self.sent,
+            'failed': self.failed,
+            'forecast_fetches': self.fetches,
+        }
+
+
+def subscriptions_settings() -> dict:
+    """ Настройки рассылки из config.yml поверх значений по умолчанию """
+    return section_settings(conf.get('subscriptions'), SUBSCRIPTIONS_DEFAULTS, 'subscriptions')
+
+
+def _create_scheduler() -> SubscriptionScheduler:
+    """ Создает планировщик с настройками из config.yml """
+    settings = subscriptions_settings()
+    return SubscriptionScheduler(precision=settings['precision'],
+                                 max_delay=settings['max_delay'],
+                                 retry_delay=settings['retry_delay'],
+                                 reload_interval=settings['reload_interval'],
+                                 fetch_concurrency=settings['fetch_concurrency'],
+                                 send_concurrency=settings['send_concurrency'])
+
+
+subscription_scheduler = _create_scheduler()
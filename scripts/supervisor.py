@@ -0,0 +1,392 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Многопроцессный режим (supervisor.workers > 1 в config.yml).
+Процесс-супервизор получает обновления (polling или webhook) и передает каждое
+в процесс-обработчик по from_user.id: обновления одного пользователя всегда
+попадают в один процесс и обрабатываются в нем по порядку. Связь с процессами -
+пара сокетов (socketpair), сообщения - JSON с префиксом длины. Процессы присылают
+heartbeat с метриками; процесс без heartbeat перезапускается. Обновления, уже
+переданные упавшему процессу, теряются (Telegram их повторно не присылает),
+обновления, пришедшие до его перезапуска, копятся в backlog.
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import signal
+import socket
+import time
+from collections import deque
+from contextlib import suppress
+
+from aiogram import Bot
+from aiogram.client.bot import DefaultBotProperties
+from aiogram.enums import ParseMode
+
+import database_module
+import logger
+import metrics
+import startup
+import webhook_server
+import weather_providers
+from write_behind import write_queue
+from outbound import outbound_queue
+from settings import section_settings
+
+# Значения по умолчанию для секции supervisor в config.yml
+SUPERVISOR_DEFAULTS = {
+    'workers': 1,               # процессов-обработчиков (1 - без супервизора)
+    'heartbeat_interval': 5,    # как часто процесс присылает метрики, секунды
+    'heartbeat_timeout': 30,    # процесс без heartbeat дольше этого перезапускается, секунды
+    'metrics_interval': 60,     # как часто метрики процессов пишутся в лог, секунды
+    'max_in_flight': 256,       # обновлений в обработке в одном процессе
+    'backlog_size': 1000,       # обновлений, ожидающих перезапуска упавшего процесса
+    'stop_timeout': 30,         # ожидание завершения процессов при остановке, секунды
+    'polling_timeout': 30,      # таймаут long polling getUpdates, секунды
+}
+# Длина префикса сообщения, байт
+FRAME_HEADER_SIZE = 4
+
+
+def supervisor_settings(conf: dict) -> dict:
+    """ Настройки супервизора из config.yml поверх значений по умолчанию """
+    return section_settings(conf.get('supervisor'), SUPERVISOR_DEFAULTS, 'supervisor')
+
+
+def outbound_share(settings: dict) -> float:
+    """
+    Доля общего лимита запросов к Telegram на один процесс:
+    лимит делится между обработчиками и супервизором (он выполняет рассылку)
+    """
+    return 1 / (settings['workers'] + 1)
+
+
+async def read_frame(reader):
+    """ Читает одно сообщение (JSON с префиксом длины) """
+    header = await reader.readexactly(FRAME_HEADER_SIZE)
+    return json.loads(await reader.readexactly(int.from_bytes(header, 'big')))
+
+
+def write_frame(writer, message) -> None:
+    """ Записывает одно сообщение (JSON с префиксом длины) в буфер """
+    data = json.dumps(message, ensure_ascii=False).encode()
+    writer.write(len(data).to_bytes(FRAME_HEADER_SIZE, 'big') + data)
+
+
+def update_user_id(update: dict) -> int:
+    """
+    Ключ маршрутизации обновления: from.id события (или id чата),
+    для обновлений без пользователя - update_id
+    """
+    for field, event in update.items():
+        if field == 'update_id' or not isinstance(event, dict):
+            continue
+        user = event.get('from') or event.get('user')
+        if user and 'id' in user:
+            return user['id']
+        chat = event.get('chat')
+        if chat and 'id' in chat:
+            return chat['id']
+    return update.get('update_id', 0)
+
+
+# ----------------------------------------------------------------------------
+# Процесс-обработчик
+# ----------------------------------------------------------------------------
+
+def worker_main(index: int, sock: socket.socket, conf: dict) -> None:
+    """ Точка входа процесса-обработчика """
+    # Ctrl+C получает вся группа процессов, останавливает обработчики супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.setup_logging()
+    asyncio.run(_run_worker(index, sock, conf))
+
+
+async def _run_worker(index, sock, conf) -> None:
+    """ Принимает обновления от супервизора и передает их диспетчеру """
+    from scripts.handlers.main_handlers import dp
+
+    startup.mark('imports')
+    settings = supervisor_settings(conf)
+    bot = Bot(conf['telegram_token'], default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    outbound_queue.install(bot, share=outbound_share(settings))
+    reader, writer = await asyncio.open_connection(sock=sock)
+    await database_module.create_pool(conf['db'])
+    startup.mark('db_pool')
+    write_queue.start()
+    await dp.emit_startup(bot=bot)
+    # Метрики обработчика - на своем порту (metrics.port + 1 + номер)
+    metrics_runner = await metrics.start_server(conf, offset=1 + index)
+    startup.mark('metrics_server')
+    logging.info(f"Worker {index} started")
+    startup.ready()
+
+    slots = asyncio.Semaphore(settings['max_in_flight'])
+    # Последняя задача каждого пользователя: следующая ждет ее завершения
+    user_tails = {}
+    tasks = set()
+    counters = {'worker': index, 'updates': 0, 'errors': 0, 'in_flight': 0,
+                'handle_time_total': 0.0, 'handle_time_max': 0.0}
+
+    async def handle(key, update, previous) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        started = time.perf_counter()
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as error:
+            counters['errors'] += 1
+            logging.error(f"Worker {index}: error handling update {update.get('update_id')}: {error}")
+        finally:
+            elapsed = time.perf_counter() - started
+            counters['updates'] += 1
+            counters['handle_time_total'] += elapsed
+            counters['handle_time_max'] = max(counters['handle_time_max'], elapsed)
+            counters['in_flight'] -= 1
+            slots.release()
+            if user_tails.get(key) is asyncio.current_task():
+                del user_tails[key]
+
+    async def heartbeat() -> None:
+        while True:
+            report = dict(counters, write_queue=write_queue.stats(), outbound=outbound_queue.stats())
+            write_frame(writer, {'heartbeat': report})
+            await writer.drain()
+            await asyncio.sleep(settings['heartbeat_interval'])
+
+    heartbeat_task = asyncio.create_task(heartbeat())
+    try:
+        while True:
+            # Не читаем дальше, пока обрабатывается max_in_flight обновлений:
+            # сокет заполняется, и супервизор ждет (backpressure)
+            await slots.acquire()
+            try:
+                message = await read_frame(reader)
+            except asyncio.IncompleteReadError:
+                break
+            if message.get('stop'):
+                break
+            key = message['key']
+            counters['in_flight'] += 1
+            task = asyncio.create_task(handle(key, message['update'], user_tails.get(key)))
+            user_tails[key] = task
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.wait(set(tasks), timeout=settings['stop_timeout'])
+        heartbeat_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await heartbeat_task
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+        await weather_providers.close()
+        await write_queue.drain()
+        await database_module.close_pool()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        writer.close()
+        logging.info(f"Worker {index} stopped: {counters}")
+
+
+# ----------------------------------------------------------------------------
+# Супервизор
+# ----------------------------------------------------------------------------
+
+class WorkerHandle:
+    """ Процесс-обработчик со стороны супервизора """
+
+    def __init__(self, index: int, conf: dict, settings: dict):
+        self.index = index
+        self.conf = conf
+        self.settings = settings
+        self.process = None
+        self.writer = None
+        self.listener = None
+        self.last_seen = 0.0
+        self.metrics = {}
+        self.restarts = 0
+        self.routed = 0
+        # Обновления, которые не удалось передать (процесс перезапускается)
+        self.backlog = deque(maxlen=settings['backlog_size'])
+
+    async def start(self) -> None:
+        """ Запускает процесс и подключается к нему """
+        parent_sock, child_sock = socket.socketpair()
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(target=worker_main, args=(self.index, child_sock, self.conf),
+                                       name=f'wash-worker-{self.index}', daemon=True)
+        self.process.start()
+        child_sock.close()
+        reader, self.writer = await asyncio.open_connection(sock=parent_sock)
+        self.last_seen = time.monotonic()
+        self.listener = asyncio.create_task(self._listen(reader))
+        logging.info(f"Worker {self.index} spawned, pid {self.process.pid}")
+        while self.backlog:
+            await self.send(self.backlog.popleft())
+
+    async def _listen(self, reader) -> None:
+        """ Принимает heartbeat с метриками от процесса """
+        with suppress(asyncio.IncompleteReadError, ConnectionError):
+            while True:
+                message = await read_frame(reader)
+                if 'heartbeat' in message:
+                    self.metrics = message['heartbeat']
+                    self.last_seen = time.monotonic()
+        # Соединение закрыто - процесс завершился: новые обновления копятся
+        # в backlog до перезапуска
+        if self.writer is not None:
+            self.writer.close()
+
+    async def send(self, message) -> None:
+        """ Передает сообщение процессу; если процесс недоступен - откладывает его """
+        if self.writer is None or self.writer.is_closing():
+            self.backlog.append(message)
+            return
+        try:
+            write_frame(self.writer, message)
+            await self.writer.drain()
+            self.routed += 1
+        except ConnectionError as error:
+            logging.error(f"Worker {self.index} unavailable: {error}")
+            self.backlog.append(message)
+
+    def healthy(self) -> bool:
+        """ Процесс жив и присылает heartbeat """
+        return (self.process is not None and self.process.is_alive()
+                and time.monotonic() - self.last_seen < self.settings['heartbeat_timeout'])
+
+    async def restart(self) -> None:
+        """ Останавливает зависший или упавший процесс и запускает новый """
+        logging.error(f"Worker {self.index} is unhealthy (exit code {self.process.exitcode}), restarting")
+        await self.kill()
+        self.restarts += 1
+        await self.start()
+
+    async def stop(self) -> None:
+        """ Просит процесс завершиться после обработки принятых обновлений """
+        if self.writer is not None and not self.writer.is_closing():
+            with suppress(ConnectionError):
+                write_frame(self.writer, {'stop': True})
+                await self.writer.drain()
+        await asyncio.to_thread(self.process.join, self.settings['stop_timeout'])
+        await self.kill()
+
+    async def kill(self) -> None:
+        """ Завершает процесс и закрывает соединение """
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            await asyncio.to_thread(self.process.join)
+        if self.listener is not None:
+            self.listener.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def stats(self) -> dict:
+        """ Метрики процесса для лога """
+        metrics = dict(self.metrics)
+        updates = metrics.pop('updates', 0)
+        total = metrics.pop('handle_time_total', 0.0)
+        return {
+            'pid': self.process.pid if self.process else None,
+            'routed': self.routed,
+            'handled': updates,
+            'errors': metrics.get('errors', 0),
+            'in_flight': metrics.get('in_flight', 0),
+            'avg_ms': round(total / updates * 1000, 1) if updates else 0.0,
+            'max_ms': round(metrics.get('handle_time_max', 0.0) * 1000, 1),
+            'restarts': self.restarts,
+            'backlog': len(self.backlog),
+        }
+
+
+class Supervisor:
+    """ Группа процессов-обработчиков и маршрутизация обновлений между ними """
+
+    def __init__(self, conf: dict):
+        self.conf = conf
+        self.settings = supervisor_settings(conf)
+        self.workers = [WorkerHandle(index, conf, self.settings)
+                        for index in range(self.settings['workers'])]
+
+    async def route(self, update: dict) -> None:
+        """ Передает обновление процессу, выбранному по from_user.id """
+        key = update_user_id(update)
+        await self.workers[key % len(self.workers)].send({'key': key, 'update': update})
+
+    async def monitor(self) -> None:
+        """ Перезапускает нездоровые процессы и пишет их метрики в лог """
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(self.settings['heartbeat_interval'])
+            for worker in self.workers:
+                if not worker.healthy():
+                    await worker.restart()
+            if time.monotonic() - last_report >= self.settings['metrics_interval']:
+                last_report = time.monotonic()
+                for worker in self.workers:
+                    logging.info(f"Worker {worker.index} metrics: {worker.stats()}")
+
+    async def poll(self, bot, dp) -> None:
+        """ Получает обновления через getUpdates и распределяет их по процессам """
+        offset = None
+        allowed_updates = dp.resolve_used_update_types()
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=self.settings['polling_timeout'],
+                                                allowed_updates=allowed_updates)
+            except Exception as error:
+                logging.error(f"Failed to fetch updates: {error}")
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                await self.route(update.model_dump(mode='json', by_alias=True, exclude_none=True))
+                offset = update.update_id + 1
+
+    async def run(self, bot, dp) -> None:
+        """ Запускает процессы и получение обновлений, работает до SIGINT/SIGTERM """
+        for worker in self.workers:
+            await worker.start()
+        monitor_task = asyncio.create_task(self.monitor())
+        try:
+            if self.conf.get('mode') == 'webhook':
+                await webhook_server.run_webhook(dp, bot, self.conf.get('webhook'), route=self.route)
+            else:
+                await bot.delete_webhook()
+                await _until_stopped(self.poll(bot, dp))
+        finally:
+            monitor_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await monitor_task
+            await asyncio.gather(*(worker.stop() for worker in self.workers))
+            for worker in self.workers:
+                logging.info(f"Worker {worker.index} final metrics: {worker.stats()}")
+            await bot.session.close()
+
+
+async def _until_stopped(coroutine) -> None:
+    """ Выполняет корутину до сигнала SIGINT/SIGTERM """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop_event.set)
+    task = asyncio.create_task(coroutine)
+    stop_task = asyncio.create_task(stop_event.wait())
+    try:
+        await asyncio.wait({task, stop_task}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for pending in (task, stop_task):
+            pending.cancel()
+            with suppress(asyncio.CancelledError):
+                await pending
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
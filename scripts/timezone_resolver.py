@@ -0,0 +1,70 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Определение часового пояса по координатам.
+TimezoneFinder создается один раз на процесс (при первом обращении или фоновым прогревом
+после запуска, см. startup.py), результаты кэшируются по округленным координатам,
+объекты pytz - по имени зоны. timezonefinder и pytz импортируются при первом обращении.
+"""
+
+import threading
+from functools import lru_cache
+
+# Точность округления координат для кэша (знаков после запятой, ~1 км)
+TIMEZONE_PRECISION = 2
+# Максимум закэшированных ячеек координат
+TIMEZONE_CACHE_SIZE = 8192
+
+_finder = None
+_finder_lock = threading.Lock()
+
+
+def get_finder():
+    """ Возвращает общий TimezoneFinder, при первом вызове создает его (загружает данные зон) """
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                from timezonefinder import TimezoneFinder
+                _finder = TimezoneFinder()
+    return _finder
+
+
+@lru_cache(maxsize=TIMEZONE_CACHE_SIZE)
+def _timezone_name(lat, lon):
+    """ Имя часового пояса для округленных координат """
+    return get_finder().timezone_at(lng=lon, lat=lat)
+
+
+def get_timezone(lat, lon):
+    """ Функция получения часового пояса из широты и долготы """
+    return _timezone_name(round(float(lat), TIMEZONE_PRECISION),
+                          round(float(lon), TIMEZONE_PRECISION))
+
+
+@lru_cache(maxsize=None)
+def get_zone(timezone_str):
+    """ Объект часового пояса pytz по имени """
+    import pytz
+    return pytz.timezone(timezone_str)
+
+
+def resolve_timezone(lat, lon):
+    """
+    Часовой пояс для координат (объект pytz).
+    Возвращает None, если часовой пояс определить не удалось
+    """
+    timezone_str = get_timezone(lat, lon)
+    if timezone_str:
+        return get_zone(timezone_str)
+    return None
+
+
+def cache_info() -> dict:
+    """ Статистика кэша часовых поясов """
+    info = _timezone_name.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize}
@@ -0,0 +1,105 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Статистика пользователя.
+Счетчики ведутся в таблице user_stats триггерами БД при записи прогнозов и оценок,
+прочитанные значения кэшируются в памяти до следующей записи пользователя.
+"""
+
+from collections import OrderedDict
+
+import database_module
+from settings import conf, section_settings
+
+# Значения по умолчанию для секции user_stats в config.yml
+STATS_DEFAULTS = {
+    'max_size': 10000,  # максимум пользователей в кэше статистики
+}
+USER_STATS_SQL = """
+    SELECT total_forecasts, locations_count, likes, dislikes
+    FROM user_stats
+    WHERE user_id = $1
+"""
+# Статистика пользователя без прогнозов
+EMPTY_STATS = {'total_forecasts': 0, 'locations_count': 0, 'likes': 0, 'dislikes': 0}
+
+
+class UserStatsCache:
+    """
+    LRU-кэш статистики по user_id.
+    Запись сбрасывается при каждой записи прогноза или оценки пользователя
+    """
+
+    def __init__(self, max_size: int = STATS_DEFAULTS['max_size']):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        # Растет при каждом сбросе: результат запроса, начатого до сброса, не кэшируется
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        """ Возвращает статистику пользователя или None, если ее нет в кэше """
+        stats = self._entries.get(user_id)
+        if stats is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return stats
+
+    def put(self, user_id, stats: dict, generation: int) -> None:
+        """ Сохраняет статистику, если с начала ее чтения (generation) не было записей """
+        if generation != self.generation:
+            return
+        self._entries[user_id] = stats
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> None:
+        """ Сбрасывает статистику пользователя (после записи прогноза или оценки) """
+        self.generation += 1
+        self._entries.pop(user_id, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """ Счетчики попаданий/промахов кэша """
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': self.hits / total if total else 0.0,
+        }
+
+
+async def get_user_stats(user_id) -> dict:
+    """
+    Статистика пользователя: сначала из кэша, иначе одна строка из user_stats.
+    Ошибки БД пробрасываются вызывающему
+    """
+    stats = user_stats_cache.get(user_id)
+    if stats is not None:
+        return stats
+    generation = user_stats_cache.generation
+    async with database_module.connection() as conn:
+        row = await conn.fetchrow(USER_STATS_SQL, user_id)
+    stats = dict(row) if row else EMPTY_STATS
+    user_stats_cache.put(user_id, stats, generation)
+    return stats
+
+
+def _create_cache() -> UserStatsCache:
+    """ Создает кэш с настройками из config.yml """
+    settings = section_settings(conf.get('user_stats'), STATS_DEFAULTS, 'user_stats')
+    return UserStatsCache(max_size=settings['max_size'])
+
+
+user_stats_cache = _create_cache()
@@ -8,16 +8,15 @@ https://t.me/worth_wash_car_bot
 Функциональность для анализа погоды и и вывода стоит ли мыть машину
 """
 
-import locale
+import re
+import time
 from datetime import datetime
-from timezonefinder import TimezoneFinder
-import pytz
-import emoji
-import numpy as np
+from functools import lru_cache
 import logging
-import logger
-
-logger.setup_logging()
+import messages
+from timezone_resolver import resolve_timezone
+from forecast_series import (FLAG_BAD_WEATHER, FLAG_PRECIPITATION, FLAG_RAIN,
+                             FLAG_RAIN_OR_SNOW, FLAG_FREEZING_PRECIPITATION, plain_number)
 
 # Порог для принятия решения по температуре (например, 35%)
 TEMPERATURE_TRESHOLD = 0.35
@@ -29,65 +28,121 @@ WINTER_MODE_THRESHOLD = 5  # °C - ниже этой температуры вк
 WIND_DIRT_THRESHOLD = 7  # м/с, ветер при котором грязь будет лететь на машину
 REAGENT_WASH_INTERVAL = 3  # дня - как часто мыть при использовании реагентов
 
+# Окно для мойки - не меньше двух подряд подходящих интервалов (6 часов)
+WASH_WINDOW_PATTERN = re.compile(b'\x01{2,}')
+
+# Длительность интервала прогноза, секунды
+SLOT_SECONDS = 3 * 3600
+# Сокращенные названия месяцев в родительном падеже (как %b в локали ru_RU),
+# чтобы не зависеть от локали процесса
+MONTHS_RU = ('янв', 'фев', 'мар', 'апр', 'мая', 'июн',
+             'июл', 'авг', 'сен', 'окт', 'ноя', 'дек')
+
+
+@lru_cache(maxsize=None)
+def _winter_wash_bounds():
+    """
+    Границы "можно мыть зимой" по столбцам ForecastSeries.rows: lower < значение < upper,
+    и минимальная температура для мойки в зависимости от флагов описания:
+    при дожде/снеге мыть нельзя, при прочих "мокрых" осадках - риск гололёда ниже ICE_TEMP_THRESHOLD.
+    Массивы создаются при первом вызове, чтобы NumPy не загружался при запуске бота
+    """
+    import numpy as np
+
+    lower = np.array([-20, -np.inf, -np.inf, -np.inf, -np.inf, -np.inf])
+    upper = np.array([5, np.inf, np.inf, SNOW_THRESHOLD, WIND_DIRT_THRESHOLD, np.inf])
+    temp_floor = np.array([
+        np.inf if flags & FLAG_RAIN_OR_SNOW else
+        ICE_TEMP_THRESHOLD if flags & FLAG_FREEZING_PRECIPITATION else -np.inf
+        for flags in range(32)
+    ])
+    return lower, upper, temp_floor
+
+
+class LocalClock:
+    """
+    Перевод времени прогноза (UTC, epoch секунды) в местное.
+    Если смещение от UTC одинаково на всем прогнозе (нет перехода на летнее время),
+    часовой пояс запрашивается один раз, дальше к времени прибавляется смещение.
+    Если часовой пояс не определен, используется UTC
+    """
+
+    __slots__ = ('timezone', 'offset')
+
+    def __init__(self, timezone, first_timestamp, last_timestamp):
+        self.timezone = timezone
+        self.offset = 0
+        if timezone is not None:
+            first_offset = datetime.fromtimestamp(int(first_timestamp), timezone).utcoffset()
+            last_offset = datetime.fromtimestamp(int(last_timestamp), timezone).utcoffset()
+            self.offset = int(first_offset.total_seconds()) if first_offset == last_offset else None
+
+    def local_time(self, timestamp) -> time.struct_time:
+        """ Местное время для отметки времени прогноза """
+        if self.offset is not None:
+            return time.gmtime(int(timestamp) + self.offset)
+        return datetime.fromtimestamp(int(timestamp), self.timezone).timetuple()
+
+
+def format_time(local_time, with_date=True) -> str:
+    """ Форматирует местное время как '05 янв 09:00' (или '09:00' без даты) """
+    clock_time = f"{local_time.tm_hour:02d}:{local_time.tm_min:02d}"
+    if not with_date:
+        return clock_time
+    return f"{local_time.tm_mday:02d} {MONTHS_RU[local_time.tm_mon - 1]} {clock_time}"
+
+
+def convert_time(timestamp, clock):
+    """
+    Функция конвертирования времени в строку.
+    timestamp - время интервала прогноза (UTC, epoch секунды),
+    clock - LocalClock прогноза (часовой пояс определяется один раз на прогноз)
+    """
+    return format_time(clock.local_time(timestamp))
+
+
+def collapse_time_intervals(timestamps, clock):
+    """
+    Функция для сворачивания временных интервалов в диапазоны.
+    Соседние интервалы (не дальше 3 часов друг от друга) объединяются,
+    сравнение идет по epoch секундам, в строки переводятся только границы диапазонов
+    """
+    ranges = []
+    for timestamp in map(int, timestamps):
+        if ranges and timestamp - ranges[-1][1] <= SLOT_SECONDS:
+            ranges[-1][1] = timestamp
+        else:
+            ranges.append([timestamp, timestamp])
 
-def format_date(date):
-    """ Функция форматирования даты """
-    locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
-    return date
-
+    collapse_time = []
+    for start, end in ranges:
+        start_time = clock.local_time(start)
+        if start == end:
+            collapse_time.append(format_time(start_time))
+            continue
+        end_time = clock.local_time(end)
+        same_day = (start_time.tm_year, start_time.tm_yday) == (end_time.tm_year, end_time.tm_yday)
+        collapse_time.append(format_time(start_time) + ' - ' + format_time(end_time, with_date=not same_day))
+    return collapse_time
 
-def get_timezone(lat, lon):
-    """ Функция получения часового пояса из широты и долготы """
-    tmezone_finder = TimezoneFinder()
-    timezone_str = tmezone_finder.timezone_at(lng=lon, lat=lat)
-    return timezone_str
 
+@lru_cache(maxsize=8)
+def _decay_weights(count):
+    """ Нормализованные экспоненциально убывающие веса интервалов """
+    import numpy as np
 
-def convert_time(utc_time_str, lat, lon):
-    """ Функция конвертирования времени в строку """
-    # Определение временной зоны
-    timezone_str = get_timezone(lat, lon)
-    if timezone_str:
-        # Время по UTC
-        utc_time = datetime.strptime(utc_time_str, '%Y-%m-%d %H:%M:%S')
-        # Преобразование времени из UTC в местное время с учетом указанной временной зоны
-        timezone = pytz.timezone(timezone_str)
-        local_time = pytz.utc.localize(utc_time).astimezone(timezone)
-        # Локализация даты
-        local_time = format_date(local_time)
-        # Преобразование объекта времени в строку без информации о смещении временной зоны
-        local_time_str = local_time.strftime('%d %b %H:%M')
-        return local_time_str
-    return "Не удалось определить временную зону."
+    weights = np.exp(np.linspace(0, -3, count))
+    weights /= sum(weights)
+    weights.setflags(write=False)
+    return weights
 
 
-def collapse_time_intervals(current_zone_time):
-    """ Функция для сворачивания временных интервалов в диапазоны """
-    collapse_time = []
-    start_time = None
-    prev_time_iter = None
-    for weather_time_iteration in current_zone_time:
-        time_iteration = datetime.strptime(weather_time_iteration, '%d %b %H:%M')
-        if start_time is None:
-            start_time = time_iteration
-            prev_time_iter = time_iteration
-        elif (time_iteration - prev_time_iter).total_seconds() <= 3 * 3600:
-            prev_time_iter = time_iteration
-        else:
-            if start_time == prev_time_iter:
-                collapse_time.append(start_time.strftime('%d %b %H:%M'))
-            else:
-                collapse_time.append(start_time.strftime('%d %b %H:%M') + \
-                                     ' - ' + prev_time_iter.strftime('%H:%M'))
-            start_time = time_iteration
-            prev_time_iter = time_iteration
-    if start_time is not None:
-        if start_time == prev_time_iter:
-            collapse_time.append(start_time.strftime('%d %b %H:%M'))
-        else:
-            collapse_time.append(start_time.strftime('%d %b %H:%M') + \
-                                 ' - ' + prev_time_iter.strftime('%H:%M'))
-    return collapse_time
+def _sequential_sum(values):
+    """
+    Сумма элементов слева направо (cumsum, в отличие от sum, не использует
+    попарное суммирование), чтобы округленные значения в тексте не менялись
+    """
+    return float(values.cumsum()[-1]) if len(values) else 0.0
 
 
 def _is_winter_condition(current_temp, month=None):
@@ -103,96 +158,61 @@ def _get_reagent_advice(current_temp):
     advice = []
 
     # Основные советы для городов с реагентами
-    advice.append(emoji.emojize(":warning: Внимание! На дорогах могут использоваться реагенты."))
+    advice.append(messages.REAGENT_WARNING)
     if current_temp < 0:
-        advice.append(emoji.emojize(":droplet: Частая мойка кузова защищает от коррозии"))
+        advice.append(messages.REAGENT_FROST_ADVICE)
     else:
-        advice.append(emoji.emojize(":thermometer: При плюсовой температуре реагенты смываются дождём"))
-    advice.append(emoji.emojize(f":alarm_clock: Рекомендуем мыть каждые {REAGENT_WASH_INTERVAL} дня"))
+        advice.append(messages.REAGENT_THAW_ADVICE)
+    advice.append(messages.REAGENT_INTERVAL_ADVICE.format(days=REAGENT_WASH_INTERVAL))
 
     return "\n".join(advice)
 
 
-def _analyze_winter_conditions(weather_dict, lat, lon, current_temp):
+def _analyze_winter_conditions(forecast, clock, current_temp):
     """ Анализ зимних условий с учётом реагентов """
     winter_warnings = []
     good_windows = []
 
-    temperatures = []
-    snow_accumulation = 0
-    current_window_start = None
-    window_duration = 0
-
     # Анализируем ближайшие 48 часов (16 интервалов по 3 часа)
-    for _, weather_iteration in enumerate(weather_dict['list'][:16]):
-        temp = weather_iteration['main']['temp'] - 273.15
-        description = weather_iteration['weather'][0]['description'].lower()
-        snow = weather_iteration.get('snow', {}).get('3h', 0)
-        wind_speed = weather_iteration.get('wind', {}).get('speed', 0)
-
-        temperatures.append(temp)
-        snow_accumulation += snow
-
-        # Проверяем условия для гололёда
-        is_freezing_risk = (temp < ICE_TEMP_THRESHOLD and 
-                           ('дождь' in description or 'снег' in description or 
-                            'мокрый' in description) and
-                           temp > -20)
-
-        # Проверяем, можно ли мыть в этом интервале
-        can_wash_now = (
-            temp > -20 and  # Убрали нижний порог -10
-            temp < 5 and  # не слишком тепло для слякоти
-            snow < SNOW_THRESHOLD and
-            'дождь' not in description and
-            'снег' not in description and
-            not is_freezing_risk and
-            wind_speed < WIND_DIRT_THRESHOLD
-        )
-
-        # Отслеживаем "окна" хорошей погоды
-        if can_wash_now:
-            if current_window_start is None:
-                current_window_start = weather_iteration['dt_txt']
-                window_duration = 3
-            else:
-                window_duration += 3
+    rows = forecast.rows[:16]
+    temperatures = rows[:, 0]
+    snow_accumulation = _sequential_sum(rows[:, 3])
+
+    # Проверяем, можно ли мыть в каждом интервале: температура, снег и ветер
+    # в допустимых границах, нет дождя/снега и риска гололёда
+    lower, upper, temp_floor = _winter_wash_bounds()
+    can_wash = ((rows > lower) & (rows < upper)).all(axis=1)
+    can_wash &= temperatures >= temp_floor[forecast.flags[:16]]
+
+    # Отслеживаем "окна" хорошей погоды (минимум 6 часов)
+    temperatures = temperatures.tolist()
+    for window in WASH_WINDOW_PATTERN.finditer(can_wash.view('uint8').tobytes()):
+        start, end = window.span()
+        slots = end - start
+        if end < len(temperatures):
+            # Окно закрыто неподходящим интервалом: диапазон температур
+            # считается по последним интервалам, включая закрывающий
+            window_temps = temperatures[end - slots + 1:end + 1]
         else:
-            if current_window_start and window_duration >= 6:  # минимум 6 часов
-                start_time = convert_time(current_window_start, lat, lon)
-                # Для температурного диапазона нужно сохранять температуры окон
-                window_temps = temperatures[-window_duration//3:]
-                good_windows.append({
-                    'start': start_time,
-                    'duration': window_duration,
-                    'temp_range': f"{min(window_temps):.1f}...{max(window_temps):.1f}°C",
-                })
-            current_window_start = None
-            window_duration = 0
-
-    # Добавляем последнее окно если есть
-    if current_window_start and window_duration >= 6:
-        start_time = convert_time(current_window_start, lat, lon)
-        window_temps = temperatures[-window_duration//3:]
+            window_temps = temperatures[start:end]
         good_windows.append({
-            'start': start_time,
-            'duration': window_duration,
+            'start': convert_time(rows[start, 5], clock),
+            'duration': slots * 3,
             'temp_range': f"{min(window_temps):.1f}...{max(window_temps):.1f}°C",
         })
 
     # Предупреждение о снеге
     if snow_accumulation > 1.0:
-        winter_warnings.append(emoji.emojize(f":snowflake: Ожидается снег: {snow_accumulation:.1f} мм"))
+        winter_warnings.append(messages.SNOW_WARNING.format(snow=snow_accumulation))
 
     # Предупреждение о сильном ветре
-    max_wind = max([w.get('wind', {}).get('speed', 0) for w in weather_dict['list'][:8]])
+    max_wind = plain_number(forecast.wind[:8].max())
     if max_wind > WIND_DIRT_THRESHOLD:
-        winter_warnings.append(emoji.emojize(f":dashing_away: Сильный ветер: до {max_wind} м/с"))
+        winter_warnings.append(messages.WIND_WARNING.format(wind=max_wind))
 
     # Добавляем предупреждение о реагентах если зима
     if current_temp < 5:
-        reagent_warning = emoji.emojize(":triangular_flag: Внимание: на дорогах могут быть реагенты!")
-        winter_warnings.append(reagent_warning)
+        winter_warnings.append(messages.ROAD_REAGENT_WARNING)
 
     return winter_warnings, good_windows
 
@@ -200,59 +220,45 @@ def _analyze_winter_conditions(weather_dict, lat, lon, current_temp):
 def _get_winter_wash_advice(best_window):
     """ Генерирует советы для зимней мойки """
     advice_lines = []
-    advice_lines.append(emoji.emojize(":sunny: Условия подходящие для мойки"))
+    advice_lines.append(messages.WINTER_WASH_OK)
 
     if best_window:
-        advice_lines.append(emoji.emojize(f":alarm_clock: Лучшее время мойки: {best_window['start']} (на {best_window['duration']}ч)"))
-        advice_lines.append(emoji.emojize(f":thermometer: Температура: {best_window['temp_range']}"))
+        advice_lines.append(messages.WINTER_BEST_TIME.format(start=best_window['start'],
+                                                             duration=best_window['duration']))
+        advice_lines.append(messages.WINTER_WINDOW_TEMPERATURE.format(temp_range=best_window['temp_range']))
 
     return "\n".join(advice_lines)
 
 
-def recommend_car_wash(weather_dict, lat, lon):
+def recommend_car_wash(forecast, lat, lon):
     """ Функция принятия решения о целесообразности
-    мытья машины с учётом зимних условий и реагентов """
-    temperature_sum = 0
-    humidity_sum = 0
-    rain_probability = []
-    weather_bad = []
-    snow_accumulation = 0
-    temperatures = []
-
-    logging.info(f"len weather_dict['list'] {len(weather_dict['list'])}")
-
-    for weather_iteration in weather_dict['list']:
-        temp = weather_iteration['main']['temp'] - 273.15
-        temperature_sum += temp
-        temperatures.append(temp)
-        humidity_sum += weather_iteration['main']['humidity']
-
-        # Вероятность дождя
-        rain_prob = weather_iteration.get('rain', {}).get('3h', 0)
-        rain_probability.append(rain_prob if rain_prob is not None else 0)
-
-        # Количество снега
-        snow = weather_iteration.get('snow', {}).get('3h', 0)
-        snow_accumulation += snow
-
-        # Проверяем неблагоприятные условия
-        description = weather_iteration['weather'][0]['description'].lower()
-        if any(keyword in description for keyword in ['дождь', 'снег', 'ливень', 'мокрый снег', 'изморось']):
-            weather_bad.append(weather_iteration['dt_txt'])
-
-    temperature_avg = temperature_sum / len(weather_dict['list'])
-    humidity_avg = humidity_sum / len(weather_dict['list'])
-    current_temp = temperatures[0]
-
-    logging.info(f"temperature_avg, humidity_avg: {temperature_avg}, {humidity_avg}")
-    description_now = weather_dict['list'][0]['weather'][0]['description']
-
-    # Создаем массив весов
-    weights = np.exp(np.linspace(0, -3, len(weather_dict['list'])))
-    # Нормализуем веса
-    weights /= sum(weights)
-    # Вычисляем взвешенную вероятность дождя
-    weighted_rain_probability = np.dot(rain_probability, weights)
+    мытья машины с учётом зимних условий и реагентов.
+    forecast - прогноз ForecastSeries (разбирается один раз при получении) """
+    rows = forecast.rows
+    flags = forecast.flags
+    timestamps = rows[:, 5]
+    count = len(rows)
+
+    logging.debug("len forecast list %s", count)
+
+    # Неблагоприятные интервалы (дождь, снег, ливень, мокрый снег, изморось)
+    weather_bad = timestamps[flags & FLAG_BAD_WEATHER != 0]
+
+    # Суммы по всем столбцам сразу (слева направо, см. _sequential_sum)
+    totals = rows.cumsum(axis=0)[-1].tolist()
+    temperature_avg = totals[0] / count
+    humidity_avg = totals[1] / count
+    snow_accumulation = totals[3]
+    current_temp = float(rows[0, 0])
+
+    logging.debug("temperature_avg, humidity_avg: %s, %s", temperature_avg, humidity_avg)
+    description_now = forecast.descriptions[0]
+
+    # Вычисляем взвешенную вероятность дождя (веса убывают экспоненциально)
+    weighted_rain_probability = forecast.rain_3h.dot(_decay_weights(count))
+
+    # Часовой пояс определяется один раз и используется для всех отметок времени
+    clock = LocalClock(resolve_timezone(lat, lon), timestamps[0], timestamps[-1])
 
     # Определяем, зимний ли режим
     is_winter = _is_winter_condition(current_temp)
@@ -260,34 +266,23 @@ def recommend_car_wash(weather_dict, lat, lon):
     # ЗИМНЯЯ ЛОГИКА
     if is_winter:
         winter_warnings, good_windows = _analyze_winter_conditions(
-            weather_dict, lat, lon, current_temp
+            forecast, clock, current_temp
         )
 
         # Проверяем ближайшие 24 часа на осадки (зимняя версия)
-        has_precipitation_next_24h = False
-        precip_times = []
-
-        for weather_iteration in weather_dict['list'][:8]:
-            description = weather_iteration['weather'][0]['description'].lower()
-            if any(keyword in description for keyword in ['дождь', 'снег', 'ливень', 'мокрый снег']):
-                has_precipitation_next_24h = True
-                precip_times.append(weather_iteration['dt_txt'])
-
-        if has_precipitation_next_24h:
-            current_zone_time = [convert_time(t, lat, lon) for t in precip_times]
-            collapsed_intervals = collapse_time_intervals(current_zone_time)
+        precip_times = timestamps[:8][flags[:8] & FLAG_PRECIPITATION != 0]
+
+        if len(precip_times):
+            collapsed_intervals = collapse_time_intervals(precip_times, clock)
             collapsed_intervals_str = '\n'.join(collapsed_intervals)
 
             winter_info = ""
             if winter_warnings:
                 winter_info = "\n" + "\n".join(winter_warnings[:3])
-            return emoji.emojize(f":snowflake: Зимний режим\n"
-                               f"Лучше отложить мытьё машины.\n\n"
-                               f":cloud_with_snow: Осадки в ближайшие часы:\n"
-                               f"{collapsed_intervals_str}"
-                               f"{winter_info}\n\n"
-                               f":thermometer: Средняя температура: {temperature_avg:.1f}°C\n"
-                               f":snowflake: Накопление снега: {snow_accumulation:.1f} мм")
+            return messages.WINTER_PRECIPITATION.format(intervals=collapsed_intervals_str,
+                                                        warnings=winter_info,
+                                                        temperature_avg=temperature_avg,
+                                                        snow=snow_accumulation)
 
         # Если есть хорошие окна для мойки зимой
         if good_windows:
@@ -298,52 +293,42 @@ def recommend_car_wash(weather_dict, lat, lon):
             if winter_warnings:
                 winter_info = "\n" + "\n".join(winter_warnings[:2])
 
-            return emoji.emojize(f"{winter_advice}"
-                               f"{winter_info}\n\n"
-                               f":sun_behind_cloud: Погода сейчас: {description_now}\n"
-                               f":cloud_with_rain: Вероятность осадков: {weighted_rain_probability:.1f}%")
+            return messages.WINTER_WINDOW.format(advice=winter_advice,
+                                                 warnings=winter_info,
+                                                 description=description_now,
+                                                 rain_probability=weighted_rain_probability)
 
         # Если зима, но нет хороших окон
         winter_info = ""
         if winter_warnings:
-            winter_info = "\n" + emoji.emojize(":snowflake: Зимние условия:") + "\n" + "\n".join(winter_warnings[:3])
-        return emoji.emojize(f":snowflake: Зимний режим\n"
-                           f"Сегодня не лучшее время для мойки.\n"
-                           f"{winter_info}\n\n"
-                           f":thermometer: Средняя температура: {temperature_avg:.1f}°C\n"
-                           f":snowflake: Накопление снега: {snow_accumulation:.1f} мм\n"
-                           f":sweat_drops: Влажность: {humidity_avg:.0f}%")
+            winter_info = "\n" + messages.WINTER_CONDITIONS + "\n" + "\n".join(winter_warnings[:3])
+        return messages.WINTER_NO_WINDOW.format(warnings=winter_info,
+                                                temperature_avg=temperature_avg,
+                                                snow=snow_accumulation,
+                                                humidity=humidity_avg)
 
     # СТАНДАРТНАЯ ЛОГИКА (как было, но с улучшениями)
     # Проверка на наличие дождя в ближайшие часы
     # ближайшие 24 часа (8 * 3 часа)
-    for weather_iteration in weather_dict['list'][:8]:
-        if 'дождь' in weather_iteration['weather'][0]['description'].lower():
-            current_zone_time = []
-            for weather_time_iteration in weather_bad:
-                current_zone_time.append(convert_time(weather_time_iteration, lat, lon))
-            collapsed_intervals = collapse_time_intervals(current_zone_time)
-            collapsed_intervals_str = '\n'.join(collapsed_intervals)
+    if (flags[:8] & FLAG_RAIN).any():
+        collapsed_intervals = collapse_time_intervals(weather_bad, clock)
+        collapsed_intervals_str = '\n'.join(collapsed_intervals)
 
-            # Добавляем информацию о температуре для зимнего контекста
-            temp_info = ""
-            if current_temp < 5:
-                temp_info = emoji.emojize(f"\n:thermometer: Температура низкая: {current_temp:.1f}°C")
+        # Добавляем информацию о температуре для зимнего контекста
+        temp_info = ""
+        if current_temp < 5:
+            temp_info = messages.LOW_TEMPERATURE.format(temperature=current_temp)
 
-            return emoji.emojize(f":cloud_with_rain: Лучше отложить мытьё машины на другой день.\n\n"
-                               f"Краткая погодная сводка:\n"
-                               f":cloud_with_rain: Взвешенная вероятность дождя: "
-                               f"{weighted_rain_probability:.2f}%\n"
-                               f":alarm_clock: Дождь в ближайшие часы:\n"
-                               f"{collapsed_intervals_str}"
-                               f"{temp_info}")
+        return messages.RAIN_SOON.format(rain_probability=weighted_rain_probability,
+                                         intervals=collapsed_intervals_str,
+                                         low_temperature=temp_info)
 
     # Улучшенное условие с учётом температуры
     is_safe_temp = not (-2 < temperature_avg < 2)  # Избегаем температуры около 0°C
 
     # Учитываем ветер (сильный ветер = быстрое загрязнение)
-    wind_speed = weather_dict['list'][0].get('wind', {}).get('speed', 0)
-    wind_emoji = emoji.emojize(" :dashing_away:") if wind_speed > 6 else ""
+    wind_speed = rows[0, 4]
+    wind_emoji = messages.WIND_MARK if wind_speed > 6 else ""
 
     if (weighted_rain_probability <= TEMPERATURE_TRESHOLD and 
         humidity_avg < 80 and 
@@ -352,49 +337,42 @@ def recommend_car_wash(weather_dict, lat, lon):
         # Дополнительные советы в зависимости от температуры
         temp_advice = ""
         if current_temp < 5:
-            temp_advice = emoji.emojize("\n:warning: Температура низкая - используйте горячую воду и просушите замки и уплотнители!")
+            temp_advice = messages.COLD_WASH_ADVICE
 
-        return emoji.emojize(f":soap: Сегодня можно мыть машину.{wind_emoji}\n"
-                           f":sun_behind_cloud: Погода: {description_now}\n"
-                           f":thermometer: Температура: {current_temp:.1f}°C"
-                           f"{temp_advice}")
+        return messages.WASH_OK.format(wind=wind_emoji,
+                                       description=description_now,
+                                       temperature=current_temp,
+                                       advice=temp_advice)
 
     # Если не рекомендуется мыть
-    current_zone_time = []
-    for weather_time_iteration in weather_bad:
-        current_zone_time.append(convert_time(weather_time_iteration, lat, lon))
-    collapsed_intervals = collapse_time_intervals(current_zone_time)
+    collapsed_intervals = collapse_time_intervals(weather_bad, clock)
     collapsed_intervals_str = '\n'.join(collapsed_intervals)
 
     # Анализируем причину отказа
     reasons = []
     if weighted_rain_probability > TEMPERATURE_TRESHOLD:
-        reasons.append(emoji.emojize(f":cloud_with_rain: высокая вероятность осадков ({weighted_rain_probability:.1f}%)"))
+        reasons.append(messages.RAIN_REASON.format(rain_probability=weighted_rain_probability))
     if humidity_avg >= 80:
-        reasons.append(emoji.emojize(f":sweat_drops: высокая влажность ({humidity_avg:.0f}%)"))
+        reasons.append(messages.HUMIDITY_REASON.format(humidity=humidity_avg))
     if not is_safe_temp:
-        reasons.append(emoji.emojize(f":thermometer: температура около 0°C ({temperature_avg:.1f}°C)"))
+        reasons.append(messages.ZERO_TEMPERATURE_REASON.format(temperature=temperature_avg))
 
     reason_text = ""
     if reasons:
-        reason_text = "\n" + emoji.emojize(":exclamation: Причины:") + "\n" + "\n".join(reasons)
+        reason_text = "\n" + messages.REASONS + "\n" + "\n".join(reasons)
 
     # Если холодно, но не зима по определению, все равно предупреждаем о возможных реагентах
     reagent_note = ""
     if current_temp < 10:
-        reagent_note = emoji.emojize("\n\n:triangular_flag: Примечание: при температуре ниже 10°C на дорогах могут быть реагенты")
+        reagent_note = messages.REAGENT_NOTE
 
-    return emoji.emojize(f":cloud_with_rain: Лучше отложить мытьё машины на другой день.\n\n"
-                       f"Краткая погодная сводка:\n"
-                       f":cloud_with_rain: Взвешенная вероятность дождя: "
-                       f"{weighted_rain_probability:.2f}%\n"
-                       f":alarm_clock: Осадки в ближайшие дни:\n"
-                       f"{collapsed_intervals_str}\n\n"
-                       f":thermometer: Средняя температура: {round(temperature_avg, 1)}°C\n"
-                       f":thermometer: Температура сейчас: {current_temp:.1f}°C\n"
-                       f":sweat_drops: Средняя влажность: {humidity_avg:.0f}%"
-                       f"{reason_text}"
-                       f"{reagent_note}")
+    return messages.DONT_WASH.format(rain_probability=weighted_rain_probability,
+                                     intervals=collapsed_intervals_str,
+                                     temperature_avg=round(temperature_avg, 1),
+                                     temperature=current_temp,
+                                     humidity=humidity_avg,
+                                     reasons=reason_text,
+                                     reagent_note=reagent_note)
 
 
 # Дополнительная функция для определения сезона
@@ -406,20 +384,20 @@ def get_season_emoji(lat, month=None):
     # Для северного полушария
     if lat >= 0:
         if month in [12, 1, 2]:
-            return emoji.emojize(":snowflake:")
+            return messages.SEASON_EMOJI['winter']
         elif month in [3, 4, 5]:
-            return emoji.emojize(":cherry_blossom:")
+            return messages.SEASON_EMOJI['spring']
         elif month in [6, 7, 8]:
-            return emoji.emojize(":sun_with_face:")
+            return messages.SEASON_EMOJI['summer']
         else:
-            return emoji.emojize(":fallen_leaf:")
+            return messages.SEASON_EMOJI['autumn']
     # Для южного полушария
     else:
         if month in [12, 1, 2]:
-            return emoji.emojize(":sun_with_face:")
+            return messages.SEASON_EMOJI['summer']
         elif month in [3, 4, 5]:
-            return emoji.emojize(":fallen_leaf:")
+            return messages.SEASON_EMOJI['autumn']
         elif month in [6, 7, 8]:
-            return emoji.emojize(":snowflake:")
+            return messages.SEASON_EMOJI['winter']
         else:
-            return emoji.emojize(":cherry_blossom:")
+            return messages.SEASON_EMOJI['spring']
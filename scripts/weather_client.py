@@ -0,0 +1,97 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Асинхронный клиент OpenWeather.
+Одна aiohttp-сессия с keep-alive переиспользуется для всех запросов,
+поэтому ожидание ответа OpenWeather не блокирует обработку других сообщений.
+Обработчики получают прогноз через weather_providers, а не напрямую.
+"""
+
+import asyncio
+import logging
+
+import aiohttp
+import metrics
+from settings import conf, section_settings
+
+FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+
+# Значения по умолчанию для секции weather в config.yml
+WEATHER_DEFAULTS = {
+    'provider': 'openweather',  # источник прогноза (см. weather_providers)
+    'record_dir': '',           # папка для записи ответов OpenWeather, пусто - не записывать
+    'replay_dir': 'weather_replay',  # папка с записанными ответами для provider: replay
+    'synthetic_seed': 1,        # seed синтетического прогноза для provider: synthetic
+    'url': FORECAST_URL,       # адрес API прогноза (для нагрузочного теста - локальная замена)
+    'timeout': 10,             # общий таймаут запроса, секунды
+    'connect_timeout': 3,      # таймаут установки соединения, секунды
+    'connections_limit': 100,  # максимум одновременных соединений
+    'keepalive_timeout': 60,   # сколько держать простаивающее соединение, секунды
+}
+
+_session = None
+_forecast_url = FORECAST_URL
+
+
+class WeatherApiError(Exception):
+    """ Ошибка получения прогноза от OpenWeather """
+
+
+def weather_settings() -> dict:
+    """ Настройки секции weather с учетом значений по умолчанию """
+    return section_settings(conf.get('weather'), WEATHER_DEFAULTS, 'weather')
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Возвращает общую сессию, при первом вызове создает ее.
+    Должна вызываться внутри работающего event loop
+    """
+    global _session, _forecast_url
+    if _session is None or _session.closed:
+        settings = weather_settings()
+        _forecast_url = settings['url']
+        connector = aiohttp.TCPConnector(limit=settings['connections_limit'],
+                                         keepalive_timeout=settings['keepalive_timeout'],
+                                         ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=settings['timeout'],
+                                        sock_connect=settings['connect_timeout'])
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+    return _session
+
+
+async def close_session() -> None:
+    """ Закрывает общую сессию (вызывается при остановке бота) """
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_forecast(lat, lon) -> dict:
+    """
+    Запрашивает прогноз на 5 дней с шагом 3 часа.
+    Возвращает словарь с ответом OpenWeather, при ошибке выбрасывает WeatherApiError
+    """
+    params = {
+        'lang': 'ru',
+        'lat': str(lat),
+        'lon': str(lon),
+        'appid': conf['open_weather_token'],
+    }
+    try:
+        async with get_session().get(_forecast_url, params=params) as response:
+            weather_dict = await response.json(content_type=None)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as error:
+        metrics.WEATHER_API_ERRORS_TOTAL.inc()
+        logging.error(f"Error getting forecast from OpenWeather: {error!r}")
+        raise WeatherApiError(str(error) or repr(error)) from error
+    if response.status != 200:
+        metrics.WEATHER_API_ERRORS_TOTAL.inc()
+        message = weather_dict.get('message') if isinstance(weather_dict, dict) else None
+        raise WeatherApiError(f"OpenWeather returned {response.status}: {message}")
+    return weather_dict
@@ -0,0 +1,280 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Источники прогноза погоды.
+Источник возвращает разобранный прогноз ForecastSeries, обработчики и рассылка не знают,
+откуда он взят. Источник задается параметром weather.provider в config.yml:
+openweather - запрос к OpenWeather (weather.record_dir - заодно сохранять ответы в файлы),
+replay - ответы, записанные в файлы (weather.replay_dir), без сети,
+synthetic - прогноз, сгенерированный в памяти по координатам, без сети.
+Записанные и синтетические прогнозы - ответы в формате OpenWeather, поэтому
+разбираются так же, как настоящие.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+from abc import ABC, abstractmethod
+
+import metrics
+import weather_client
+from forecast_series import ForecastSeries
+from settings import SettingsError
+from weather_client import WeatherApiError
+
+PROVIDERS = ('openweather', 'replay', 'synthetic')
+KELVIN_OFFSET = 273.15
+# Интервалов в синтетическом прогнозе (5 дней по 3 часа, как у OpenWeather)
+SYNTHETIC_SLOTS = 40
+SLOT_SECONDS = 3 * 3600
+
+_provider = None
+
+
+def payload_file_name(lat, lon) -> str:
+    """ Имя файла записанного ответа для точки: <широта>_<долгота>.json """
+    return f"{float(lat)}_{float(lon)}.json"
+
+
+def save_payload(directory: str, lat, lon, payload: dict) -> str:
+    """ Записывает ответ OpenWeather в папку (для ReplayProvider), возвращает путь к файлу """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, payload_file_name(lat, lon))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(payload, file, ensure_ascii=False)
+    os.replace(temp_path, path)
+    return path
+
+
+class WeatherProvider(ABC):
+    """
+    Источник прогноза. Наследники реализуют fetch_payload - ответ в формате OpenWeather,
+    при ошибке выбрасывают WeatherApiError
+    """
+
+    name = ''
+    # Параметры config.yml, без которых источник не работает
+    required_settings = ()
+
+    @abstractmethod
+    async def fetch_payload(self, lat, lon) -> dict:
+        """ Ответ в формате OpenWeather для точки """
+
+    async def get_forecast(self, lat, lon) -> ForecastSeries:
+        """
+        Прогноз для точки, разобранный в ForecastSeries.
+        Ответ неожиданного формата - тоже WeatherApiError
+        """
+        with metrics.phase('weather_fetch'):
+            payload = await self.fetch_payload(lat, lon)
+        try:
+            return ForecastSeries.from_payload(payload)
+        except (KeyError, TypeError, ValueError, IndexError) as error:
+            metrics.WEATHER_API_ERRORS_TOTAL.inc()
+            raise WeatherApiError(f"Unexpected {self.name} response for {lat}, {lon}: {error!r}") from error
+
+    async def close(self) -> None:
+        """ Освобождает ресурсы (вызывается при остановке бота) """
+
+
+class OpenWeatherProvider(WeatherProvider):
+    """
+    Прогноз OpenWeather через общую сессию weather_client.
+    Если задан record_dir - каждый ответ сохраняется в файл для ReplayProvider
+    """
+
+    name = 'openweather'
+    required_settings = ('open_weather_token',)
+
+    def __init__(self, record_dir: str = None):
+        self.record_dir = record_dir
+
+    async def fetch_payload(self, lat, lon) -> dict:
+        payload = await weather_client.get_forecast(lat, lon)
+        if self.record_dir:
+            try:
+                await asyncio.to_thread(save_payload, self.record_dir, lat, lon, payload)
+            except OSError as error:
+                logging.error(f"Can not record forecast for {lat}, {lon}: {error}")
+        return payload
+
+    async def close(self) -> None:
+        await weather_client.close_session()
+
+
+class OfflineProvider(WeatherProvider):
+    """
+    Источник без сети. Может имитировать OpenWeather: задержку ответа (latency, секунды)
+    и долю ошибок (error_rate, 0-1; последовательность ошибок задает seed)
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, seed: int = 1):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self._errors = random.Random(seed)
+
+    async def fetch_payload(self, lat, lon) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._errors.random() < self.error_rate:
+            metrics.WEATHER_API_ERRORS_TOTAL.inc()
+            raise WeatherApiError(f"Simulated {self.name} error")
+        return self.payload(lat, lon)
+
+    @abstractmethod
+    def payload(self, lat, lon) -> dict:
+        """ Ответ в формате OpenWeather для точки (без задержки и ошибок) """
+
+
+class ReplayProvider(OfflineProvider):
+    """
+    Ответы, записанные в папку (OpenWeatherProvider с record_dir или save_payload).
+    Для точки без записи берется ответ ближайшей записанной точки
+    """
+
+    name = 'replay'
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.payloads = {}
+        for file_name in sorted(os.listdir(directory) if os.path.isdir(directory) else ()):
+            stem, extension = os.path.splitext(file_name)
+            if extension != '.json':
+                continue
+            try:
+                lat, lon = (float(value) for value in stem.rsplit('_', 1))
+                with open(os.path.join(directory, file_name), encoding='utf-8') as file:
+                    self.payloads[(lat, lon)] = json.load(file)
+            except (ValueError, OSError) as error:
+                logging.warning(f"Skipping recorded forecast {file_name}: {error}")
+        if not self.payloads:
+            raise SettingsError(f"No recorded forecasts in {directory}")
+        logging.info(f"Loaded {len(self.payloads)} recorded forecasts from {directory}")
+
+    def payload(self, lat, lon) -> dict:
+        payload = self.payloads.get((float(lat), float(lon)))
+        if payload is None:
+            nearest = min(self.payloads, key=lambda point: (point[0] - lat) ** 2 + (point[1] - lon) ** 2)
+            payload = self.payloads[nearest]
+        return payload
+
+
+def forecast_item(timestamp: int, temp: float, humidity: int, description: str, wind: float,
+                  rain: float = 0, snow: float = 0) -> dict:
+    """ Интервал прогноза в формате OpenWeather: температура в °C, ветер в м/с, осадки в мм за 3 часа """
+    item = {
+        'dt': timestamp,
+        'main': {'temp': round(temp + KELVIN_OFFSET, 2), 'humidity': humidity},
+        'weather': [{'description': description}],
+        'wind': {'speed': round(wind, 2)},
+        'dt_txt': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(timestamp)),
+    }
+    if rain:
+        item['rain'] = {'3h': round(rain, 2)}
+    if snow:
+        item['snow'] = {'3h': round(snow, 2)}
+    return item
+
+
+def forecast_payload(items: list, city_name: str) -> dict:
+    """ Ответ OpenWeather (/data/2.5/forecast) из интервалов forecast_item """
+    return {'cod': '200', 'cnt': len(items), 'list': items, 'city': {'name': city_name}}
+
+
+def synthetic_payload(lat, lon, seed: int = 1, start: int = None, slots: int = SYNTHETIC_SLOTS) -> dict:
+    """
+    Правдоподобный ответ OpenWeather для точки: температура зависит от широты и сезона,
+    осадки и ветер - случайные. Один и тот же (lat, lon, seed, start) дает один и тот же прогноз.
+    start - время первого интервала (Unix, UTC), по умолчанию начало текущего интервала
+    """
+    if start is None:
+        start = int(time.time()) // SLOT_SECONDS * SLOT_SECONDS
+    rnd = random.Random(f"{seed}:{float(lat):.2f}:{float(lon):.2f}:{start}")
+    month = time.gmtime(start).tm_mon
+    # Сезон: 1 - середина лета, -1 - середина зимы (в южном полушарии наоборот)
+    season = math.cos(2 * math.pi * (month - 7) / 12) * (1 if lat >= 0 else -1)
+    mean_temp = 27 - 0.4 * abs(lat) + 12 * season * min(abs(lat), 60) / 60 + rnd.uniform(-3, 3)
+    wet_probability = rnd.choice([0, 0.1, 0.3, 0.6])
+    wind_base = rnd.uniform(1, 7)
+    items = []
+    for index in range(slots):
+        timestamp = start + index * SLOT_SECONDS
+        hour = (timestamp // 3600 + round(lon / 15)) % 24
+        temp = mean_temp - 4 * math.cos(2 * math.pi * (hour - 3) / 24) + rnd.uniform(-1, 1)
+        wet = rnd.random() < wet_probability
+        humidity = rnd.randint(60, 100) if wet else rnd.randint(30, 80)
+        rain = snow = 0
+        if wet and temp < 0:
+            description, snow = rnd.choice(['небольшой снег', 'снег']), rnd.uniform(0.1, 2)
+        elif wet:
+            description, rain = rnd.choice(['небольшой дождь', 'дождь', 'ливень']), rnd.uniform(0.2, 5)
+        else:
+            description = rnd.choice(['ясно', 'небольшая облачность', 'переменная облачность', 'пасмурно'])
+        wind = max(0.0, wind_base + rnd.uniform(-2, 4))
+        items.append(forecast_item(timestamp, temp, humidity, description, wind, rain, snow))
+    return forecast_payload(items, f"{float(lat):.2f}, {float(lon):.2f}")
+
+
+class SyntheticProvider(OfflineProvider):
+    """
+    Прогноз, сгенерированный в памяти.
+    payload_factory(lat, lon) -> ответ OpenWeather; по умолчанию synthetic_payload с seed
+    """
+
+    name = 'synthetic'
+
+    def __init__(self, payload_factory=None, **kwargs):
+        super().__init__(**kwargs)
+        self.payload_factory = payload_factory or (lambda lat, lon: synthetic_payload(lat, lon, self.seed))
+
+    def payload(self, lat, lon) -> dict:
+        return self.payload_factory(lat, lon)
+
+
+def create_provider(settings: dict) -> WeatherProvider:
+    """ Создает источник по настройкам секции weather """
+    provider = settings['provider']
+    if provider == 'openweather':
+        return OpenWeatherProvider(record_dir=settings['record_dir'] or None)
+    if provider == 'replay':
+        return ReplayProvider(settings['replay_dir'])
+    if provider == 'synthetic':
+        return SyntheticProvider(seed=settings['synthetic_seed'])
+    raise SettingsError(f"weather.provider must be one of {', '.join(PROVIDERS)}, got {provider!r}")
+
+
+def get_provider() -> WeatherProvider:
+    """ Текущий источник, при первом вызове создается по config.yml """
+    global _provider
+    if _provider is None:
+        _provider = create_provider(weather_client.weather_settings())
+        logging.info(f"Weather provider: {_provider.name}")
+    return _provider
+
+
+def install(provider: WeatherProvider) -> None:
+    """ Подменяет источник (нагрузочный тест, бенчмарки) """
+    global _provider
+    _provider = provider
+
+
+async def get_forecast(lat, lon) -> ForecastSeries:
+    """ Прогноз для точки из текущего источника """
+    return await get_provider().get_forecast(lat, lon)
+
+
+async def close() -> None:
+    """ Закрывает текущий источник (вызывается при остановке бота) """
+    if _provider is not None:
+        await _provider.close()
@@ -0,0 +1,146 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Режим webhook: встроенный сервер aiohttp принимает обновления от Telegram
+(обычно за локальным reverse proxy, который терминирует TLS).
+Запросы проверяются по секретному токену, число одновременно обрабатываемых
+обновлений ограничено, при остановке сервер дожидается обработки принятых обновлений.
+"""
+
+import asyncio
+import logging
+import secrets
+import signal
+from contextlib import suppress
+
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from settings import section_settings
+
+# Значения по умолчанию для секции webhook в config.yml
+WEBHOOK_DEFAULTS = {
+    'url': None,                    # публичный адрес webhook (https://.../path)
+    'path': '/telegram/webhook',    # путь на локальном сервере
+    'host': '127.0.0.1',            # адрес локального сервера
+    'port': 8080,
+    'secret_token': None,           # если не задан - генерируется при запуске
+    'max_connections': 40,          # одновременных соединений от Telegram (1-100)
+    'max_concurrent_updates': 64,   # одновременно обрабатываемых обновлений
+    'max_pending_updates': 1024,    # принятых, но не обработанных обновлений
+    'shutdown_timeout': 30,         # ожидание обработки принятых обновлений при остановке, секунды
+}
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик webhook с ограниченным пулом обработки.
+    Telegram сразу получает ответ 200, обновление обрабатывается в фоне,
+    одновременно - не больше max_concurrent_updates. Если принятых обновлений
+    больше max_pending_updates, отвечает 503 и Telegram повторит запрос позже.
+    Если задан route, обновление не обрабатывается, а передается в route
+    (многопроцессный режим, см. supervisor.py)
+    """
+
+    def __init__(self, dispatcher, bot, secret_token, max_concurrent_updates,
+                 max_pending_updates, shutdown_timeout, route=None, **data):
+        super().__init__(dispatcher=dispatcher, bot=bot, handle_in_background=True,
+                         secret_token=secret_token, **data)
+        self.route = route
+        self.max_pending_updates = max_pending_updates
+        self.shutdown_timeout = shutdown_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent_updates)
+        self.rejected = 0
+
+    async def _background_feed_update(self, bot, update) -> None:
+        async with self._semaphore:
+            await super()._background_feed_update(bot, update)
+
+    async def _handle_request_background(self, bot, request):
+        if self.route is not None:
+            await self.route(await request.json(loads=bot.session.json_loads))
+            return web.json_response({}, dumps=bot.session.json_dumps)
+        if len(self._background_feed_update_tasks) >= self.max_pending_updates:
+            self.rejected += 1
+            logging.warning(f"Webhook update rejected: {self.max_pending_updates} updates pending")
+            return web.Response(status=503, text='Too many pending updates')
+        return await super()._handle_request_background(bot, request)
+
+    async def close(self) -> None:
+        """ Дожидается обработки принятых обновлений и закрывает сессию бота """
+        tasks = set(self._background_feed_update_tasks)
+        if tasks:
+            logging.info(f"Waiting for {len(tasks)} webhook updates to finish")
+            _, unfinished = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+            for task in unfinished:
+                task.cancel()
+            if unfinished:
+                logging.error(f"{len(unfinished)} webhook updates cancelled on shutdown")
+                await asyncio.wait(unfinished)
+        await super().close()
+
+
+def webhook_settings(webhook_conf: dict) -> dict:
+    """ Настройки webhook из config.yml поверх значений по умолчанию """
+    settings = section_settings(webhook_conf, WEBHOOK_DEFAULTS, 'webhook')
+    if not settings['url']:
+        raise ValueError('webhook.url must be set in config.yml for webhook mode')
+    if not settings['secret_token']:
+        settings['secret_token'] = secrets.token_urlsafe(32)
+    return settings
+
+
+async def run_webhook(dp, bot, webhook_conf: dict, route=None) -> None:
+    """
+    Запускает сервер webhook и регистрирует его в Telegram.
+    Работает до сигнала SIGINT/SIGTERM, затем корректно останавливается.
+    route - функция передачи обновления в процесс-обработчик (многопроцессный режим)
+    """
+    settings = webhook_settings(webhook_conf)
+
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=settings['secret_token'],
+        max_concurrent_updates=settings['max_concurrent_updates'],
+        max_pending_updates=settings['max_pending_updates'],
+        shutdown_timeout=settings['shutdown_timeout'],
+        route=route,
+    )
+    handler.register(app, path=settings['path'])
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings['host'], port=settings['port'])
+    await site.start()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await bot.set_webhook(
+            url=settings['url'],
+            secret_token=settings['secret_token'],
+            max_connections=settings['max_connections'],
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info(f"Webhook server listening on {settings['host']}:{settings['port']}"
+                     f"{settings['path']}")
+        await stop_event.wait()
+    finally:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            with suppress(NotImplementedError):
+                loop.remove_signal_handler(sig)
+        # Webhook в Telegram не удаляется: пока бот перезапускается,
+        # Telegram копит обновления и доставит их после старта
+        logging.info('Webhook server stopping')
+        await runner.cleanup()
@@ -0,0 +1,206 @@
+"""
+Wash your car - телеграм бот, который по запросу анализирует погоду (используется
+OpenWeather) и дает совет, целесообразно ли сегодня помыть машину.
+
+Бот можно найти по адресу:
+https://t.me/worth_wash_car_bot
+
+Отложенная (write-behind) запись в БД.
+Запросы на запись (прогнозы, оценки) складываются в очередь и записываются
+пачками - по достижении batch_size запросов или через flush_interval секунд.
+Пачка записывается одной транзакцией в порядке постановки в очередь,
+идущие подряд запросы с одинаковым SQL - одним executemany.
+"""
+
+import asyncio
+import logging
+import time
+from contextlib import suppress
+from itertools import groupby
+
+import database_module
+import metrics
+from settings import conf, section_settings
+
+# Значения по умолчанию для секции write_behind в config.yml
+WRITE_BEHIND_DEFAULTS = {
+    'batch_size': 100,      # максимум запросов в одной пачке
+    'flush_interval': 0.5,  # максимальная задержка записи, секунды
+    'max_pending': 10000,   # максимум запросов в очереди (дальше добавление ждет)
+    'max_retries': 5,       # повторы пачки при временных ошибках БД
+    'retry_delay': 0.5,     # пауза перед первым повтором, секунды (дальше удваивается)
+    'drain_timeout': 30,    # ожидание записи очереди при остановке бота, секунды
+}
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи в БД.
+    Запросы выполняются в порядке постановки в очередь: оценка записывается после
+    прогноза, на который она ссылается (внешний ключ feedback.forecast_id)
+    """
+
+    def __init__(self, batch_size: int = WRITE_BEHIND_DEFAULTS['batch_size'],
+                 flush_interval: float = WRITE_BEHIND_DEFAULTS['flush_interval'],
+                 max_pending: int = WRITE_BEHIND_DEFAULTS['max_pending'],
+                 max_retries: int = WRITE_BEHIND_DEFAULTS['max_retries'],
+                 retry_delay: float = WRITE_BEHIND_DEFAULTS['retry_delay'],
+                 drain_timeout: float = WRITE_BEHIND_DEFAULTS['drain_timeout']):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.drain_timeout = drain_timeout
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._worker = None
+        # Данные еще не записанных запросов (по ключу, переданному в put)
+        self.pending = {}
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        # False, пока последняя пачка потеряна из-за недоступности БД
+        self.healthy = True
+
+    def start(self) -> None:
+        """ Запускает фоновую задачу записи """
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def put(self, statement: str, args: tuple, key=None, value=None, on_flush=None) -> None:
+        """
+        Добавляет запрос в очередь. Если очередь заполнена - ждет (backpressure).
+        key/value - данные запроса, доступные через pending, пока он не записан;
+        on_flush - функция без аргументов, вызывается после записи запроса
+        (если запрос потерян - не вызывается)
+        """
+        if key is not None:
+            self.pending[key] = value
+        await self._queue.put((statement, args, key, on_flush))
+
+    def put_nowait(self, statement: str, args: tuple, key=None, value=None, on_flush=None) -> bool:
+        """ Как put, но без ожидания: если очередь заполнена, возвращает False """
+        try:
+            self._queue.put_nowait((statement, args, key, on_flush))
+        except asyncio.QueueFull:
+            return False
+        if key is not None:
+            self.pending[key] = value
+        return True
+
+    async def _run(self) -> None:
+        """ Собирает пачки из очереди и записывает их """
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            written = ()
+            try:
+                written = await self._flush(batch)
+            except Exception as error:
+                self.failed += len(batch)
+                logging.error(f"Write-behind batch of {len(batch)} writes lost: {error}")
+            finally:
+                for index, (_, _, key, on_flush) in enumerate(batch):
+                    if key is not None:
+                        self.pending.pop(key, None)
+                    if on_flush is not None and index in written:
+                        on_flush()
+                    self._queue.task_done()
+
+    async def _flush(self, batch):
+        """
+        Записывает пачку одной транзакцией, возвращает номера записанных запросов.
+        При временных ошибках повторяет запись, при остальных ошибках БД
+        записывает запросы по одному, чтобы потерять только ошибочные
+        """
+        # Группируются только идущие подряд запросы, чтобы не менять порядок записи
+        groups = [(statement, [args for _, args, _, _ in writes])
+                  for statement, writes in groupby(batch, key=lambda write: write[0])]
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.phase('db_write_batch'):
+                    async with database_module.connection() as conn:
+                        async with conn.transaction():
+                            for statement, rows in groups:
+                                await conn.executemany(statement, rows)
+                self.written += len(batch)
+                self.batches += 1
+                self.healthy = True
+                logging.debug(f"Write-behind batch written: {len(batch)} writes")
+                return range(len(batch))
+            except database_module.TRANSIENT_ERRORS as error:
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    self.healthy = False
+                    logging.error(f"Write-behind batch of {len(batch)} writes lost "
+                                  f"after {attempt + 1} attempts: {error}")
+                    return ()
+                delay = self.retry_delay * 2 ** attempt
+                logging.warning(f"Write-behind batch failed, retry in {delay} s: {error}")
+                await asyncio.sleep(delay)
+            except database_module.DB_ERRORS as error:
+                logging.error(f"Write-behind batch failed, writing one by one: {error}")
+                return await self._flush_one_by_one(batch)
+
+    async def _flush_one_by_one(self, batch) -> set:
+        """ Записывает запросы пачки по одному (каждый в своей транзакции), возвращает номера записанных """
+        written = set()
+        for index, (statement, args, _, _) in enumerate(batch):
+            try:
+                async with database_module.connection() as conn:
+                    await conn.execute(statement, *args)
+                self.written += 1
+                written.add(index)
+            except database_module.DB_ERRORS as error:
+                self.failed += 1
+                logging.error(f"Write-behind write lost: {error}; args: {args}")
+        return written
+
+    async def drain(self) -> None:
+        """ Записывает все накопленные запросы и останавливает фоновую задачу """
+        if not self._queue.empty():
+            self.start()
+        try:
+            await asyncio.wait_for(self._queue.join(), self.drain_timeout)
+        except asyncio.TimeoutError:
+            self.failed += self._queue.qsize()
+            logging.error(f"Write-behind drain timed out, {self._queue.qsize()} writes lost")
+        if self._worker is not None:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+        logging.info(f"Write-behind queue drained: {self.stats()}")
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def stats(self) -> dict:
+        """ Счетчики записанных и потерянных запросов """
+        return {
+            'queued': self._queue.qsize(),
+            'written': self.written,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
+
+
+def _create_queue() -> WriteBehindQueue:
+    """ Создает очередь с настройками из config.yml """
+    settings = section_settings(conf.get('write_behind'), WRITE_BEHIND_DEFAULTS, 'write_behind')
+    return WriteBehindQueue(**settings)
+
+
+write_queue = _create_queue()
+metrics.WRITE_QUEUE_DEPTH.set_function(write_queue.__len__)